@@ -0,0 +1,252 @@
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+# ===================================================================
+# Asignación de Leads a Agentes
+# ===================================================================
+# Cada lead nuevo se enruta por afinidad de cliente (hashing consistente
+# sobre su contact_email) con carga acotada: si el agente preferido supera
+# su cota de carga o su capacidad, se elige el menos cargado. El estado vive
+# en memoria del proceso y solo se modifica desde el event loop, sin puntos
+# de espera (await) en medio, así que no necesita locks.
+
+# Nodos virtuales por agente en el anillo: reparten las claves de forma
+# uniforme y limitan lo que se mueve al añadir o quitar un agente.
+VIRTUAL_NODES = 64
+
+# Latencias de enrutamiento que se conservan para los percentiles.
+LATENCY_WINDOW = 2048
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Anillo de hashing consistente; la búsqueda es bisect, O(log nodos)."""
+
+    def __init__(self, agent_ids=(), virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for agent_id in agent_ids:
+            self.add(agent_id)
+
+    def add(self, agent_id: str):
+        for i in range(self.virtual_nodes):
+            point = _hash(f"{agent_id}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, agent_id)
+
+    def remove(self, agent_id: str):
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != agent_id]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def lookup(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class AgentLoad:
+    """Carga viva de un agente: leads abiertos y cotizaciones en curso."""
+
+    __slots__ = ("agent_id", "capacity", "open_leads", "inflight_quotes", "available", "assigned")
+
+    def __init__(self, agent_id: str, capacity: int):
+        self.agent_id = agent_id
+        self.capacity = capacity
+        self.open_leads = 0
+        self.inflight_quotes = 0
+        self.available = True
+        self.assigned = 0
+
+    @property
+    def load(self) -> int:
+        return self.open_leads + self.inflight_quotes
+
+    def to_dict(self) -> Dict:
+        return {
+            "agent_id": self.agent_id, "capacity": self.capacity, "load": self.load,
+            "open_leads": self.open_leads, "inflight_quotes": self.inflight_quotes,
+            "available": self.available, "assigned_total": self.assigned,
+        }
+
+
+class AssignmentEngine:
+    """
+    Enrutador de leads. assign() es O(log agentes): una búsqueda en el anillo
+    y, si hace falta, el mínimo de un heap de utilización con borrado
+    perezoso (las entradas obsoletas se descartan al llegar a la cima).
+    """
+
+    def __init__(self, agents: Dict[str, int], load_factor: float = 1.25):
+        self.load_factor = load_factor
+        self.agents: Dict[str, AgentLoad] = {}
+        self.ring = HashRing()
+        self._heap: List[list] = []
+        self._seq = itertools.count()
+        self._total_load = 0
+        self._total_capacity = 0
+        self.decisions = Counter()
+        self._latencies_us = deque(maxlen=LATENCY_WINDOW)
+        for agent_id, capacity in agents.items():
+            self.add_agent(agent_id, capacity)
+
+    # --- Agentes ---
+
+    def add_agent(self, agent_id: str, capacity: int):
+        if agent_id in self.agents:
+            raise ValueError(f"Agent {agent_id} already registered")
+        agent = AgentLoad(agent_id, capacity)
+        self.agents[agent_id] = agent
+        self._total_capacity += capacity
+        self.ring.add(agent_id)
+        self._push(agent)
+
+    def set_available(self, agent_id: str, available: bool):
+        """Un agente no disponible conserva su carga pero no recibe leads."""
+        agent = self.agents[agent_id]
+        if agent.available == available:
+            return
+        agent.available = available
+        # Los totales (para la cota de carga) solo cuentan agentes disponibles.
+        if available:
+            self._total_capacity += agent.capacity
+            self._total_load += agent.load
+            self.ring.add(agent_id)
+            self._push(agent)
+        else:
+            self._total_capacity -= agent.capacity
+            self._total_load -= agent.load
+            self.ring.remove(agent_id)
+
+    # --- Carga ---
+
+    def _push(self, agent: AgentLoad):
+        if agent.available:
+            heapq.heappush(self._heap, [agent.load / agent.capacity, next(self._seq), agent.agent_id, agent.load])
+        # Evita que el heap crezca sin límite con entradas obsoletas.
+        if len(self._heap) > 8 * len(self.agents) + 64:
+            self._heap = [[a.load / a.capacity, next(self._seq), a.agent_id, a.load]
+                          for a in self.agents.values() if a.available]
+            heapq.heapify(self._heap)
+
+    def _adjust(self, agent: AgentLoad, open_leads: int = 0, inflight_quotes: int = 0):
+        before = agent.load
+        agent.open_leads = max(0, agent.open_leads + open_leads)
+        agent.inflight_quotes = max(0, agent.inflight_quotes + inflight_quotes)
+        if agent.available:
+            self._total_load += agent.load - before
+        if agent.load != before:
+            self._push(agent)
+
+    def report_load(self, agent_id: str, inflight_quotes: Optional[int] = None,
+                    open_leads: Optional[int] = None):
+        """Carga absoluta informada por el agente (latido)."""
+        agent = self.agents[agent_id]
+        self._adjust(agent,
+                     0 if open_leads is None else open_leads - agent.open_leads,
+                     0 if inflight_quotes is None else inflight_quotes - agent.inflight_quotes)
+
+    def release(self, agent_id: Optional[str]):
+        """El lead se cerró (o su alta falló): libera su plaza."""
+        agent = self.agents.get(agent_id)
+        if agent is not None:
+            self._adjust(agent, open_leads=-1)
+
+    def seed(self, open_leads: Dict[str, int]):
+        """Carga inicial a partir de los leads abiertos en la base de datos."""
+        for agent_id, count in open_leads.items():
+            if agent_id in self.agents:
+                self.report_load(agent_id, open_leads=count)
+
+    # --- Enrutamiento ---
+
+    def _bound(self, agent: AgentLoad) -> int:
+        # Hashing consistente con carga acotada: ningún agente recibe por
+        # afinidad más de load_factor veces su parte proporcional.
+        if not self._total_capacity:
+            return 0
+        share = (self._total_load + 1) * agent.capacity / self._total_capacity
+        return math.ceil(self.load_factor * share)
+
+    def _least_loaded(self) -> Optional[AgentLoad]:
+        heap = self._heap
+        while heap:
+            _, _, agent_id, load = heap[0]
+            agent = self.agents[agent_id]
+            if agent.available and agent.load == load:
+                return agent if agent.load < agent.capacity else None
+            heapq.heappop(heap)
+        return None
+
+    def assign(self, customer_key: str) -> Dict:
+        """
+        Elige agente para un lead del cliente `customer_key` y reserva la
+        plaza. reason: "affinity" (agente del anillo), "least_loaded"
+        (el preferido estaba por encima de su cota) o "saturated" (ningún
+        agente con capacidad; agent_id es None).
+        """
+        started = time.perf_counter_ns()
+        preferred_id = self.ring.lookup(customer_key)
+        preferred = self.agents.get(preferred_id)
+        if preferred is not None and preferred.load < preferred.capacity \
+                and preferred.load + 1 <= self._bound(preferred):
+            agent, reason = preferred, "affinity"
+        else:
+            agent = self._least_loaded()
+            reason = "least_loaded" if agent is not None else "saturated"
+        if agent is not None:
+            agent.assigned += 1
+            self._adjust(agent, open_leads=1)
+        latency_us = (time.perf_counter_ns() - started) / 1000
+        self.decisions[reason] += 1
+        self._latencies_us.append(latency_us)
+        return {
+            "agent_id": agent.agent_id if agent else None,
+            "preferred_agent_id": preferred_id,
+            "reason": reason,
+            "latency_us": round(latency_us, 1),
+        }
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies_us)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1) if latencies else None
+
+        return {
+            "agents": [agent.to_dict() for agent in self.agents.values()],
+            "total_load": self._total_load,
+            "total_capacity": self._total_capacity,
+            "load_factor": self.load_factor,
+            "decisions": dict(self.decisions),
+            "latency_us": {"p50": pct(0.50), "p99": pct(0.99), "max": latencies[-1] if latencies else None},
+        }
+
+
+def parse_agents(spec: str, default_capacity: int) -> Dict[str, int]:
+    """"agente-a,agente-b:50" -> {"agente-a": default_capacity, "agente-b": 50}."""
+    agents = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        agent_id, _, capacity = item.partition(":")
+        agents[agent_id] = int(capacity) if capacity else default_capacity
+    return agents
+
+
+def create_engine_from_env() -> AssignmentEngine:
+    """LEAD_AGENTS, LEAD_AGENT_CAPACITY y ASSIGNMENT_LOAD_FACTOR."""
+    agents = parse_agents(os.getenv("LEAD_AGENTS", "commercial_agent"),
+                          int(os.getenv("LEAD_AGENT_CAPACITY", 200)))
+    return AssignmentEngine(agents, load_factor=float(os.getenv("ASSIGNMENT_LOAD_FACTOR", 1.25)))
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger("orchestrator.dashboard")
+
+# ===================================================================
+# Dashboard agregado
+# ===================================================================
+# Una sola respuesta con los datos de todos los agentes. Las consultas se
+# lanzan en paralelo, cada una con su propio timeout, y el resultado
+# combinado se cachea con stale-while-revalidate: dentro de `ttl` se sirve
+# tal cual; hasta `stale_ttl` se sirve la copia vieja mientras se refresca
+# en segundo plano; más allá, la petición espera al refresco.
+
+
+class Source:
+    """Un endpoint consultado por el dashboard."""
+
+    __slots__ = ("key", "base_url", "path")
+
+    def __init__(self, key: str, base_url: str, path: str):
+        self.key = key
+        self.base_url = base_url.rstrip("/")
+        self.path = path
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{self.path}"
+
+
+def default_sources() -> List[Source]:
+    """URLs base configurables por entorno (nombres de servicio de docker-compose)."""
+    finance_agent = os.getenv("FINANCE_AGENT_URL", "http://finance_agent:5001")
+    operations_agent = os.getenv("OPERATIONS_AGENT_URL", "http://operations_agent:5002")
+    commercial_agent = os.getenv("COMMERCIAL_AGENT_URL", "http://commercial_agent:5003")
+    return [
+        Source("finance_agent.status", finance_agent, "/status"),
+        Source("finance_agent.data", finance_agent, "/data"),
+        Source("operations_agent.status", operations_agent, "/status"),
+        Source("operations_agent.data", operations_agent, "/data"),
+        Source("commercial_agent.status", commercial_agent, "/status"),
+        Source("commercial_agent.data", commercial_agent, "/data"),
+        Source("operations.status", os.getenv("OPERATIONS_URL", "http://operations:5002"),
+               "/api/operations/status"),
+        Source("finance.summary", os.getenv("FINANCE_URL", "http://finance:5001"),
+               "/api/financial_summary"),
+        Source("commercial.funnel", os.getenv("COMMERCIAL_URL", "http://commercial:5003"),
+               "/api/commercial/funnel/kpis"),
+    ]
+
+
+class DashboardAggregator:
+    """Fan-out concurrente a las fuentes y caché SWR del resultado combinado."""
+
+    def __init__(self, client: httpx.AsyncClient, sources: List[Source], ttl: float = 5.0,
+                 stale_ttl: float = 60.0, timeout: float = 2.0):
+        self.client = client
+        self.sources = sources
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self._payload: Optional[Dict[str, Any]] = None
+        self._fetched_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        # Último valor bueno de cada fuente, para no vaciar un panel cuando
+        # un agente falla de forma puntual.
+        self._last_good: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hit": 0, "stale": 0, "miss": 0, "refreshes": 0, "source_errors": 0}
+
+    async def _fetch(self, source: Source) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(source.url, timeout=self.timeout)
+            response.raise_for_status()
+            result = {"ok": True, "data": response.json()}
+        except (httpx.HTTPError, ValueError) as e:
+            detail = str(e).splitlines()[0] if str(e) else ""
+            result = {"ok": False, "error": f"{type(e).__name__}: {detail}"}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def _build(self) -> Dict[str, Any]:
+        results = await asyncio.gather(*(self._fetch(source) for source in self.sources))
+        data, meta = {}, {}
+        for source, result in zip(self.sources, results):
+            entry = {"ok": result["ok"], "latency_ms": result["latency_ms"]}
+            if result["ok"]:
+                self._last_good[source.key] = {"data": result["data"], "at": time.time()}
+                data[source.key] = result["data"]
+            else:
+                self.stats["source_errors"] += 1
+                entry["error"] = result["error"]
+                previous = self._last_good.get(source.key)
+                if previous is not None:
+                    data[source.key] = previous["data"]
+                    entry["stale_since"] = previous["at"]
+            meta[source.key] = entry
+        return {
+            "generated_at": time.time(),
+            "partial": not all(r["ok"] for r in results),
+            "data": data,
+            "sources": meta,
+        }
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Reconstruye el payload. Las llamadas concurrentes comparten un solo refresco."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> Dict[str, Any]:
+        self.stats["refreshes"] += 1
+        payload = await self._build()
+        self._payload = payload
+        self._fetched_at = time.monotonic()
+        return payload
+
+    def _refresh_in_background(self):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+            self._refreshing.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Dashboard background refresh failed: %r", task.exception())
+
+    async def get(self, force: bool = False) -> Tuple[Dict[str, Any], str, float]:
+        """Devuelve (payload, estado de caché HIT/STALE/MISS, edad en segundos)."""
+        age = time.monotonic() - self._fetched_at
+        if self._payload is not None and not force:
+            if age < self.ttl:
+                self.stats["hit"] += 1
+                return self._payload, "HIT", age
+            if age < self.stale_ttl:
+                self.stats["stale"] += 1
+                self._refresh_in_background()
+                return self._payload, "STALE", age
+        self.stats["miss"] += 1
+        return await self.refresh(), "MISS", 0.0
+
+    async def close(self):
+        if self._refreshing is not None and not self._refreshing.done():
+            self._refreshing.cancel()
+        await self.client.aclose()
+
+
+def create_aggregator_from_env() -> DashboardAggregator:
+    """DASHBOARD_TTL_SECONDS, DASHBOARD_STALE_SECONDS y DASHBOARD_TIMEOUT_SECONDS."""
+    sources = default_sources()
+    client = httpx.AsyncClient(limits=httpx.Limits(max_connections=4 * len(sources),
+                                                   max_keepalive_connections=2 * len(sources)))
+    return DashboardAggregator(
+        client, sources,
+        ttl=float(os.getenv("DASHBOARD_TTL_SECONDS", 5)),
+        stale_ttl=float(os.getenv("DASHBOARD_STALE_SECONDS", 60)),
+        timeout=float(os.getenv("DASHBOARD_TIMEOUT_SECONDS", 2)),
+    )
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+from typing import AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from schemas import BulkLead
+
+logger = logging.getLogger("orchestrator.intake")
+
+# Una línea más larga que esto se descarta sin intentar parsearla, para que
+# un cuerpo malformado no haga crecer el buffer sin límite.
+MAX_LINE_BYTES = 1024 * 1024
+
+# Modos de reporte por registro del endpoint masivo.
+RESULT_MODES = ("all", "errors", "summary")
+
+# ===================================================================
+# Lectura incremental del cuerpo NDJSON
+# ===================================================================
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Parte el cuerpo en líneas conforme llega, sin cargarlo completo.
+    Produce (número de línea, contenido); las líneas vacías se omiten y las
+    que exceden MAX_LINE_BYTES se entregan como b"" para marcarlas inválidas.
+    """
+    buffer = bytearray()
+    line_no = 0
+    oversized = False
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line = bytes(buffer[:newline])
+            del buffer[:newline + 1]
+            line_no += 1
+            if oversized:
+                oversized = False
+                yield line_no, b""
+            elif line.strip():
+                yield line_no, line
+        if len(buffer) > MAX_LINE_BYTES:
+            # Se descarta el resto de la línea hasta el siguiente salto.
+            buffer.clear()
+            oversized = True
+    if oversized:
+        yield line_no + 1, b""
+    elif buffer.strip():
+        yield line_no + 1, bytes(buffer)
+
+
+# ===================================================================
+# Escritura por lotes
+# ===================================================================
+
+async def write_batch(repository, batch: List[Tuple[int, BulkLead]], router=None) -> List[Dict]:
+    """
+    Inserta un lote en una sola transacción del repositorio: upsert de
+    customers por contact_email y alta de los leads. Un registro cuyo
+    cliente ya tiene un lead abierto en la base (de una carga anterior) no
+    se inserta y se reporta como "duplicate". Con `router`
+    (AssignmentEngine) cada lead sale ya asignado a un agente. Devuelve los
+    resultados por registro en el orden del lote.
+    """
+    customer_rows = {}
+    for _, lead in batch:
+        customer_rows.setdefault(lead.contact_email, {
+            "company_name": lead.customer_company(),
+            "contact_name": lead.contact_name,
+            "contact_email": lead.contact_email,
+            "contact_phone": lead.contact_phone,
+        })
+    agents = [router.assign(lead.contact_email)["agent_id"] if router else None for _, lead in batch]
+    lead_rows = [{"source": lead.source, "contact_email": lead.contact_email,
+                  "lead_details": lead.details, "assigned_agent_id": agent_id}
+                 for (_, lead), agent_id in zip(batch, agents)]
+    try:
+        created = await repository.ingest_leads(list(customer_rows.values()), lead_rows,
+                                                skip_open=True)
+    except BaseException:
+        # Las plazas reservadas para un lote que no se escribió se devuelven.
+        if router:
+            for agent_id in agents:
+                router.release(agent_id)
+        raise
+    written = []
+    for (line_no, lead), ids, agent_id in zip(batch, created, agents):
+        if ids["lead_id"] is None:
+            if router:
+                router.release(agent_id)
+            written.append({"line": line_no, "status": "duplicate",
+                            "contact_email": lead.contact_email,
+                            "customer_id": ids["customer_id"]})
+        else:
+            written.append(dict(ids, line=line_no, status="created", assigned_agent_id=agent_id))
+    return written
+
+
+# ===================================================================
+# Ingesta en streaming
+# ===================================================================
+
+def _email_key(email: str) -> bytes:
+    # 8 bytes por email visto: deduplicar un millón de registros cuesta
+    # decenas de MB y no depende del tamaño de cada registro.
+    return hashlib.blake2b(email.encode("utf-8"), digest_size=8).digest()
+
+
+def _line(obj: Dict) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def ingest_ndjson(chunks: AsyncIterator[bytes], repository, batch_size: int = 1000,
+                        results: str = "all", router=None) -> AsyncIterator[bytes]:
+    """
+    Valida, deduplica (dentro del cuerpo y contra los leads abiertos de cada
+    cliente) e inserta los leads de un cuerpo NDJSON, y produce
+    los resultados como NDJSON conforme se procesan los lotes. La memoria
+    está acotada por batch_size (más el conjunto de emails ya vistos).
+
+    results: "all" reporta cada registro, "errors" solo los no creados y
+    "summary" únicamente la línea final de resumen.
+    """
+    totals = {"received": 0, "created": 0, "duplicate": 0, "invalid": 0, "error": 0}
+    seen = set()
+    batch: List[Tuple[int, BulkLead]] = []
+    aborted = False
+
+    def report(result):
+        totals[result["status"]] += 1
+        if results == "all" or (results == "errors" and result["status"] != "created"):
+            return _line(result)
+        return b""
+
+    async def flush():
+        try:
+            written = await write_batch(repository, batch, router)
+        except Exception as e:
+            logger.exception("Bulk intake: batch of %d leads failed", len(batch))
+            written = [{"line": line_no, "status": "error", "error": type(e).__name__}
+                       for line_no, _ in batch]
+        batch.clear()
+        return written
+
+    async for line_no, raw in iter_ndjson_lines(chunks):
+        totals["received"] += 1
+        try:
+            lead = BulkLead.model_validate_json(raw)
+        except ValidationError as e:
+            errors = [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+            out = report({"line": line_no, "status": "invalid", "errors": errors})
+            if out:
+                yield out
+            continue
+
+        key = _email_key(lead.contact_email)
+        if key in seen:
+            out = report({"line": line_no, "status": "duplicate",
+                          "contact_email": lead.contact_email})
+            if out:
+                yield out
+            continue
+        seen.add(key)
+        batch.append((line_no, lead))
+
+        if len(batch) >= batch_size:
+            written = await flush()
+            out = b"".join(report(r) for r in written)
+            if out:
+                yield out
+            if written and written[0]["status"] == "error":
+                aborted = True
+                break
+
+    if batch and not aborted:
+        out = b"".join(report(r) for r in await flush())
+        if out:
+            yield out
+
+    logger.info("Bulk intake finished: %s", totals)
+    yield _line({"summary": dict(totals, aborted=aborted)})
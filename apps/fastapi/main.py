@@ -1,16 +1,39 @@
+import logging
 import os
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import Dict, Any
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from assignment import AssignmentEngine, create_engine_from_env
+from dashboard import DashboardAggregator, create_aggregator_from_env
+from lead_intake import RESULT_MODES, ingest_ndjson
+from repository import BaseRepository, create_repository
+from schemas import (CLOSED_LEAD_STATUSES, AgentLoadReport, BulkLead, LeadStatus,
+                     LeadStatusUpdate)
 
 # ===================================================================
-# Modelos de Datos (Pydantic)
+# Logging asíncrono
 # ===================================================================
+# Los handlers de la aplicación solo encolan el registro; un hilo aparte
+# (QueueListener) lo escribe, para no bloquear el event loop con E/S.
 
-class Lead(BaseModel):
-    source: str = Field(..., description="Origen del lead, ej: 'website_form', 'social_media'")
-    contact_email: str = Field(..., description="Email de contacto del lead")
-    details: Dict[str, Any] = Field(..., description="Detalles flexibles del lead, como tipo de maquinaria, etc.")
+def setup_async_logging(level=logging.INFO):
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    root = logging.getLogger("orchestrator")
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+    root.propagate = False
+    listener.start()
+    return listener
+
+log_listener = setup_async_logging(os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("orchestrator.api")
 
 # ===================================================================
 # Aplicación FastAPI
@@ -22,6 +45,45 @@ app = FastAPI(
     description="Orquestador central para el sistema de ventas automatizado de MECSOL."
 )
 
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que puede seguir leyendo el cuerpo de la petición
+    mientras responde. La versión base escucha en paralelo la desconexión del
+    cliente con receive(), lo que le roba al generador los fragmentos del
+    cuerpo; aquí el propio generador es el único consumidor de receive().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+@app.on_event("startup")
+async def open_repository():
+    repository = create_repository()
+    await repository.connect()
+    app.state.repository = repository
+    # La carga de partida de cada agente son sus leads abiertos en BBDD.
+    router = create_engine_from_env()
+    router.seed(await repository.open_leads_by_agent())
+    app.state.router = router
+    app.state.dashboard = create_aggregator_from_env()
+
+@app.on_event("shutdown")
+async def close_repository():
+    await app.state.dashboard.close()
+    await app.state.repository.close()
+    log_listener.stop()
+
+def get_repository(request: Request) -> BaseRepository:
+    return request.app.state.repository
+
+def get_router(request: Request) -> AssignmentEngine:
+    return request.app.state.router
+
+def get_dashboard(request: Request) -> DashboardAggregator:
+    return request.app.state.dashboard
+
 # ===================================================================
 # Endpoints de la API
 # ===================================================================
@@ -33,28 +95,146 @@ def read_health():
     """
     return {"status": "ok", "service": "MECSOL AI Orchestrator"}
 
+@app.get("/v1/dashboard", tags=["Dashboard"])
+async def read_dashboard(
+    refresh: bool = Query(False, description="Ignora la caché y consulta a todos los agentes"),
+    dashboard: DashboardAggregator = Depends(get_dashboard),
+):
+    """
+    Datos de todos los agentes en una sola respuesta. Se consultan en
+    paralelo y el resultado se cachea; X-Cache indica si vino de caché
+    (HIT), de una copia vieja que ya se está refrescando (STALE) o de una
+    consulta nueva (MISS).
+    """
+    payload, cache_status, age = await dashboard.get(force=refresh)
+    return JSONResponse(payload, headers={
+        "X-Cache": cache_status,
+        "Age": str(int(age)),
+        "Cache-Control": f"max-age={int(dashboard.ttl)}, stale-while-revalidate={int(dashboard.stale_ttl - dashboard.ttl)}",
+    })
+
+@app.get("/v1/dashboard/stats", tags=["Dashboard"])
+def read_dashboard_stats(dashboard: DashboardAggregator = Depends(get_dashboard)):
+    return dashboard.stats
+
 @app.post("/v1/lead/intake", tags=["Leads"])
-def intake_lead(lead: Lead):
+async def intake_lead(
+    lead: BulkLead,
+    repository: BaseRepository = Depends(get_repository),
+    router: AssignmentEngine = Depends(get_router),
+):
     """
     Endpoint para la ingesta de nuevos leads.
     Aquí es donde se iniciará la lógica de negocio:
-    1. Guardar el lead en la base de datos.
-    2. Usar un algoritmo para asignar el lead a un agente de IA.
+    1. Usar un algoritmo para asignar el lead a un agente de IA.
+    2. Guardar el lead en la base de datos.
     3. Iniciar el proceso de contacto del agente.
     """
-    print(f"Lead recibido de {lead.source}: {lead.contact_email}")
-    print(f"Detalles: {lead.details}")
+    logger.info("Lead recibido de %s: %s", lead.source, lead.contact_email)
+    logger.debug("Detalles: %s", lead.details)
+
+    # 1. Asignar agente (afinidad por cliente, con respaldo al menos cargado)
+    routing = router.assign(lead.contact_email)
+
+    # 2. Almacenar en BBDD (el cliente se reutiliza si el email ya existe),
+    # con el mismo criterio de deduplicación que la ingesta masiva: si el
+    # cliente ya tiene un lead abierto no se crea otro ni se reserva agente.
+    try:
+        created = await repository.create_lead_with_customer(
+            {"company_name": lead.customer_company(), "contact_name": lead.contact_name,
+             "contact_email": lead.contact_email, "contact_phone": lead.contact_phone},
+            lead.source, lead.details, routing["agent_id"], skip_open=True)
+    except BaseException:
+        router.release(routing["agent_id"])
+        raise
+    if created["lead_id"] is None:
+        router.release(routing["agent_id"])
+        return {
+            "status": "duplicate",
+            "message": "El cliente ya tiene un lead abierto; no se creó otro.",
+            "contact_email": lead.contact_email,
+            **created,
+        }
 
     # --- Lógica de negocio (a implementar) ---
-    # 1. Almacenar en BBDD
-    # 2. Asignar agente
-    # 3. Retornar un ID de seguimiento
+    # 3. Iniciar contacto del agente
     # -----------------------------------------
 
-    lead_id = "lead_" + os.urandom(8).hex() # ID de ejemplo
-
     return {
         "status": "success",
         "message": "Lead recibido y siendo procesado.",
-        "tracking_id": lead_id
+        "tracking_id": f"lead_{created['lead_id']}",
+        **created,
+        "routing": routing,
     }
+
+@app.get("/v1/leads/{lead_id}", tags=["Leads"])
+async def read_lead(lead_id: int, repository: BaseRepository = Depends(get_repository)):
+    lead = await repository.get_lead(lead_id)
+    if lead is None:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    return lead
+
+@app.get("/v1/leads", tags=["Leads"])
+async def list_leads(
+    status: Optional[LeadStatus] = None,
+    customer_id: Optional[int] = None,
+    after_id: int = Query(0, ge=0, description="Paginación por clave: último id recibido"),
+    limit: int = Query(100, ge=1, le=1000),
+    repository: BaseRepository = Depends(get_repository),
+):
+    leads = await repository.find_leads(status, customer_id, limit, after_id)
+    return {"leads": leads, "next_after_id": leads[-1]["id"] if len(leads) == limit else None}
+
+@app.post("/v1/leads/{lead_id}/status", tags=["Leads"])
+async def update_lead_status(
+    lead_id: int,
+    update: LeadStatusUpdate,
+    repository: BaseRepository = Depends(get_repository),
+    router: AssignmentEngine = Depends(get_router),
+):
+    """Cambia el estado del lead; al cerrarse (won/lost) libera a su agente."""
+    changed = await repository.set_lead_status(lead_id, update.status)
+    if changed is None:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    if update.status in CLOSED_LEAD_STATUSES and changed["previous_status"] not in CLOSED_LEAD_STATUSES:
+        router.release(changed["assigned_agent_id"])
+    return {"lead_id": lead_id, "status": update.status, **changed}
+
+@app.get("/v1/agents", tags=["Agents"])
+def read_agents(router: AssignmentEngine = Depends(get_router)):
+    """Carga viva por agente y estadísticas de enrutamiento (decisiones y latencia)."""
+    return router.stats()
+
+@app.put("/v1/agents/{agent_id}/load", tags=["Agents"])
+def report_agent_load(agent_id: str, report: AgentLoadReport,
+                      router: AssignmentEngine = Depends(get_router)):
+    if agent_id not in router.agents:
+        raise HTTPException(status_code=404, detail="Unknown agent")
+    if report.available is not None:
+        router.set_available(agent_id, report.available)
+    router.report_load(agent_id, report.inflight_quotes, report.open_leads)
+    return router.agents[agent_id].to_dict()
+
+@app.post("/v1/lead/intake:bulk", tags=["Leads"])
+async def intake_leads_bulk(
+    request: Request,
+    repository: BaseRepository = Depends(get_repository),
+    router: AssignmentEngine = Depends(get_router),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Registros por transacción"),
+    results: str = Query("all", description="Reporte por registro: all, errors o summary"),
+):
+    """
+    Importación masiva de leads (p. ej. exportaciones de CRM). El cuerpo es
+    NDJSON (un Lead por línea) y se procesa conforme llega: cada registro se
+    valida, se deduplica por contact_email (también contra los leads
+    abiertos que el cliente ya tenga), se asigna a un agente y se
+    inserta en lotes transaccionales en customers/leads. La respuesta es
+    NDJSON con el resultado de cada registro y una línea final de resumen.
+    """
+    if results not in RESULT_MODES:
+        raise HTTPException(status_code=422, detail=f"results must be one of {', '.join(RESULT_MODES)}")
+    return DuplexStreamingResponse(
+        ingest_ndjson(request.stream(), repository, batch_size, results, router),
+        media_type="application/x-ndjson",
+    )
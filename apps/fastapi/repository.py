@@ -0,0 +1,590 @@
+import asyncio
+import json
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+# ===================================================================
+# Capa de Persistencia Asíncrona
+# ===================================================================
+# Un repositorio por proceso, creado en el arranque de la app. En producción
+# usa Postgres (asyncpg, con pool de conexiones y sentencias preparadas); en
+# pruebas y desarrollo puede usar un archivo SQLite con el mismo contrato.
+
+# Columnas de customers que se pueden insertar desde la ingesta.
+CUSTOMER_FIELDS = ("company_name", "contact_name", "contact_email", "contact_phone")
+
+
+class BaseRepository:
+    """Contrato común de los backends. Todos los métodos son corrutinas."""
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    # --- Clientes ---
+
+    async def upsert_customers(self, rows: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Inserta o reutiliza clientes por contact_email (los emails deben
+        venir ya normalizados y sin repetir). Devuelve {email: customer_id}.
+        """
+        raise NotImplementedError
+
+    async def get_customer_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # --- Leads ---
+
+    async def insert_leads(self, rows: Sequence[Dict[str, Any]]) -> List[int]:
+        """
+        Inserta leads (source, customer_id, lead_details, assigned_agent_id)
+        en una sola sentencia y devuelve sus ids en el mismo orden.
+        """
+        raise NotImplementedError
+
+    async def copy_leads(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """Carga masiva sin devolver ids (COPY en Postgres). Devuelve el total."""
+        raise NotImplementedError
+
+    async def get_lead(self, lead_id: int) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def find_leads(self, status: Optional[str] = None, customer_id: Optional[int] = None,
+                         limit: int = 100, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Leads ordenados por id, paginados por clave (id > after_id)."""
+        raise NotImplementedError
+
+    async def set_lead_agent(self, lead_id: int, agent_id: Optional[str]) -> bool:
+        raise NotImplementedError
+
+    async def set_lead_status(self, lead_id: int, status: str) -> Optional[Dict[str, Any]]:
+        """
+        Cambia el estado de un lead. Devuelve {"previous_status",
+        "assigned_agent_id"} o None si el lead no existe.
+        """
+        raise NotImplementedError
+
+    async def open_leads_by_agent(self) -> Dict[str, int]:
+        """Leads no cerrados (ni won ni lost) por agente asignado."""
+        raise NotImplementedError
+
+    # --- Cotizaciones ---
+
+    async def create_quote(self, lead_id: int, quote_number: str, total_amount: float,
+                           currency: str = "MXN", details: Optional[Dict] = None) -> int:
+        raise NotImplementedError
+
+    async def quotes_for_lead(self, lead_id: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # --- Combinadas ---
+
+    async def ingest_leads(self, customers: Sequence[Dict[str, Any]],
+                           leads: Sequence[Dict[str, Any]],
+                           skip_open: bool = False) -> List[Dict[str, int]]:
+        """
+        Lote de ingesta en una sola transacción: upsert de `customers` y alta
+        de `leads`, cuyo campo contact_email indica a qué cliente pertenecen.
+        Devuelve [{"lead_id", "customer_id"}] en el orden de `leads`.
+
+        Con skip_open no se da de alta el lead de un cliente que ya tenía un
+        lead abierto (ni won ni lost) antes del lote: su lead_id es None. En
+        ese modo `leads` trae como mucho un lead por cliente.
+        """
+        raise NotImplementedError
+
+    async def create_lead_with_customer(self, customer: Dict[str, Any], source: str,
+                                        details: Dict[str, Any],
+                                        assigned_agent_id: Optional[str] = None,
+                                        skip_open: bool = False) -> Dict[str, int]:
+        """Alta de un lead (ver ingest_leads); con skip_open su lead_id puede ser None."""
+        [created] = await self.ingest_leads([customer], [
+            {"source": source, "contact_email": customer["contact_email"], "lead_details": details,
+             "assigned_agent_id": assigned_agent_id}
+        ], skip_open=skip_open)
+        return created
+
+
+# ===================================================================
+# Postgres (asyncpg)
+# ===================================================================
+
+class PostgresRepository(BaseRepository):
+    """
+    Pool de asyncpg de tamaño fijo. asyncpg prepara y cachea por conexión
+    cada sentencia parametrizada (statement_cache_size), así que las
+    consultas de este módulo se planifican una sola vez por conexión. Las
+    inserciones masivas usan unnest() sobre arreglos (una sentencia por lote,
+    con RETURNING) o COPY cuando no se necesitan los ids.
+    """
+
+    _UPSERT_CUSTOMERS = """
+        INSERT INTO customers (company_name, contact_name, contact_email, contact_phone)
+        SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::varchar[], $4::varchar[])
+        ON CONFLICT (contact_email) DO UPDATE SET contact_email = EXCLUDED.contact_email
+        RETURNING id, contact_email
+    """
+    _INSERT_LEADS = """
+        INSERT INTO leads (source, customer_id, lead_details, assigned_agent_id)
+        SELECT * FROM unnest($1::varchar[], $2::int[], $3::jsonb[], $4::varchar[])
+        RETURNING id
+    """
+    # Igual, pero omite a los clientes con un lead abierto. El upsert previo
+    # de customers bloquea sus filas hasta el COMMIT, así que dos ingestas
+    # concurrentes del mismo cliente se serializan y la segunda ve el lead
+    # de la primera.
+    _INSERT_NEW_LEADS = """
+        INSERT INTO leads (source, customer_id, lead_details, assigned_agent_id)
+        SELECT l.* FROM unnest($1::varchar[], $2::int[], $3::jsonb[], $4::varchar[])
+            AS l(source, customer_id, lead_details, assigned_agent_id)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM leads o
+            WHERE o.customer_id = l.customer_id AND o.status NOT IN ('won', 'lost'))
+        RETURNING id, customer_id
+    """
+    _LEAD_COLUMNS = ("id, source, customer_id, status::text AS status, lead_details, "
+                     "assigned_agent_id, created_at, updated_at")
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10,
+                 statement_cache_size: int = 256, command_timeout: float = 30.0):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.command_timeout = command_timeout
+        self.pool = None
+
+    @staticmethod
+    def _decode(record, *json_columns):
+        # json/jsonb viajan como texto con el códec estándar de asyncpg, que
+        # también es el que admite COPY (binario).
+        if record is None:
+            return None
+        row = dict(record)
+        for column in json_columns:
+            if row.get(column) is not None:
+                row[column] = json.loads(row[column])
+        return row
+
+    async def connect(self):
+        import asyncpg  # Solo se requiere con el backend de Postgres.
+
+        self.pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.min_size, max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+            command_timeout=self.command_timeout,
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def _upsert_customers(self, conn, rows):
+        if not rows:
+            return {}
+        columns = [[row.get(field) for row in rows] for field in CUSTOMER_FIELDS]
+        records = await conn.fetch(self._UPSERT_CUSTOMERS, *columns)
+        return {r["contact_email"]: r["id"] for r in records}
+
+    async def _insert_leads(self, conn, rows, skip_open=False):
+        if not rows:
+            return []
+        records = await conn.fetch(
+            self._INSERT_NEW_LEADS if skip_open else self._INSERT_LEADS,
+            [row.get("source") for row in rows],
+            [row.get("customer_id") for row in rows],
+            [json.dumps(row.get("lead_details")) for row in rows],
+            [row.get("assigned_agent_id") for row in rows],
+        )
+        # unnest conserva el orden de los arreglos en el INSERT ... SELECT.
+        if not skip_open:
+            return [r["id"] for r in records]
+        # Las filas omitidas no aparecen en RETURNING, y su orden no está
+        # garantizado: se busca por cliente (uno por fila en estos lotes).
+        ids = {r["customer_id"]: r["id"] for r in records}
+        return [ids.get(row.get("customer_id")) for row in rows]
+
+    async def upsert_customers(self, rows):
+        return await self._upsert_customers(self.pool, rows)
+
+    async def get_customer_by_email(self, email):
+        record = await self.pool.fetchrow("SELECT * FROM customers WHERE contact_email = $1", email)
+        return dict(record) if record else None
+
+    async def insert_leads(self, rows):
+        return await self._insert_leads(self.pool, rows)
+
+    async def copy_leads(self, rows):
+        records = [(row.get("source"), row.get("customer_id"),
+                    json.dumps(row.get("lead_details")), row.get("assigned_agent_id"))
+                   for row in rows]
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table(
+                "leads", records=records,
+                columns=["source", "customer_id", "lead_details", "assigned_agent_id"])
+        return len(records)
+
+    async def get_lead(self, lead_id):
+        record = await self.pool.fetchrow(
+            f"SELECT {self._LEAD_COLUMNS} FROM leads WHERE id = $1", lead_id)
+        return self._decode(record, "lead_details")
+
+    async def find_leads(self, status=None, customer_id=None, limit=100, after_id=0):
+        # Una sentencia por combinación de filtros, cada una preparada con su
+        # propio plan: con "($2 IS NULL OR ...)" Postgres acaba en un plan
+        # genérico que no usa idx_leads_status ni idx_leads_customer_id.
+        # status se compara como lead_status (no status::text) para que el
+        # índice sobre la columna sea utilizable.
+        conditions, args = ["id > $1"], [after_id]
+        if status is not None:
+            args.append(status)
+            conditions.append(f"status = ${len(args)}::lead_status")
+        if customer_id is not None:
+            args.append(customer_id)
+            conditions.append(f"customer_id = ${len(args)}")
+        args.append(limit)
+        records = await self.pool.fetch(
+            f"SELECT {self._LEAD_COLUMNS} FROM leads WHERE {' AND '.join(conditions)}"
+            f" ORDER BY id LIMIT ${len(args)}",
+            *args)
+        return [self._decode(r, "lead_details") for r in records]
+
+    async def set_lead_agent(self, lead_id, agent_id):
+        result = await self.pool.execute(
+            "UPDATE leads SET assigned_agent_id = $2 WHERE id = $1", lead_id, agent_id)
+        return result.endswith(" 1")
+
+    async def set_lead_status(self, lead_id, status):
+        record = await self.pool.fetchrow(
+            "WITH old AS (SELECT id, status FROM leads WHERE id = $1 FOR UPDATE)"
+            " UPDATE leads SET status = $2::lead_status, updated_at = CURRENT_TIMESTAMP"
+            " FROM old WHERE leads.id = old.id"
+            " RETURNING old.status::text AS previous_status, leads.assigned_agent_id",
+            lead_id, status)
+        return dict(record) if record else None
+
+    async def open_leads_by_agent(self):
+        records = await self.pool.fetch(
+            "SELECT assigned_agent_id, COUNT(*) AS open_leads FROM leads"
+            " WHERE assigned_agent_id IS NOT NULL AND status NOT IN ('won', 'lost')"
+            " GROUP BY assigned_agent_id")
+        return {r["assigned_agent_id"]: r["open_leads"] for r in records}
+
+    async def create_quote(self, lead_id, quote_number, total_amount, currency="MXN", details=None):
+        return await self.pool.fetchval(
+            "INSERT INTO quotes (lead_id, quote_number, total_amount, currency, details)"
+            " VALUES ($1, $2, $3, $4, $5) RETURNING id",
+            lead_id, quote_number, total_amount, currency, json.dumps(details))
+
+    async def quotes_for_lead(self, lead_id):
+        records = await self.pool.fetch(
+            "SELECT * FROM quotes WHERE lead_id = $1 ORDER BY id", lead_id)
+        return [self._decode(r, "details") for r in records]
+
+    async def ingest_leads(self, customers, leads, skip_open=False):
+        # Una sola conexión y transacción para los dos INSERT del lote.
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                customer_ids = await self._upsert_customers(conn, customers)
+                rows = [dict(lead, customer_id=customer_ids[lead["contact_email"]]) for lead in leads]
+                lead_ids = await self._insert_leads(conn, rows, skip_open)
+        return [{"lead_id": lead_id, "customer_id": row["customer_id"]}
+                for lead_id, row in zip(lead_ids, rows)]
+
+
+# ===================================================================
+# SQLite (pruebas sin servidor)
+# ===================================================================
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_name TEXT NOT NULL,
+    contact_name TEXT,
+    contact_email TEXT UNIQUE,
+    contact_phone TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    customer_id INTEGER REFERENCES customers(id),
+    status TEXT DEFAULT 'new',
+    lead_details TEXT,
+    assigned_agent_id TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL REFERENCES leads(id),
+    quote_number TEXT UNIQUE NOT NULL,
+    total_amount NUMERIC NOT NULL,
+    currency TEXT DEFAULT 'MXN',
+    details TEXT,
+    sent_at TEXT,
+    expires_at TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    quote_id INTEGER NOT NULL REFERENCES quotes(id),
+    project_name TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    start_date TEXT,
+    end_date TEXT,
+    project_manager TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS project_tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    task_name TEXT NOT NULL,
+    description TEXT,
+    is_completed INTEGER DEFAULT 0,
+    due_date TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status);
+CREATE INDEX IF NOT EXISTS idx_leads_customer_id ON leads(customer_id);
+CREATE INDEX IF NOT EXISTS idx_quotes_lead_id ON quotes(lead_id);
+CREATE INDEX IF NOT EXISTS idx_projects_status ON projects(status);
+CREATE INDEX IF NOT EXISTS idx_projects_quote_id ON projects(quote_id);
+CREATE INDEX IF NOT EXISTS idx_project_tasks_project_id ON project_tasks(project_id);
+"""
+
+
+class SQLiteRepository(BaseRepository):
+    """
+    Mismo contrato sobre un archivo SQLite (o ":memory:"). sqlite3 es
+    bloqueante: cada operación corre en un hilo con asyncio.to_thread y se
+    serializa con un lock, ya que hay una única conexión.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        def open_db():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(_SQLITE_SCHEMA)
+            return conn
+        self.conn = await asyncio.to_thread(open_db)
+
+    async def close(self):
+        if self.conn is not None:
+            await asyncio.to_thread(self.conn.close)
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _transaction(self, fn):
+        def run(*args):
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+        return run
+
+    @staticmethod
+    def _lead(row):
+        if row is None:
+            return None
+        lead = dict(row)
+        lead["lead_details"] = json.loads(lead["lead_details"]) if lead["lead_details"] else None
+        return lead
+
+    def _upsert_customers(self, rows):
+        if not rows:
+            return {}
+        # executemany con una sentencia preparada (sqlite3 la cachea).
+        self.conn.executemany(
+            "INSERT INTO customers (company_name, contact_name, contact_email, contact_phone)"
+            " VALUES (?, ?, ?, ?) ON CONFLICT (contact_email) DO NOTHING",
+            [tuple(row.get(field) for field in CUSTOMER_FIELDS) for row in rows])
+        ids = {}
+        emails = [row["contact_email"] for row in rows]
+        for start in range(0, len(emails), 500):
+            chunk = emails[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            ids.update((r["contact_email"], r["id"]) for r in self.conn.execute(
+                f"SELECT id, contact_email FROM customers WHERE contact_email IN ({marks})", chunk))
+        return ids
+
+    def _insert_leads(self, rows):
+        cursor = self.conn.cursor()
+        ids = []
+        for row in rows:
+            cursor.execute(
+                "INSERT INTO leads (source, customer_id, lead_details, assigned_agent_id)"
+                " VALUES (?, ?, ?, ?)",
+                (row.get("source"), row.get("customer_id"),
+                 json.dumps(row.get("lead_details")), row.get("assigned_agent_id")))
+            ids.append(cursor.lastrowid)
+        return ids
+
+    async def upsert_customers(self, rows):
+        return await self._run(self._transaction(self._upsert_customers), rows)
+
+    async def get_customer_by_email(self, email):
+        def fetch():
+            row = self.conn.execute("SELECT * FROM customers WHERE contact_email = ?", (email,)).fetchone()
+            return dict(row) if row else None
+        return await self._run(fetch)
+
+    async def insert_leads(self, rows):
+        return await self._run(self._transaction(self._insert_leads), rows)
+
+    def _customers_with_open_leads(self, customer_ids):
+        found = set()
+        customer_ids = list(set(customer_ids))
+        for start in range(0, len(customer_ids), 500):
+            chunk = customer_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(r[0] for r in self.conn.execute(
+                f"SELECT DISTINCT customer_id FROM leads WHERE customer_id IN ({marks})"
+                " AND status NOT IN ('won', 'lost')", chunk))
+        return found
+
+    async def ingest_leads(self, customers, leads, skip_open=False):
+        def ingest():
+            customer_ids = self._upsert_customers(customers)
+            rows = [dict(lead, customer_id=customer_ids[lead["contact_email"]]) for lead in leads]
+            # BEGIN IMMEDIATE serializa las escrituras: nadie inserta entre la
+            # consulta y el INSERT.
+            open_customers = (self._customers_with_open_leads(row["customer_id"] for row in rows)
+                              if skip_open else set())
+            new_ids = iter(self._insert_leads(
+                [row for row in rows if row["customer_id"] not in open_customers]))
+            return [{"lead_id": None if row["customer_id"] in open_customers else next(new_ids),
+                     "customer_id": row["customer_id"]} for row in rows]
+        return await self._run(self._transaction(ingest))
+
+    async def copy_leads(self, rows):
+        def copy():
+            self.conn.executemany(
+                "INSERT INTO leads (source, customer_id, lead_details, assigned_agent_id)"
+                " VALUES (?, ?, ?, ?)",
+                [(row.get("source"), row.get("customer_id"), json.dumps(row.get("lead_details")),
+                  row.get("assigned_agent_id")) for row in rows])
+            return len(rows)
+        return await self._run(self._transaction(copy))
+
+    async def get_lead(self, lead_id):
+        def fetch():
+            return self._lead(self.conn.execute("SELECT * FROM leads WHERE id = ?", (lead_id,)).fetchone())
+        return await self._run(fetch)
+
+    async def find_leads(self, status=None, customer_id=None, limit=100, after_id=0):
+        # Como en Postgres, solo los filtros presentes: "(? IS NULL OR ...)"
+        # impide a SQLite usar los índices de status y customer_id.
+        conditions, args = ["id > ?"], [after_id]
+        if status is not None:
+            conditions.append("status = ?")
+            args.append(status)
+        if customer_id is not None:
+            conditions.append("customer_id = ?")
+            args.append(customer_id)
+
+        def fetch():
+            rows = self.conn.execute(
+                f"SELECT * FROM leads WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                (*args, limit)).fetchall()
+            return [self._lead(row) for row in rows]
+        return await self._run(fetch)
+
+    async def set_lead_agent(self, lead_id, agent_id):
+        def update():
+            cursor = self.conn.execute(
+                "UPDATE leads SET assigned_agent_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (agent_id, lead_id))
+            return cursor.rowcount == 1
+        return await self._run(update)
+
+    async def set_lead_status(self, lead_id, status):
+        def update():
+            row = self.conn.execute(
+                "SELECT status, assigned_agent_id FROM leads WHERE id = ?", (lead_id,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE leads SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, lead_id))
+            return {"previous_status": row["status"], "assigned_agent_id": row["assigned_agent_id"]}
+        return await self._run(self._transaction(update))
+
+    async def open_leads_by_agent(self):
+        def fetch():
+            return dict(self.conn.execute(
+                "SELECT assigned_agent_id, COUNT(*) FROM leads"
+                " WHERE assigned_agent_id IS NOT NULL AND status NOT IN ('won', 'lost')"
+                " GROUP BY assigned_agent_id").fetchall())
+        return await self._run(fetch)
+
+    async def create_quote(self, lead_id, quote_number, total_amount, currency="MXN", details=None):
+        def insert():
+            cursor = self.conn.execute(
+                "INSERT INTO quotes (lead_id, quote_number, total_amount, currency, details)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (lead_id, quote_number, total_amount, currency, json.dumps(details)))
+            return cursor.lastrowid
+        return await self._run(insert)
+
+    async def quotes_for_lead(self, lead_id):
+        def fetch():
+            rows = self.conn.execute("SELECT * FROM quotes WHERE lead_id = ? ORDER BY id", (lead_id,))
+            return [dict(row, details=json.loads(row["details"]) if row["details"] else None)
+                    for row in rows]
+        return await self._run(fetch)
+
+
+# ===================================================================
+# Fábrica
+# ===================================================================
+
+def database_url() -> str:
+    """DATABASE_URL, o la URL del Postgres del stack a partir de POSTGRES_*."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    user = os.getenv("POSTGRES_USER", "postgres")
+    password = os.getenv("POSTGRES_PASSWORD", "")
+    host = os.getenv("POSTGRES_HOST", "postgres")
+    port = os.getenv("POSTGRES_PORT", "5432")
+    name = os.getenv("POSTGRES_DB", "postgres")
+    return f"postgresql://{user}:{password}@{host}:{port}/{name}"
+
+
+def create_repository(url: Optional[str] = None) -> BaseRepository:
+    """
+    postgresql://... -> PostgresRepository (pool de DB_POOL_MIN_SIZE a
+    DB_POOL_MAX_SIZE conexiones); sqlite:///ruta o sqlite://:memory: ->
+    SQLiteRepository.
+    """
+    url = url or database_url()
+    if url.startswith("sqlite://"):
+        path = url[len("sqlite://"):]
+        return SQLiteRepository(path[1:] if path.startswith("/") else path)
+    if url.startswith(("postgresql://", "postgres://")):
+        return PostgresRepository(
+            url,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256)),
+        )
+    raise ValueError(f"Unsupported DATABASE_URL scheme: {url.split(':', 1)[0]}")
@@ -0,0 +1,55 @@
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+# ===================================================================
+# Modelos de Datos (Pydantic)
+# ===================================================================
+
+class Lead(BaseModel):
+    source: str = Field(..., description="Origen del lead, ej: 'website_form', 'social_media'")
+    contact_email: str = Field(..., description="Email de contacto del lead")
+    details: Dict[str, Any] = Field(..., description="Detalles flexibles del lead, como tipo de maquinaria, etc.")
+
+
+class BulkLead(Lead):
+    """
+    Registro de una importación masiva (una línea NDJSON). Admite además los
+    datos del cliente; el email se normaliza porque es la clave de
+    deduplicación contra customers.contact_email.
+    """
+    source: str = Field(..., max_length=100)
+    company_name: Optional[str] = Field(None, max_length=255)
+    contact_name: Optional[str] = Field(None, max_length=255)
+    contact_phone: Optional[str] = Field(None, max_length=50)
+
+    @field_validator("contact_email")
+    @classmethod
+    def normalize_email(cls, value: str) -> str:
+        value = value.strip().lower()
+        local, _, domain = value.partition("@")
+        if not local or "." not in domain or len(value) > 255:
+            raise ValueError("invalid email address")
+        return value
+
+    def customer_company(self) -> str:
+        """company_name es obligatorio en customers: se deduce si no viene."""
+        company = self.company_name or self.details.get("company")
+        return str(company)[:255] if company else self.contact_email.partition("@")[2]
+
+
+# Estados de leads.status (ENUM lead_status); won y lost cierran el lead y
+# liberan la plaza del agente asignado.
+LeadStatus = Literal["new", "contacted", "qualified", "proposal_sent", "won", "lost"]
+CLOSED_LEAD_STATUSES = ("won", "lost")
+
+
+class LeadStatusUpdate(BaseModel):
+    status: LeadStatus
+
+
+class AgentLoadReport(BaseModel):
+    """Latido de un agente con su carga actual (valores absolutos)."""
+    inflight_quotes: Optional[int] = Field(None, ge=0, description="Cotizaciones en curso")
+    open_leads: Optional[int] = Field(None, ge=0, description="Leads abiertos, si el agente los lleva")
+    available: Optional[bool] = Field(None, description="False para dejar de recibir leads nuevos")
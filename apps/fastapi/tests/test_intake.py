@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="module")
+def client():
+    os.environ["DATABASE_URL"] = "sqlite://:memory:"
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as http:
+        yield http
+
+
+def lead(email):
+    return {"source": "crm", "contact_email": email, "company_name": "Y", "details": {}}
+
+
+def open_leads(client):
+    return sum(agent["open_leads"] for agent in client.get("/v1/agents").json()["agents"])
+
+
+def test_single_and_bulk_intake_share_the_open_lead_rule(client):
+    body = "\n".join(json.dumps(lead(e)) for e in ["b@y.com", "c@y.com"])
+    lines = client.post("/v1/lead/intake:bulk", content=body).text.splitlines()
+    assert [json.loads(line)["status"] for line in lines[:-1]] == ["created", "created"]
+    load = open_leads(client)
+    assert load == 2
+
+    # c@y.com already has an open lead from the bulk upload.
+    response = client.post("/v1/lead/intake", json=lead("c@y.com"))
+    assert response.status_code == 200
+    assert response.json()["status"] == "duplicate"
+    assert response.json()["lead_id"] is None
+    assert open_leads(client) == load  # No agent slot kept.
+
+    # And the other way round: a single intake makes the bulk record a duplicate.
+    assert client.post("/v1/lead/intake", json=lead("d@y.com")).json()["status"] == "success"
+    lines = client.post("/v1/lead/intake:bulk", content=json.dumps(lead("d@y.com"))).text.splitlines()
+    assert json.loads(lines[0])["status"] == "duplicate"
+
+
+def test_closed_lead_allows_a_new_one(client):
+    created = client.post("/v1/lead/intake", json=lead("e@y.com")).json()
+    assert created["status"] == "success"
+    client.post(f"/v1/leads/{created['lead_id']}/status", json={"status": "won"})
+    assert client.post("/v1/lead/intake", json=lead("e@y.com")).json()["status"] == "success"
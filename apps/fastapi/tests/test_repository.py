@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository import SQLiteRepository  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def customer(email):
+    return {"company_name": email.partition("@")[2], "contact_name": None,
+            "contact_email": email, "contact_phone": None}
+
+
+def lead(email, agent=None):
+    return {"source": "crm", "contact_email": email, "lead_details": {"email": email},
+            "assigned_agent_id": agent}
+
+
+@pytest.fixture
+def repository():
+    async def open_repository():
+        repo = SQLiteRepository(":memory:")
+        await repo.connect()
+        return repo
+
+    repo = run(open_repository())
+    yield repo
+    run(repo.close())
+
+
+def ingest(repo, emails, agents=None, skip_open=False):
+    agents = agents or [None] * len(emails)
+    return run(repo.ingest_leads([customer(e) for e in dict.fromkeys(emails)],
+                                 [lead(e, a) for e, a in zip(emails, agents)], skip_open=skip_open))
+
+
+def ids(leads):
+    return [row["id"] for row in leads]
+
+
+def test_ingest_reuses_customers_and_keeps_order(repository):
+    created = ingest(repository, ["a@x.com", "b@x.com", "a@x.com"])
+    assert [row["lead_id"] for row in created] == [1, 2, 3]
+    assert created[0]["customer_id"] == created[2]["customer_id"] != created[1]["customer_id"]
+    assert run(repository.get_lead(1))["lead_details"] == {"email": "a@x.com"}
+
+
+def test_ingest_skip_open_skips_customers_with_open_leads(repository):
+    first = ingest(repository, ["a@x.com", "b@x.com"])
+    run(repository.set_lead_status(first[0]["lead_id"], "lost"))
+
+    created = ingest(repository, ["a@x.com", "b@x.com", "c@x.com"], skip_open=True)
+    # a@ only had a closed lead, b@ still has an open one, c@ is new.
+    assert created[0]["lead_id"] is not None
+    assert created[1] == {"lead_id": None, "customer_id": first[1]["customer_id"]}
+    assert created[2]["lead_id"] is not None
+    assert len(run(repository.find_leads(limit=10))) == 4
+
+    # Without skip_open the same customer can get another lead.
+    assert ingest(repository, ["b@x.com"])[0]["lead_id"] is not None
+
+
+def test_find_leads_filters_and_pages_by_id(repository):
+    created = ingest(repository, ["a@x.com", "b@x.com", "a@x.com", "c@x.com", "a@x.com"])
+    lead_ids = [row["lead_id"] for row in created]
+    customer_a = created[0]["customer_id"]
+    run(repository.set_lead_status(lead_ids[2], "contacted"))
+
+    assert ids(run(repository.find_leads())) == lead_ids
+    assert ids(run(repository.find_leads(status="new"))) == [lead_ids[i] for i in (0, 1, 3, 4)]
+    assert ids(run(repository.find_leads(customer_id=customer_a))) == [lead_ids[i] for i in (0, 2, 4)]
+    assert ids(run(repository.find_leads(status="new", customer_id=customer_a))) == \
+        [lead_ids[0], lead_ids[4]]
+    assert run(repository.find_leads(status="won")) == []
+
+    # Keyset pagination: each page starts after the last id received.
+    pages, after_id = [], 0
+    while True:
+        page = run(repository.find_leads(limit=2, after_id=after_id))
+        if not page:
+            break
+        pages.append(ids(page))
+        after_id = page[-1]["id"]
+    assert pages == [lead_ids[0:2], lead_ids[2:4], lead_ids[4:]]
+
+
+def test_set_lead_status_returns_previous_status(repository):
+    [created] = ingest(repository, ["a@x.com"], agents=["agent-1"])
+    lead_id = created["lead_id"]
+
+    assert run(repository.set_lead_status(lead_id, "qualified")) == \
+        {"previous_status": "new", "assigned_agent_id": "agent-1"}
+    assert run(repository.set_lead_status(lead_id, "won"))["previous_status"] == "qualified"
+    assert run(repository.get_lead(lead_id))["status"] == "won"
+    assert run(repository.set_lead_status(999, "won")) is None
+
+
+def test_open_leads_by_agent_ignores_closed_and_unassigned(repository):
+    created = ingest(repository, ["a@x.com", "b@x.com", "c@x.com", "d@x.com", "e@x.com"],
+                     agents=["agent-1", "agent-1", "agent-2", "agent-2", None])
+    run(repository.set_lead_status(created[1]["lead_id"], "won"))
+    run(repository.set_lead_status(created[2]["lead_id"], "lost"))
+    run(repository.set_lead_status(created[3]["lead_id"], "proposal_sent"))
+
+    assert run(repository.open_leads_by_agent()) == {"agent-1": 1, "agent-2": 1}
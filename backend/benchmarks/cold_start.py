@@ -0,0 +1,199 @@
+"""
+Benchmark de arranque en frío de los servicios Flask.
+
+Para cada servicio lanza un proceso nuevo (Gunicorn si está instalado, o
+el servidor de desarrollo de Flask), consulta su endpoint de salud cada
+pocos milisegundos y mide el tiempo desde el lanzamiento hasta el primer
+200. Después lee GET /startup (desglose por fases de common/startup.py),
+detiene el proceso y repite. Con --compare-preload mide además cada
+servicio en modo precarga (gunicorn --preload y APP_PRELOAD=1).
+
+Uso (desde backend/):
+
+    python -m benchmarks.cold_start --runs 5 --output cold_start.json
+    python -m benchmarks.cold_start --services operations,finance --compare-preload
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Servicio -> (directorio, objeto WSGI, ruta que debe responder 200).
+SERVICES = {
+    'commercial': ('commercial', 'run:app', '/health'),
+    'finance': ('finance', 'app:app', '/api/financial_summary'),
+    'operations': ('operations', 'app:app', '/api/operations/status'),
+    'commercial_agent': ('commercial_agent', 'app:app', '/status'),
+    'finance_agent': ('finance_agent', 'app:app', '/status'),
+    'operations_agent': ('operations_agent', 'app:app', '/status'),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_command(server, target, port, workers, preload):
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(workers), '--log-level', 'warning']
+        if preload:
+            command.append('--preload')
+        return command + [target]
+    module, _, name = target.partition(':')
+    return [sys.executable, '-m', 'flask', '--app', f'{module}:{name}', 'run',
+            '--port', str(port), '--no-reload', '--no-debugger']
+
+
+def _get(url, timeout=1.0):
+    """(status, cuerpo) o (None, None) si el servidor aún no acepta conexiones."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def measure(service, args, preload, workdir):
+    """Un arranque: ms hasta el primer 200 y el desglose de /startup."""
+    directory, target, probe = SERVICES[service]
+    port = free_port()
+    # backend/ en el path para `common`, como PYTHONPATH=/ en los contenedores.
+    pythonpath = os.pathsep.join(filter(None, (BACKEND_DIR, os.environ.get('PYTHONPATH'))))
+    env = dict(os.environ, APP_PRELOAD='1' if preload else '0', FLASK_ENV=args.flask_env,
+               PYTHONPATH=pythonpath, STORAGE_BACKEND=args.storage,
+               SQLITE_PATH=os.path.join(workdir, f'{service}-{port}.db'),
+               OPERATIONS_SNAPSHOT_DIR=os.path.join(workdir, 'snapshots'))
+    command = server_command(args.server, target, port, args.workers, preload)
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=os.path.join(BACKEND_DIR, directory), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    try:
+        deadline = started + args.timeout
+        first_status = None
+        while time.perf_counter() < deadline:
+            status, _ = _get(f'http://127.0.0.1:{port}{probe}')
+            if status is not None:
+                first_status = status
+            if status == 200:
+                break
+            if process.poll() is not None:
+                raise RuntimeError(f"{service} exited with code {process.returncode}")
+            time.sleep(args.poll_ms / 1000)
+        else:
+            raise RuntimeError(f"{service} did not answer 200 within {args.timeout}s "
+                               f"(last status {first_status})")
+        cold_start_ms = (time.perf_counter() - started) * 1000
+
+        _, body = _get(f'http://127.0.0.1:{port}/startup')
+        breakdown = json.loads(body) if body else None
+        return {"cold_start_ms": round(cold_start_ms, 3), "startup": breakdown}
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def summarize(runs):
+    values = sorted(r["cold_start_ms"] for r in runs)
+    phases = {}
+    for run in runs:
+        for phase in (run["startup"] or {}).get("phases", []):
+            phases.setdefault(phase["name"], []).append(phase["ms"])
+    return {
+        "cold_start_ms": {
+            "min": values[0], "median": round(statistics.median(values), 3),
+            "max": values[-1], "mean": round(statistics.mean(values), 3),
+        },
+        "phases_median_ms": {name: round(statistics.median(ms), 3) for name, ms in phases.items()},
+        "ready_median_ms": round(statistics.median(
+            [r["startup"]["ready_ms"] for r in runs if r["startup"]]), 3)
+        if any(r["startup"] for r in runs) else None,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--services', default=','.join(SERVICES),
+                        help="servicios separados por comas")
+    parser.add_argument('--runs', type=int, default=5, help="arranques por servicio y modo")
+    parser.add_argument('--server', choices=('gunicorn', 'flask'),
+                        default='gunicorn' if importlib.util.find_spec('gunicorn') else 'flask')
+    parser.add_argument('--workers', type=int, default=4, help="workers de Gunicorn")
+    parser.add_argument('--preload', action='store_true', help="medir solo el modo precarga")
+    parser.add_argument('--compare-preload', action='store_true',
+                        help="medir con y sin precarga")
+    parser.add_argument('--flask-env', default='production',
+                        help="FLASK_ENV del Agente Comercial")
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='sqlite')
+    parser.add_argument('--poll-ms', type=float, default=5.0)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', help="archivo donde guardar el reporte JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    services = [s.strip() for s in args.services.split(',') if s.strip()]
+    unknown = [s for s in services if s not in SERVICES]
+    if unknown:
+        raise SystemExit(f"Unknown service(s): {', '.join(unknown)}")
+    if args.compare_preload:
+        modes = (False, True)
+    else:
+        modes = (args.preload,)
+    if True in modes and args.server != 'gunicorn':
+        print("Note: --preload only changes process layout under gunicorn; with the Flask "
+              "server APP_PRELOAD=1 just moves deferred work into startup.", file=sys.stderr)
+
+    report = {
+        "config": {"server": args.server, "workers": args.workers, "runs": args.runs,
+                   "storage": args.storage, "flask_env": args.flask_env},
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": os.cpu_count()},
+        "services": {},
+    }
+    with tempfile.TemporaryDirectory(prefix='cold-start-') as workdir:
+        for service in services:
+            for preload in modes:
+                mode = 'preload' if preload else 'default'
+                runs = [measure(service, args, preload, workdir) for _ in range(args.runs)]
+                result = dict(summarize(runs), runs=runs)
+                report["services"].setdefault(service, {})[mode] = result
+                print(f"{service:17s} {mode:8s} first 200: "
+                      f"median {result['cold_start_ms']['median']:8.1f} ms  "
+                      f"(min {result['cold_start_ms']['min']:.1f}, max {result['cold_start_ms']['max']:.1f})",
+                      file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,72 @@
 from flask import Flask
 from config import config_by_name
 
-def create_app(config_name):
+from common.instrumentation import instrument_app
+from common.json_provider import install_json_provider
+from common.startup import StartupProfile, install_startup_report, preload_enabled, preload_modules
+from .models.storage import get_storage, init_storage
+
+# Módulos que solo se importan al primer uso y que el modo precarga
+# (APP_PRELOAD=1 con Gunicorn --preload) carga en el maestro.
+DEFERRED_MODULES = ('numpy',)
+
+def create_app(config_name, startup=None):
     """
-    Factory de la aplicación Flask.
+    Factory de la aplicación Flask. `startup` es el StartupProfile del
+    proceso (run.py lo crea antes de los imports); si no se indica, se mide
+    solo la construcción de la app.
+
+    Compatible con Gunicorn --preload: la app se construye una vez en el
+    maestro y los workers la heredan. Lo que no sobrevive a un fork (hilos
+    del despachador y del outbox, conexiones SQLite, sesiones HTTP) se crea
+    por proceso en su primer uso.
     """
-    app = Flask(__name__)
+    startup = startup or StartupProfile('commercial')
+
+    with startup.phase('app'):
+        app = Flask(__name__)
+
+        # Cargar la configuración desde el objeto de configuración
+        app.config.from_object(config_by_name[config_name])
 
-    # Cargar la configuración desde el objeto de configuración
-    app.config.from_object(config_by_name[config_name])
+        # Serialización JSON con orjson (si está instalado) y gzip de respuestas grandes
+        install_json_provider(app)
+
+    # Inicializar el backend de almacenamiento compartido por los servicios
+    with startup.phase('storage'):
+        init_storage(app.config)
 
     # Registrar Blueprints (rutas)
-    from .api.commercial_agent_api import commercial_bp
-    from .api.mock_external_agents_api import mock_agents_bp
+    with startup.phase('blueprints'):
+        from .api.commercial_agent_api import commercial_bp
+
+        app.register_blueprint(commercial_bp, url_prefix='/api/commercial')
+
+        # Solo registrar (e importar) los mocks si no estamos en producción.
+        if app.config['DEBUG']:
+            from .api.mock_external_agents_api import mock_agents_bp
+            app.register_blueprint(mock_agents_bp, url_prefix='/api')
 
-    app.register_blueprint(commercial_bp, url_prefix='/api/commercial')
+    # Métricas por ruta en /metrics y perfilado opcional
+    instrument_app(app, 'commercial')
 
-    # Solo registrar los mocks si no estamos en producción.
-    if app.config['DEBUG']:
-        app.register_blueprint(mock_agents_bp, url_prefix='/api')
+    # Barrido de cotizaciones atascadas en AWAITING_AGENTS; el hilo arranca
+    # en la primera petición de cada worker, nunca en el maestro.
+    from .services.quote_service import ensure_quote_sweeper
+
+    @app.before_request
+    def start_quote_sweeper():
+        ensure_quote_sweeper(app.config)
 
     @app.route('/health')
     def health_check():
         return "Agente Comercial: OK", 200
 
+    if preload_enabled():
+        preload_modules(DEFERRED_MODULES, startup)
+        # El esquema y los contadores ya quedaron listos en el maestro; su
+        # conexión SQLite no debe heredarse (cada worker abre la suya).
+        get_storage().close()
+
+    install_startup_report(app, startup)
     return app
@@ -1,9 +1,11 @@
 import uuid
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 
-from app.models.in_memory_db import leads_db, quotes_db, projects_db
+from app.models.records import LeadStatus, QuoteStatus
+from app.models.storage import get_storage
 from app.services import lead_service, quote_service, funnel_service
+from app.services.agent_dispatcher import get_dispatcher
 
 commercial_bp = Blueprint('commercial_api', __name__)
 
@@ -16,12 +18,13 @@ def create_lead():
         return jsonify({"error": "Missing data: 'source' and 'details' are required"}), 400
 
     lead_id = f"lead-{uuid.uuid4().hex[:6]}"
-    leads_db[lead_id] = {
+    lead = {
         "id": lead_id, "source": data['source'], "details": data['details'],
         "criteria": data.get('criteria', {"icp": 50, "intent": 50, "engagement": 10}),
-        "score": 0, "status": "PRELIMINARY", "created_at": datetime.utcnow().isoformat()
+        "score": 0, "status": LeadStatus.PRELIMINARY, "created_at": datetime.utcnow().isoformat()
     }
-    return jsonify(leads_db[lead_id]), 201
+    get_storage().save_lead(lead)
+    return jsonify(lead), 201
 
 @commercial_bp.route('/leads/<string:lead_id>/qualify', methods=['POST'])
 def qualify_single_lead(lead_id):
@@ -30,6 +33,46 @@ def qualify_single_lead(lead_id):
         return jsonify({"error": "Lead not found"}), 404
     return jsonify(lead), 200
 
+@commercial_bp.route('/leads/qualify:batch', methods=['POST'])
+def qualify_leads_batch():
+    """
+    Recalifica leads en bloque. Cuerpo: {"lead_ids": [...]} o
+    {"all_preliminary": true}, con "weights" y "chunk_size" opcionales.
+    Los lotes grandes (o "stream": true) responden NDJSON con el progreso.
+    """
+    data = request.get_json() or {}
+    lead_ids = data.get('lead_ids')
+    if data.get('all_preliminary'):
+        lead_ids = None
+    elif not isinstance(lead_ids, list):
+        return jsonify({"error": "Provide 'lead_ids' (list) or 'all_preliminary': true"}), 400
+    elif any(isinstance(i, bool) or not isinstance(i, (str, int)) for i in lead_ids):
+        # Los ids se usan como claves: un objeto o una lista rompería el lote.
+        return jsonify({"error": "Every entry in 'lead_ids' must be a string or an integer"}), 400
+
+    chunk_size = data.get('chunk_size', 10000)
+    if not isinstance(chunk_size, int) or chunk_size <= 0:
+        return jsonify({"error": "'chunk_size' must be a positive integer"}), 400
+
+    try:
+        weights = lead_service.resolve_weights(data.get('weights'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    progress = lead_service.qualify_leads_batch(lead_ids, weights, chunk_size)
+
+    threshold = current_app.config.get('LEAD_BATCH_STREAM_THRESHOLD', 10000)
+    stream = data.get('stream', lead_ids is None or len(lead_ids) > threshold)
+    if stream:
+        dumps = current_app.json.dumps
+        lines = (dumps(p, sort_keys=False) + "\n" for p in progress)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    summary = None
+    for summary in progress:
+        pass
+    return jsonify(summary), 200
+
 # --- Rutas para Cotizaciones (Quotes) ---
 
 @commercial_bp.route('/quotes', methods=['POST'])
@@ -38,23 +81,95 @@ def create_quote():
     if not data or 'lead_id' not in data or 'operations_payload' not in data or 'finance_payload' not in data:
         return jsonify({"error": "Missing lead_id, operations_payload, or finance_payload"}), 400
 
-    quote_id = f"QT-{datetime.utcnow().year}-{uuid.uuid4().hex[:4].upper()}"
-    quotes_db[quote_id] = {
-        "id": quote_id, "lead_id": data['lead_id'], "status": "DRAFT",
-        "operations_check": {"request_id": quote_id, "response": None},
-        "finance_check": {"response": None}, "created_at": datetime.utcnow().isoformat()
-    }
-
-    quote_service.initiate_quote_process(quote_id, data)
-    return jsonify({"message": "Quote process initiated", "quote_id": quote_id}), 202
+    # Idempotency-Key: los reintentos con la misma clave reciben la misma
+    # cotización; peticiones idénticas en curso comparten el mismo proceso.
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= 255:
+        return jsonify({"error": "Idempotency-Key must be 1-255 characters"}), 400
+
+    try:
+        quote_id, outcome = quote_service.create_quote(data, idempotency_key)
+    except quote_service.IdempotencyConflict as e:
+        return jsonify({"error": str(e)}), 422
+    except quote_service.QuoteDispatchSaturated as e:
+        return jsonify({"error": "Quote dispatcher saturated, retry later",
+                        "quote_id": e.quote_id}), 503, {"Retry-After": "1"}
+
+    body = {"message": "Quote process initiated", "quote_id": quote_id,
+            "coalesced": outcome == "coalesced"}
+    headers = {"Idempotent-Replayed": "true"} if outcome == "replayed" else {}
+    return jsonify(body), 202, headers
+
+def _wait_seconds():
+    """Segundos de ?wait=N, acotados por QUOTE_MAX_WAIT_SECONDS (None si no se pide)."""
+    wait = request.args.get('wait', type=float)
+    if wait is None or wait <= 0:
+        return None
+    return min(wait, current_app.config.get('QUOTE_MAX_WAIT_SECONDS', 30))
 
 @commercial_bp.route('/quotes/<string:quote_id>', methods=['GET'])
 def get_quote_status(quote_id):
-    quote = quotes_db.get(quote_id)
+    # ?wait=N: long-poll que responde en cuanto la cotización se resuelve.
+    wait = _wait_seconds()
+    if wait is None:
+        quote = get_storage().get_quote(quote_id)
+    else:
+        quote = quote_service.wait_for_resolution(quote_id, wait)
+    if not quote:
+        return jsonify({"error": "Quote not found"}), 404
+    return jsonify(quote), 200
+
+@commercial_bp.route('/quotes/<string:quote_id>/events', methods=['GET'])
+def stream_quote_events(quote_id):
+    """Server-Sent Events: un evento 'status' por cambio, hasta resolverse."""
+    if not get_storage().get_quote(quote_id):
+        return jsonify({"error": "Quote not found"}), 404
+
+    timeout = current_app.config.get('QUOTE_MAX_WAIT_SECONDS', 30)
+    resolved = quote_service.RESOLVED_STATUSES
+
+    dumps = current_app.json.dumps
+
+    def events():
+        for quote in quote_service.iter_status_changes(quote_id, timeout):
+            yield f"event: status\ndata: {dumps(quote, sort_keys=False)}\n\n"
+            if quote['status'] in resolved:
+                yield "event: resolved\ndata: {}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Estados que la API permite fijar a mano.
+_COMMERCIAL_STATUSES = (QuoteStatus.SENT, QuoteStatus.WON, QuoteStatus.LOST)
+
+@commercial_bp.route('/quotes/<string:quote_id>/status', methods=['POST'])
+def update_quote_status(quote_id):
+    """Transiciones comerciales posteriores al cálculo: SENT, WON, LOST."""
+    data = request.get_json() or {}
+    status = data.get('status')
+    if status not in _COMMERCIAL_STATUSES:
+        return jsonify({"error": "'status' must be one of SENT, WON, LOST"}), 400
+    try:
+        quote = quote_service.set_quote_status(quote_id, QuoteStatus(status))
+    except quote_service.InvalidTransition as e:
+        return jsonify({"error": str(e)}), 409
     if not quote:
         return jsonify({"error": "Quote not found"}), 404
     return jsonify(quote), 200
 
+@commercial_bp.route('/dispatcher/stats', methods=['GET'])
+def get_dispatcher_stats():
+    """Profundidad de cola y peticiones en vuelo por agente del worker actual."""
+    return jsonify(get_dispatcher(current_app.config).stats()), 200
+
+@commercial_bp.route('/storage/retention', methods=['GET'])
+def get_retention_stats():
+    """Leads y cotizaciones en memoria y archivados (conteos y bytes) del worker actual."""
+    stats = get_storage().retention_stats()
+    if stats is None:
+        return jsonify({"enabled": False, "backend": current_app.config.get('STORAGE_BACKEND')}), 200
+    return jsonify(stats), 200
+
 # --- Rutas de Callback para otros Agentes ---
 
 @commercial_bp.route('/costing-parameters/<string:quote_id>', methods=['POST'])
@@ -73,9 +188,47 @@ def receive_capacity_response(request_id):
         return jsonify({"error": message}), 404
     return jsonify({"message": message}), 200
 
+# Tipo de callback -> procesador, para el endpoint masivo.
+_CALLBACK_HANDLERS = {
+    'capacity_check': quote_service.process_operations_response,
+    'costing': quote_service.process_finance_response,
+}
+
+@commercial_bp.route('/callbacks:batch', methods=['POST'])
+def receive_callbacks_batch():
+    """
+    Recibe varios callbacks de agentes en una sola petición:
+    {"callbacks": [{"id", "type", "ref_id", "payload"}, ...]}. Responde el
+    resultado de cada uno (status estilo HTTP) para que el emisor reintente
+    solo los que fallaron.
+    """
+    data = request.get_json() or {}
+    callbacks = data.get('callbacks')
+    if not isinstance(callbacks, list):
+        return jsonify({"error": "'callbacks' must be a list"}), 400
+
+    results = []
+    for callback in callbacks:
+        handler = _CALLBACK_HANDLERS.get(callback.get('type'))
+        if handler is None or not isinstance(callback.get('payload'), dict):
+            results.append({"id": callback.get('id'), "status": 400,
+                            "message": "Unknown callback type or invalid payload"})
+            continue
+        try:
+            success, message = handler(callback.get('ref_id'), callback['payload'])
+        except Exception as e:
+            results.append({"id": callback.get('id'), "status": 500, "message": str(e)})
+            continue
+        results.append({"id": callback.get('id'), "status": 200 if success else 404,
+                        "message": message})
+    return jsonify({"results": results}), 200
+
 # --- Rutas para el Funnel de Ventas ---
 
 @commercial_bp.route('/funnel/kpis', methods=['GET'])
 def get_kpis():
+    # ?check=1 recalcula desde cero y compara con los contadores incrementales.
+    if request.args.get('check') in ('1', 'true'):
+        return jsonify(funnel_service.check_funnel_kpis()), 200
     kpis = funnel_service.get_funnel_kpis()
     return jsonify(kpis), 200
@@ -1,7 +1,8 @@
 import time
-import requests
 from flask import Blueprint, request, jsonify, current_app
 
+from app.services.callback_outbox import get_outbox
+
 # Este Blueprint simula las APIs de los otros agentes para pruebas aisladas.
 mock_agents_bp = Blueprint('mock_agents_api', __name__)
 
@@ -16,11 +17,10 @@ def mock_capacity_check():
       "estimated_start_date": "2025-11-05"
     }
 
-    callback_url = f"http://127.0.0.1:5003/api/commercial/capacity-check-response/{request_id}"
-    try:
-        requests.post(callback_url, json=mock_response, timeout=5)
-    except requests.exceptions.RequestException as e:
-        print(f"Mock-Operations: Could not call back Commercial Agent. Error: {e}")
+    # El callback se entrega en segundo plano (en lote y con reintentos).
+    config = current_app.config
+    get_outbox(config).enqueue(config['COMMERCIAL_CALLBACK_URL'], 'capacity_check',
+                               request_id, mock_response)
 
     return jsonify({"message": "Capacity check received by mock Operations. Processing..."}), 202
 
@@ -39,10 +39,14 @@ def mock_quote_costing():
       "current_fcf_rate": fcf_rate, "notes": "Costo base incluye 30% de contribución (mock)."
     }
 
-    callback_url = f"http://127.0.0.1:5003/api/commercial/costing-parameters/{quote_id}"
-    try:
-        requests.post(callback_url, json=mock_response, timeout=5)
-    except requests.exceptions.RequestException as e:
-        print(f"Mock-Finance: Could not call back Commercial Agent. Error: {e}")
+    config = current_app.config
+    get_outbox(config).enqueue(config['COMMERCIAL_CALLBACK_URL'], 'costing',
+                               quote_id, mock_response)
 
     return jsonify({"message": "Costing request received by mock Finance. Processing..."}), 202
+
+
+@mock_agents_bp.route('/callbacks/stats', methods=['GET'])
+def mock_callback_stats():
+    """Estado de la cola de callbacks salientes de los mocks."""
+    return jsonify(get_outbox(current_app.config).stats()), 200
@@ -0,0 +1,195 @@
+# --- Archivo en Disco de Registros Fríos ---
+# Leads y cotizaciones que el backend en memoria retira de su conjunto
+# activo (ver InMemoryStorage y la retención en config.py). Cada registro se
+# guarda como JSON compacto comprimido con zlib en un archivo SQLite propio
+# del proceso, con el estado y el lead_id en columnas para filtrar sin
+# descomprimir (los registros pequeños van sin comprimir). El archivo es
+# espacio temporal: vive lo que vive el almacén en memoria y se borra al
+# salir. Si el proceso muere sin pasar por atexit (SIGKILL, OOM), el
+# archivo queda huérfano; lleva el pid en el nombre para que el siguiente
+# proceso que archive en el mismo directorio lo reconozca y lo borre.
+#
+# No es seguro entre hilos por sí solo: InMemoryStorage lo usa siempre bajo
+# su lock.
+import atexit
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import zlib
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    status TEXT,
+    lead_id TEXT,
+    data BLOB NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_records_status ON records(kind, status);
+"""
+
+# Registros por sentencia IN (...) (límite de variables de SQLite).
+_IN_CHUNK = 500
+
+# Por debajo de este tamaño el JSON se guarda sin comprimir: en registros
+# pequeños zlib apenas reduce un tercio y cuesta más que el resto del
+# archivado. Los blobs comprimidos empiezan por 0x78 y los JSON por '{'.
+_COMPRESS_MIN_BYTES = 512
+
+
+# memory-archive-<pid>-<aleatorio>.db y sus -wal/-shm.
+_ARCHIVE_NAME = re.compile(r'^memory-archive-(\d+)-.+\.db(-wal|-shm)?$')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, pero es de otro usuario.
+    return True
+
+
+def remove_orphans(directory=None):
+    """
+    Borra los archivos de procesos que ya no existen (o de un proceso
+    anterior con nuestro mismo pid). Devuelve cuántos borró.
+    """
+    directory = directory or tempfile.gettempdir()
+    own_pid = os.getpid()
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        match = _ARCHIVE_NAME.match(name)
+        if match is None:
+            continue
+        pid = int(match.group(1))
+        if pid != own_pid and _pid_alive(pid):
+            continue
+        try:
+            os.remove(os.path.join(directory, name))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _pack(record):
+    data = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return zlib.compress(data, 6) if len(data) >= _COMPRESS_MIN_BYTES else data
+
+
+def _unpack(blob):
+    return json.loads(blob if blob[:1] == b'{' else zlib.decompress(blob))
+
+
+class RecordArchive:
+    """Registros archivados por (tipo, id); tipo es 'lead' o 'quote'."""
+
+    def __init__(self, directory=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = None
+        self.pid = None
+        self._conn = None
+        atexit.register(self._remove)
+
+    def _connection(self):
+        # El archivo se crea en el primer uso, y de nuevo en un proceso hijo
+        # tras un fork: cada proceso tiene su propio almacén en memoria.
+        if self._conn is None or self.pid != os.getpid():
+            # Aún no hay archivo propio: todo lo que lleve nuestro pid es huérfano.
+            remove_orphans(self.directory)
+            fd, self.path = tempfile.mkstemp(prefix=f'memory-archive-{os.getpid()}-',
+                                             suffix='.db', dir=self.directory)
+            os.close(fd)
+            self.pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _remove(self):
+        if self.path is None or self.pid != os.getpid():
+            return  # El archivo es del proceso que lo creó.
+        if self._conn is not None:
+            self._conn.close()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except OSError:
+                pass
+
+    def put_many(self, kind, records):
+        """Archiva los registros (dicts) en una sola transacción."""
+        rows = [(kind, r['id'], r.get('status'), r.get('lead_id'), _pack(r)) for r in records]
+        if not rows:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO records (kind, id, status, lead_id, data) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, kind, record_id):
+        row = self._connection().execute(
+            "SELECT data FROM records WHERE kind = ? AND id = ?", (kind, record_id)).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def get_many(self, kind, record_ids):
+        """{id: registro} de los ids archivados entre record_ids."""
+        found = {}
+        record_ids = list(record_ids)
+        for start in range(0, len(record_ids), _IN_CHUNK):
+            chunk = record_ids[start:start + _IN_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            for record_id, blob in self._connection().execute(
+                    f"SELECT id, data FROM records WHERE kind = ? AND id IN ({marks})",
+                    [kind] + chunk):
+                found[record_id] = _unpack(blob)
+        return found
+
+    def delete(self, kind, record_id):
+        self._connection().execute("DELETE FROM records WHERE kind = ? AND id = ?",
+                                   (kind, record_id))
+
+    def iter(self, kind, statuses=None, lead_id=None):
+        """Registros archivados de un tipo, filtrados por estado y lead_id."""
+        sql, params = "SELECT data FROM records WHERE kind = ?", [kind]
+        if statuses is not None:
+            sql += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        if lead_id is not None:
+            sql += " AND lead_id = ?"
+            params.append(lead_id)
+        for (blob,) in self._connection().execute(sql, params).fetchall():
+            yield _unpack(blob)
+
+    def stats(self):
+        """{tipo: {"count", "bytes"}} (bytes de los blobs) y tamaño del archivo."""
+        result = {"leads": {"count": 0, "bytes": 0}, "quotes": {"count": 0, "bytes": 0}}
+        if self._conn is not None:
+            for kind, count, size in self._connection().execute(
+                    "SELECT kind, COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM records GROUP BY kind"):
+                result[f"{kind}s"] = {"count": count, "bytes": size}
+        file_bytes = 0
+        for suffix in (('', '-wal') if self.path else ()):
+            try:
+                file_bytes += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        result["file_bytes"] = file_bytes
+        return result
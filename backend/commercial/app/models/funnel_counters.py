@@ -0,0 +1,62 @@
+# --- Contadores Incrementales del Embudo de Ventas ---
+# Los backends de almacenamiento aplican estos deltas en cada escritura de un
+# lead o cotización (dentro de la misma transacción), de modo que los KPIs del
+# embudo se leen en O(1) en lugar de recorrer todos los registros.
+
+from .records import LeadStatus, QuoteStatus
+
+SENT_STATUSES = frozenset((QuoteStatus.SENT, QuoteStatus.WON, QuoteStatus.LOST))
+
+COUNTER_NAMES = ('quotes_total', 'quotes_sent', 'deals_won', 'deals_lost',
+                 'value_won', 'new_mqls')
+
+
+def _quote_contribution(quote):
+    if quote is None:
+        return {}
+    status = quote['status']
+    won = status == QuoteStatus.WON
+    return {
+        'quotes_total': 1,
+        'quotes_sent': 1 if status in SENT_STATUSES else 0,
+        'deals_won': 1 if won else 0,
+        'deals_lost': 1 if status == QuoteStatus.LOST else 0,
+        'value_won': quote.get('final_price', 0) if won else 0,
+    }
+
+
+def _lead_contribution(lead):
+    if lead is None:
+        return {}
+    return {'new_mqls': 1 if lead['status'] == LeadStatus.MQL else 0}
+
+
+def _diff(old, new):
+    deltas = {}
+    for name in set(old) | set(new):
+        delta = new.get(name, 0) - old.get(name, 0)
+        if delta:
+            deltas[name] = delta
+    return deltas
+
+
+def quote_deltas(old_quote, new_quote):
+    """Deltas de contadores al pasar de old_quote a new_quote (None = no existe)."""
+    return _diff(_quote_contribution(old_quote), _quote_contribution(new_quote))
+
+
+def lead_deltas(old_lead, new_lead):
+    """Deltas de contadores al pasar de old_lead a new_lead (None = no existe)."""
+    return _diff(_lead_contribution(old_lead), _lead_contribution(new_lead))
+
+
+def compute_counters(quotes, leads):
+    """Recalcula todos los contadores desde cero (reconstrucción y auditoría)."""
+    counters = dict.fromkeys(COUNTER_NAMES, 0)
+    for quote in quotes:
+        for name, value in _quote_contribution(quote).items():
+            counters[name] += value
+    for lead in leads:
+        for name, value in _lead_contribution(lead).items():
+            counters[name] += value
+    return counters
@@ -1,11 +1,420 @@
 # --- Simulación de Base de Datos en Memoria ---
 # En producción, esto sería una base de datos real (PostgreSQL, etc.).
+# Solo es válida con un único proceso: con varios workers de Gunicorn cada
+# uno tendría su propia copia. Para ese caso usar STORAGE_BACKEND=sqlite.
+# Leads y cotizaciones se guardan como registros con __slots__ (ver
+# records.py) y se entregan como dicts nuevos con el formato de la API.
+#
+# Con retención activa, el almacén solo guarda en memoria el conjunto
+# activo: las cotizaciones terminadas y los leads descartados pasan a un
+# archivo en disco (archive.py) tras un TTL, y si aun así se supera el
+# máximo se archivan los registros usados hace más tiempo (LRU). Leer o
+# modificar un registro archivado lo devuelve a memoria; los recorridos y
+# conteos incluyen los archivados, así que para la API no hay diferencia.
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
 
-# Almacén de datos para leads.
-leads_db = {}
+from .archive import RecordArchive
+from .funnel_counters import compute_counters, lead_deltas, quote_deltas
+from .records import Lead, LeadStatus, Quote, QuoteStatus
+from .storage import BaseStorage, _as_status_set
 
-# Almacén de datos para cotizaciones.
-quotes_db = {}
+# Almacén de datos para leads (orden = uso reciente, para la LRU).
+leads_db = OrderedDict()
+
+# Almacén de datos para cotizaciones (orden = uso reciente, para la LRU).
+quotes_db = OrderedDict()
 
 # Almacén de datos para proyectos ganados.
 projects_db = {}
+
+# Claves de deduplicación: clave -> (quote_id, fingerprint, vence_en).
+request_keys = {}
+
+# Reservas nuevas entre barridos de las claves vencidas.
+_KEY_PURGE_EVERY = 1000
+
+# Estados finales que la retención archiva al vencer el TTL.
+TERMINAL_QUOTE_STATUSES = frozenset((
+    QuoteStatus.WON, QuoteStatus.LOST, QuoteStatus.REJECTED_CAPACITY,
+    QuoteStatus.ERROR_OPERATIONS, QuoteStatus.ERROR_FINANCE,
+    QuoteStatus.ERROR_COSTING, QuoteStatus.ERROR_DISPATCH,
+))
+TERMINAL_LEAD_STATUSES = frozenset((LeadStatus.QUALIFIED_OUT,))
+
+
+class _Kind:
+    """Estado de retención de un tipo de registro (leads o cotizaciones)."""
+
+    def __init__(self, name, db, record_type, terminal_statuses, max_hot):
+        self.name = name
+        self.db = db
+        self.record_type = record_type
+        self.terminal_statuses = terminal_statuses
+        self.max_hot = max_hot
+        # id -> estado de los archivados (conteos sin tocar el disco).
+        self.archived = {}
+        # id -> instante (monotónico) en que entró en un estado final, en
+        # orden de llegada: el barrido solo mira el principio.
+        self.terminal_since = OrderedDict()
+
+
+class InMemoryStorage(BaseStorage):
+    """
+    Backend sobre los diccionarios del módulo, protegido con un lock. Solo
+    update_* copia en profundidad (el mutator puede tocar valores anidados);
+    las lecturas devuelven un dict nuevo que comparte los valores anidados,
+    que el almacén nunca modifica en su sitio.
+
+    Retención (opcional): con ttl_seconds, los registros en estado final
+    llevan más de ese tiempo así se archivan; max_hot_leads/max_hot_quotes
+    acotan cuántos quedan en memoria. El barrido se hace cada sweep_every
+    escrituras, por lo que el conjunto activo puede superar el máximo en
+    hasta ese número de registros entre barridos.
+    """
+
+    def __init__(self, ttl_seconds=None, max_hot_leads=None, max_hot_quotes=None,
+                 sweep_every=1000, archive_dir=None):
+        self._lock = threading.RLock()
+        self._counters = compute_counters(quotes_db.values(), leads_db.values())
+        self._claims_since_purge = 0
+
+        self.retention = bool(ttl_seconds is not None or max_hot_leads or max_hot_quotes)
+        self.ttl_seconds = ttl_seconds
+        self.sweep_every = max(1, sweep_every)
+        self._archive = RecordArchive(archive_dir) if self.retention else None
+        self._leads = _Kind('lead', leads_db, Lead, TERMINAL_LEAD_STATUSES, max_hot_leads)
+        self._quotes = _Kind('quote', quotes_db, Quote, TERMINAL_QUOTE_STATUSES, max_hot_quotes)
+        self._writes_since_sweep = 0
+        self._retention_stats = {"sweeps": 0, "archived_by_ttl": 0, "archived_by_lru": 0,
+                                 "faulted_in": 0, "last_sweep_ms": None}
+        if self.retention:
+            now = time.monotonic()
+            for kind in (self._leads, self._quotes):
+                for record in kind.db.values():
+                    self._track(kind, record, now)
+
+    def _apply_deltas(self, deltas):
+        for name, delta in deltas.items():
+            self._counters[name] += delta
+
+    def _put(self, kind, record, deltas):
+        record_id = record['id']
+        old = kind.db.get(record_id)
+        if old is None and record_id in kind.archived:
+            # Se sobrescribe un registro archivado: sale del archivo.
+            old = kind.record_type.from_dict(self._archive.get(kind.name, record_id))
+            self._archive.delete(kind.name, record_id)
+            del kind.archived[record_id]
+        self._apply_deltas(deltas(old, record))
+        kind.db[record_id] = record
+        if self.retention:
+            kind.db.move_to_end(record_id)
+            self._track(kind, record, time.monotonic())
+            self._writes_since_sweep += 1
+
+    def _put_lead(self, lead):
+        self._put(self._leads, lead, lead_deltas)
+
+    def _put_quote(self, quote):
+        self._put(self._quotes, quote, quote_deltas)
+
+    # --- Retención ---
+
+    def _track(self, kind, record, now):
+        """Anota cuándo entró un registro en estado final (o lo olvida si salió)."""
+        if record.status in kind.terminal_statuses:
+            if record['id'] not in kind.terminal_since:
+                kind.terminal_since[record['id']] = now
+        else:
+            kind.terminal_since.pop(record['id'], None)
+
+    def _hot(self, kind, record_id):
+        """El registro en memoria; si está archivado, lo devuelve a memoria."""
+        record = kind.db.get(record_id)
+        if record is not None:
+            if self.retention:
+                kind.db.move_to_end(record_id)
+            return record
+        if record_id not in kind.archived:
+            return None
+        record = kind.record_type.from_dict(self._archive.get(kind.name, record_id))
+        self._archive.delete(kind.name, record_id)
+        del kind.archived[record_id]
+        kind.db[record_id] = record
+        # El TTL vuelve a contar desde ahora: se acaba de usar.
+        kind.terminal_since.pop(record_id, None)
+        self._track(kind, record, time.monotonic())
+        self._retention_stats["faulted_in"] += 1
+        return record
+
+    def _contains(self, kind, record_id):
+        return record_id in kind.db or record_id in kind.archived
+
+    def _after_write(self):
+        if self.retention and self._writes_since_sweep >= self.sweep_every:
+            self.sweep()
+
+    def sweep(self, now=None):
+        """
+        Archiva los registros en estado final con más de ttl_seconds y, si
+        el conjunto activo sigue por encima del máximo, los menos usados.
+        Devuelve cuántos registros archivó.
+        """
+        if not self.retention:
+            return 0
+        started = time.perf_counter()
+        now = time.monotonic() if now is None else now
+        total = 0
+        with self._lock:
+            self._writes_since_sweep = 0
+            for kind in (self._leads, self._quotes):
+                batch = []
+                if self.ttl_seconds is not None:
+                    cutoff = now - self.ttl_seconds
+                    while kind.terminal_since:
+                        record_id, since = next(iter(kind.terminal_since.items()))
+                        if since > cutoff:
+                            break
+                        del kind.terminal_since[record_id]
+                        record = kind.db.pop(record_id, None)
+                        if record is not None:
+                            batch.append(record)
+                    self._retention_stats["archived_by_ttl"] += len(batch)
+                if kind.max_hot:
+                    evicted = 0
+                    while len(kind.db) > kind.max_hot:
+                        record_id, record = kind.db.popitem(last=False)
+                        kind.terminal_since.pop(record_id, None)
+                        batch.append(record)
+                        evicted += 1
+                    self._retention_stats["archived_by_lru"] += evicted
+                self._archive.put_many(kind.name, [r.to_dict() for r in batch])
+                for record in batch:
+                    kind.archived[record['id']] = record.status
+                total += len(batch)
+            self._retention_stats["sweeps"] += 1
+            self._retention_stats["last_sweep_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return total
+
+    def retention_stats(self):
+        with self._lock:
+            stats = {"enabled": self.retention}
+            if not self.retention:
+                stats.update(leads={"hot": len(leads_db)}, quotes={"hot": len(quotes_db)})
+                return stats
+            archive = self._archive.stats()
+            for key, kind in (("leads", self._leads), ("quotes", self._quotes)):
+                stats[key] = {
+                    "hot": len(kind.db),
+                    # Tamaño del JSON de los registros en memoria (estimación
+                    # del peso del conjunto activo; se calcula al pedirlo).
+                    "hot_bytes": sum(len(json.dumps(r.to_dict(), separators=(',', ':'),
+                                                    ensure_ascii=False, default=str))
+                                     for r in kind.db.values()),
+                    "archived": len(kind.archived),
+                    "archived_bytes": archive[key]["bytes"],
+                    "max_hot": kind.max_hot,
+                    "terminal_pending": len(kind.terminal_since),
+                }
+            stats.update(self._retention_stats, ttl_seconds=self.ttl_seconds,
+                         sweep_every=self.sweep_every, archive_file_bytes=archive["file_bytes"])
+            return stats
+
+    # --- Leads ---
+
+    def get_lead(self, lead_id):
+        with self._lock:
+            lead = self._hot(self._leads, lead_id)
+            return lead.to_dict() if lead else None
+
+    def save_lead(self, lead):
+        with self._lock:
+            self._put_lead(Lead.from_dict(lead))
+            self._after_write()
+
+    def bulk_save_leads(self, leads):
+        with self._lock:
+            for lead in leads:
+                self._put_lead(Lead.from_dict(lead))
+            self._after_write()
+
+    def update_lead(self, lead_id, mutator):
+        with self._lock:
+            lead = self._hot(self._leads, lead_id)
+            if lead is None:
+                return None
+            # El mutador recibe un dict, igual que con SQLite; el registro se
+            # reconstruye después, así que un fallo a mitad no deja rastro.
+            updated = lead.to_dict(deep=True)
+            mutator(updated)
+            record = Lead.from_dict(updated)
+            self._put_lead(record)
+            self._after_write()
+            return record.to_dict()
+
+    def score_leads(self, lead_ids, scorer, status=None):
+        statuses = _as_status_set(status)
+        with self._lock:
+            leads = [lead for lead in (self._hot(self._leads, i) for i in lead_ids)
+                     if lead is not None and (statuses is None or lead.status in statuses)]
+            results = scorer([lead.get('criteria') or {} for lead in leads])
+            for lead, (score, new_status) in zip(leads, results):
+                self._put_lead(lead.replace(score=score, status=new_status))
+            self._after_write()
+            return [new_status for _, new_status in results]
+
+    def _archived_matching(self, kind, statuses):
+        return [i for i, status in kind.archived.items() if statuses is None or status in statuses]
+
+    def find_leads(self, status=None):
+        statuses = _as_status_set(status)
+        with self._lock:
+            found = [l.to_dict() for l in leads_db.values()
+                     if statuses is None or l.status in statuses]
+            if self._leads.archived:
+                found.extend(self._archive.iter('lead', statuses))
+            return found
+
+    def get_leads(self, lead_ids):
+        # Lectura masiva (recalificación): los archivados se leen del disco
+        # sin devolverlos a memoria; si se guardan después, vuelven entonces.
+        with self._lock:
+            archived = {}
+            if self._leads.archived:
+                wanted = [i for i in lead_ids if i not in leads_db and i in self._leads.archived]
+                archived = self._archive.get_many('lead', wanted)
+            result = []
+            for i in lead_ids:
+                if i in leads_db:
+                    result.append(leads_db[i].to_dict())
+                elif i in archived:
+                    result.append(archived[i])
+            return result
+
+    def iter_leads(self, status=None, batch_size=10000):
+        statuses = _as_status_set(status)
+        with self._lock:
+            ids = [i for i, l in leads_db.items() if statuses is None or l.status in statuses]
+            ids.extend(self._archived_matching(self._leads, statuses))
+            ids.sort()
+        for start in range(0, len(ids), batch_size):
+            batch = self.get_leads(ids[start:start + batch_size])
+            if batch:
+                yield batch
+
+    def count_leads(self, status=None):
+        statuses = _as_status_set(status)
+        with self._lock:
+            if statuses is None:
+                return len(leads_db) + len(self._leads.archived)
+            return (sum(1 for l in leads_db.values() if l.status in statuses)
+                    + len(self._archived_matching(self._leads, statuses)))
+
+    # --- Cotizaciones ---
+
+    def get_quote(self, quote_id):
+        with self._lock:
+            quote = self._hot(self._quotes, quote_id)
+            return quote.to_dict() if quote else None
+
+    def save_quote(self, quote):
+        with self._lock:
+            self._put_quote(Quote.from_dict(quote))
+            self._after_write()
+
+    def bulk_save_quotes(self, quotes):
+        with self._lock:
+            for quote in quotes:
+                self._put_quote(Quote.from_dict(quote))
+            self._after_write()
+
+    def insert_quote(self, quote):
+        with self._lock:
+            if self._contains(self._quotes, quote['id']):
+                return False
+            self._put_quote(Quote.from_dict(quote))
+            self._after_write()
+            return True
+
+    def update_quote(self, quote_id, mutator):
+        with self._lock:
+            quote = self._hot(self._quotes, quote_id)
+            if quote is None:
+                return None
+            updated = quote.to_dict(deep=True)
+            mutator(updated)
+            record = Quote.from_dict(updated)
+            self._put_quote(record)
+            self._after_write()
+            return record.to_dict()
+
+    def find_quotes(self, status=None, lead_id=None):
+        statuses = _as_status_set(status)
+        with self._lock:
+            found = [q.to_dict() for q in quotes_db.values()
+                     if (statuses is None or q.status in statuses)
+                     and (lead_id is None or q.get('lead_id') == lead_id)]
+            if self._quotes.archived:
+                found.extend(self._archive.iter('quote', statuses, lead_id))
+            return found
+
+    def count_quotes(self, status=None):
+        statuses = _as_status_set(status)
+        with self._lock:
+            if statuses is None:
+                return len(quotes_db) + len(self._quotes.archived)
+            return (sum(1 for q in quotes_db.values() if q.status in statuses)
+                    + len(self._archived_matching(self._quotes, statuses)))
+
+    # --- Claves de deduplicación ---
+
+    def claim_key(self, key, quote_id, fingerprint, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._claims_since_purge += 1
+            if self._claims_since_purge >= _KEY_PURGE_EVERY:
+                self._claims_since_purge = 0
+                for k in [k for k, v in request_keys.items() if v[2] <= now]:
+                    del request_keys[k]
+            held = request_keys.get(key)
+            if held is not None and held[2] > now:
+                return held[0], held[1], held[2] - now
+            request_keys[key] = (quote_id, fingerprint, now + ttl)
+            return None
+
+    def release_key(self, key, quote_id):
+        with self._lock:
+            held = request_keys.get(key)
+            if held is not None and held[0] == quote_id:
+                del request_keys[key]
+
+    # --- Contadores del embudo ---
+
+    def get_counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def rebuild_counters(self):
+        with self._lock:
+            quotes, leads = list(quotes_db.values()), list(leads_db.values())
+            if self._quotes.archived:
+                quotes.extend(self._archive.iter('quote'))
+            if self._leads.archived:
+                leads.extend(self._archive.iter('lead'))
+            self._counters = compute_counters(quotes, leads)
+            return dict(self._counters)
+
+    # --- Proyectos ---
+
+    def get_project(self, project_id):
+        with self._lock:
+            project = projects_db.get(project_id)
+            return copy.deepcopy(project) if project else None
+
+    def save_project(self, project):
+        with self._lock:
+            projects_db[project['id']] = copy.deepcopy(project)
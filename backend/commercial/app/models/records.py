@@ -0,0 +1,39 @@
+# --- Registros del Agente Comercial ---
+# Tipos compactos (ver common/records.py) para los leads y cotizaciones que
+# guarda el backend en memoria, y los enums de estado que usan los servicios
+# en lugar de repetir los literales.
+from common.records import Record, StatusEnum
+
+
+class LeadStatus(StatusEnum):
+    PRELIMINARY = 'PRELIMINARY'
+    MQL = 'MQL'
+    QUALIFIED_OUT = 'QUALIFIED_OUT'
+
+
+class QuoteStatus(StatusEnum):
+    DRAFT = 'DRAFT'
+    AWAITING_AGENTS = 'AWAITING_AGENTS'
+    CALCULATING_PRICE = 'CALCULATING_PRICE'
+    READY_TO_SEND = 'READY_TO_SEND'
+    REJECTED_CAPACITY = 'REJECTED_CAPACITY'
+    ERROR_OPERATIONS = 'ERROR_OPERATIONS'
+    ERROR_FINANCE = 'ERROR_FINANCE'
+    ERROR_COSTING = 'ERROR_COSTING'
+    ERROR_DISPATCH = 'ERROR_DISPATCH'
+    SENT = 'SENT'
+    WON = 'WON'
+    LOST = 'LOST'
+
+
+class Lead(Record):
+    __slots__ = FIELDS = ('id', 'source', 'details', 'criteria', 'score', 'status', 'created_at')
+    COERCE = {'status': LeadStatus.coerce}
+
+
+class Quote(Record):
+    # base_cost_for_quote y final_price aparecen al responder Finanzas y al
+    # calcular el precio; mientras tanto quedan ausentes (no null).
+    __slots__ = FIELDS = ('id', 'lead_id', 'status', 'operations_check', 'finance_check',
+                          'created_at', 'base_cost_for_quote', 'final_price')
+    COERCE = {'status': QuoteStatus.coerce}
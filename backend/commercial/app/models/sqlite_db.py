@@ -0,0 +1,359 @@
+# --- Backend SQLite Compartido entre Workers ---
+# Un único archivo SQLite en modo WAL al que acceden todos los workers de
+# Gunicorn. Cada hilo de cada proceso abre su propia conexión (las conexiones
+# de sqlite3 no se pueden compartir entre hilos ni sobrevivir a un fork).
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .funnel_counters import COUNTER_NAMES, compute_counters, lead_deltas, quote_deltas
+from .storage import BaseStorage, _as_status_set
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status);
+CREATE INDEX IF NOT EXISTS idx_leads_status_id ON leads(status, id);
+
+CREATE TABLE IF NOT EXISTS quotes (
+    id TEXT PRIMARY KEY,
+    lead_id TEXT,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quotes_status ON quotes(status);
+CREATE INDEX IF NOT EXISTS idx_quotes_lead_id ON quotes(lead_id);
+
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS request_keys (
+    key TEXT PRIMARY KEY,
+    quote_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_request_keys_expires_at ON request_keys(expires_at);
+
+CREATE TABLE IF NOT EXISTS funnel_counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+# Reservas nuevas (por worker) entre barridos de las claves vencidas.
+_KEY_PURGE_EVERY = 1000
+
+
+def _dumps(record):
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+
+
+class SQLiteStorage(BaseStorage):
+    """Backend persistente y seguro entre procesos (WAL + mmap)."""
+
+    def __init__(self, path, mmap_size=256 * 1024 * 1024, busy_timeout_ms=5000):
+        self.path = path
+        self.mmap_size = int(mmap_size)
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self._local = threading.local()
+        self._claims_since_purge = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+        # Bases creadas antes de existir los contadores: reconstruirlos una vez.
+        if conn.execute("SELECT COUNT(*) FROM funnel_counters").fetchone()[0] == 0:
+            self.rebuild_counters()
+
+    def _connection(self):
+        """Conexión del hilo actual; se reabre si el proceso hizo fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        # isolation_level=None: las transacciones se abren explícitamente.
+        conn = sqlite3.connect(self.path, isolation_level=None,
+                               timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            if self._local.pid == os.getpid():
+                conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Transacción de escritura. BEGIN IMMEDIATE toma el lock de escritura
+        al inicio, por lo que un read-modify-write no puede intercalarse con
+        el de otro worker.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _existing(self, conn, table, ids):
+        """Registros actuales (id -> dict) de los ids dados, en bloques."""
+        existing = {}
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            for row_id, data in conn.execute(
+                    f"SELECT id, data FROM {table} WHERE id IN ({marks})", chunk):
+                existing[row_id] = json.loads(data)
+        return existing
+
+    @staticmethod
+    def _apply_deltas(conn, deltas):
+        rows = [(value, name) for name, value in deltas.items() if value]
+        if rows:
+            conn.executemany("UPDATE funnel_counters SET value = value + ? WHERE name = ?", rows)
+
+    # --- Leads ---
+
+    def get_lead(self, lead_id):
+        row = self._connection().execute(
+            "SELECT data FROM leads WHERE id = ?", (lead_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_lead(self, lead):
+        self.bulk_save_leads([lead])
+
+    def bulk_save_leads(self, leads):
+        leads = list(leads)  # Se recorre varias veces: admite generadores.
+        rows = [(l['id'], l['status'], _dumps(l)) for l in leads]
+        with self._transaction() as conn:
+            existing = self._existing(conn, 'leads', (l['id'] for l in leads))
+            totals = {}
+            for lead in leads:
+                for name, delta in lead_deltas(existing.get(lead['id']), lead).items():
+                    totals[name] = totals.get(name, 0) + delta
+                existing[lead['id']] = lead
+            self._apply_deltas(conn, totals)
+            conn.executemany(
+                "INSERT OR REPLACE INTO leads (id, status, data) VALUES (?, ?, ?)", rows)
+
+    def update_lead(self, lead_id, mutator):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM leads WHERE id = ?", (lead_id,)).fetchone()
+            if row is None:
+                return None
+            lead = json.loads(row[0])
+            old_lead = json.loads(row[0])
+            mutator(lead)
+            self._apply_deltas(conn, lead_deltas(old_lead, lead))
+            conn.execute("UPDATE leads SET status = ?, data = ? WHERE id = ?",
+                         (lead['status'], _dumps(lead), lead_id))
+            return lead
+
+    def score_leads(self, lead_ids, scorer, status=None):
+        statuses = _as_status_set(status)
+        with self._transaction() as conn:
+            leads = [lead for lead in self._existing(conn, 'leads', lead_ids).values()
+                     if statuses is None or lead['status'] in statuses]
+            results = scorer([lead.get('criteria') or {} for lead in leads])
+            totals, rows = {}, []
+            for lead, (score, new_status) in zip(leads, results):
+                for name, delta in lead_deltas(lead, dict(lead, score=score, status=new_status)).items():
+                    totals[name] = totals.get(name, 0) + delta
+                rows.append((new_status, score, new_status, lead['id']))
+            self._apply_deltas(conn, totals)
+            conn.executemany(
+                "UPDATE leads SET status = ?, data = json_set(data, '$.score', ?, '$.status', ?) "
+                "WHERE id = ?", rows)
+            return [new_status for _, new_status in results]
+
+    def find_leads(self, status=None):
+        statuses = _as_status_set(status)
+        if statuses is None:
+            rows = self._connection().execute("SELECT data FROM leads")
+        else:
+            marks = ','.join('?' * len(statuses))
+            rows = self._connection().execute(
+                f"SELECT data FROM leads WHERE status IN ({marks})", tuple(statuses))
+        return [json.loads(r[0]) for r in rows]
+
+    def get_leads(self, lead_ids):
+        return list(self._existing(self._connection(), 'leads', lead_ids).values())
+
+    def iter_leads(self, status=None, batch_size=10000):
+        statuses = _as_status_set(status)
+        where, params = "", []
+        if statuses is not None:
+            where = f"status IN ({','.join('?' * len(statuses))}) AND "
+            params = list(statuses)
+
+        last_id = ''
+        while True:
+            rows = self._connection().execute(
+                f"SELECT id, data FROM leads WHERE {where}id > ? ORDER BY id LIMIT ?",
+                params + [last_id, batch_size]).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [json.loads(data) for _, data in rows]
+
+    def count_leads(self, status=None):
+        return self._count('leads', status)
+
+    # --- Cotizaciones ---
+
+    def get_quote(self, quote_id):
+        row = self._connection().execute(
+            "SELECT data FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_quote(self, quote):
+        self.bulk_save_quotes([quote])
+
+    def bulk_save_quotes(self, quotes):
+        quotes = list(quotes)  # Se recorre varias veces: admite generadores.
+        rows = [(q['id'], q.get('lead_id'), q['status'], _dumps(q)) for q in quotes]
+        with self._transaction() as conn:
+            existing = self._existing(conn, 'quotes', (q['id'] for q in quotes))
+            totals = {}
+            for quote in quotes:
+                for name, delta in quote_deltas(existing.get(quote['id']), quote).items():
+                    totals[name] = totals.get(name, 0) + delta
+                existing[quote['id']] = quote
+            self._apply_deltas(conn, totals)
+            conn.executemany(
+                "INSERT OR REPLACE INTO quotes (id, lead_id, status, data) VALUES (?, ?, ?, ?)",
+                rows)
+
+    def insert_quote(self, quote):
+        with self._transaction() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO quotes (id, lead_id, status, data) VALUES (?, ?, ?, ?)",
+                (quote['id'], quote.get('lead_id'), quote['status'], _dumps(quote))).rowcount
+            if inserted:
+                self._apply_deltas(conn, quote_deltas(None, quote))
+            return bool(inserted)
+
+    def update_quote(self, quote_id, mutator):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+            if row is None:
+                return None
+            quote = json.loads(row[0])
+            old_quote = json.loads(row[0])
+            mutator(quote)
+            self._apply_deltas(conn, quote_deltas(old_quote, quote))
+            conn.execute("UPDATE quotes SET lead_id = ?, status = ?, data = ? WHERE id = ?",
+                         (quote.get('lead_id'), quote['status'], _dumps(quote), quote_id))
+            return quote
+
+    def find_quotes(self, status=None, lead_id=None):
+        clauses, params = [], []
+        statuses = _as_status_set(status)
+        if statuses is not None:
+            clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if lead_id is not None:
+            clauses.append("lead_id = ?")
+            params.append(lead_id)
+
+        sql = "SELECT data FROM quotes"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return [json.loads(r[0]) for r in self._connection().execute(sql, params)]
+
+    def count_quotes(self, status=None):
+        return self._count('quotes', status)
+
+    def _count(self, table, status):
+        """COUNT(*) resuelto con el índice de estado."""
+        statuses = _as_status_set(status)
+        if statuses is None:
+            row = self._connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        else:
+            marks = ','.join('?' * len(statuses))
+            row = self._connection().execute(
+                f"SELECT COUNT(*) FROM {table} WHERE status IN ({marks})",
+                tuple(statuses)).fetchone()
+        return row[0]
+
+    # --- Claves de deduplicación ---
+
+    def claim_key(self, key, quote_id, fingerprint, ttl):
+        # Tiempo de reloj (no monotónico): lo comparten todos los procesos.
+        now = time.time()
+        self._claims_since_purge += 1
+        with self._transaction() as conn:
+            if self._claims_since_purge >= _KEY_PURGE_EVERY:
+                self._claims_since_purge = 0
+                conn.execute("DELETE FROM request_keys WHERE expires_at <= ?", (now,))
+            else:
+                conn.execute("DELETE FROM request_keys WHERE key = ? AND expires_at <= ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO request_keys (key, quote_id, fingerprint, expires_at) "
+                "VALUES (?, ?, ?, ?)", (key, quote_id, fingerprint, now + ttl)).rowcount
+            if inserted:
+                return None
+            row = conn.execute(
+                "SELECT quote_id, fingerprint, expires_at FROM request_keys WHERE key = ?",
+                (key,)).fetchone()
+            return row[0], row[1], row[2] - now
+
+    def release_key(self, key, quote_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM request_keys WHERE key = ? AND quote_id = ?", (key, quote_id))
+
+    # --- Contadores del embudo ---
+
+    def get_counters(self):
+        rows = self._connection().execute("SELECT name, value FROM funnel_counters")
+        counters = dict.fromkeys(COUNTER_NAMES, 0)
+        for name, value in rows:
+            counters[name] = value if name == 'value_won' else int(value)
+        return counters
+
+    def rebuild_counters(self):
+        with self._transaction() as conn:
+            quotes = (json.loads(r[0]) for r in conn.execute("SELECT data FROM quotes"))
+            leads = (json.loads(r[0]) for r in conn.execute("SELECT data FROM leads"))
+            counters = compute_counters(quotes, leads)
+            conn.execute("DELETE FROM funnel_counters")
+            conn.executemany("INSERT INTO funnel_counters (name, value) VALUES (?, ?)",
+                             list(counters.items()))
+        return counters
+
+    # --- Proyectos ---
+
+    def get_project(self, project_id):
+        row = self._connection().execute(
+            "SELECT data FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_project(self, project):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO projects (id, data) VALUES (?, ?)",
+                         (project['id'], _dumps(project)))
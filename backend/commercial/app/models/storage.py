@@ -0,0 +1,186 @@
+# --- Capa de Almacenamiento Intercambiable ---
+# Los servicios de app/services/ no acceden directamente a los diccionarios en
+# memoria: piden el backend configurado con get_storage(). Así el mismo código
+# funciona con un proceso (memoria) o con varios workers de Gunicorn que
+# comparten un archivo SQLite.
+
+_storage = None
+
+
+class BaseStorage:
+    """
+    Interfaz común de los backends de almacenamiento.
+
+    Todos los métodos trabajan con diccionarios planos (el mismo formato que
+    devuelve la API). Cada lectura entrega un dict nuevo, pero sus valores
+    anidados (details, criteria, *_check...) pueden ser los del almacén y no
+    deben modificarse en su sitio: para modificar un registro se usa
+    update_quote/update_lead, que aplican el cambio de forma atómica sobre
+    una copia.
+    """
+
+    # --- Leads ---
+
+    def get_lead(self, lead_id):
+        raise NotImplementedError
+
+    def save_lead(self, lead):
+        raise NotImplementedError
+
+    def bulk_save_leads(self, leads):
+        raise NotImplementedError
+
+    def update_lead(self, lead_id, mutator):
+        """Aplica mutator(lead) de forma atómica. Devuelve el lead o None."""
+        raise NotImplementedError
+
+    def score_leads(self, lead_ids, scorer, status=None):
+        """
+        Puntúa en bloque y de forma atómica los leads existentes entre
+        lead_ids (con status, solo los que siguen en ese estado). scorer
+        recibe la lista de sus criteria y devuelve [(score, status)] en el
+        mismo orden; solo se escriben esos dos campos. Devuelve la lista de
+        estados escritos.
+        """
+        raise NotImplementedError
+
+    def find_leads(self, status=None):
+        raise NotImplementedError
+
+    def get_leads(self, lead_ids):
+        """Leads existentes entre lead_ids (los ausentes se omiten)."""
+        raise NotImplementedError
+
+    def iter_leads(self, status=None, batch_size=10000):
+        """
+        Recorre los leads en bloques ordenados por id (paginación por clave),
+        de modo que modificar el estado de un bloque no desplaza los siguientes.
+        """
+        raise NotImplementedError
+
+    def count_leads(self, status=None):
+        raise NotImplementedError
+
+    # --- Cotizaciones ---
+
+    def get_quote(self, quote_id):
+        raise NotImplementedError
+
+    def save_quote(self, quote):
+        raise NotImplementedError
+
+    def bulk_save_quotes(self, quotes):
+        raise NotImplementedError
+
+    def insert_quote(self, quote):
+        """Guarda la cotización solo si su id no existe. Devuelve True si la insertó."""
+        raise NotImplementedError
+
+    def update_quote(self, quote_id, mutator):
+        """Aplica mutator(quote) de forma atómica. Devuelve la cotización o None."""
+        raise NotImplementedError
+
+    def find_quotes(self, status=None, lead_id=None):
+        raise NotImplementedError
+
+    def count_quotes(self, status=None):
+        raise NotImplementedError
+
+    # --- Claves de deduplicación (Idempotency-Key, peticiones en curso) ---
+
+    def claim_key(self, key, quote_id, fingerprint, ttl):
+        """
+        Reserva `key` para quote_id durante ttl segundos, de forma atómica
+        entre workers. Devuelve None si la reserva queda a nuestro nombre, o
+        (quote_id, fingerprint, segundos_restantes) de la reserva vigente de
+        otra petición.
+        """
+        raise NotImplementedError
+
+    def release_key(self, key, quote_id):
+        """Libera la reserva de `key` si sigue a nombre de quote_id."""
+        raise NotImplementedError
+
+    # --- Contadores del embudo ---
+
+    def get_counters(self):
+        """Contadores del embudo (ver funnel_counters), mantenidos en cada escritura."""
+        raise NotImplementedError
+
+    def rebuild_counters(self):
+        """Recalcula los contadores recorriendo todos los registros."""
+        raise NotImplementedError
+
+    # --- Proyectos ---
+
+    def get_project(self, project_id):
+        raise NotImplementedError
+
+    def save_project(self, project):
+        raise NotImplementedError
+
+    # --- Retención ---
+
+    def retention_stats(self):
+        """
+        Registros en memoria y archivados en disco, con sus tamaños. None si
+        el backend no guarda registros en memoria (p. ej. SQLite).
+        """
+        return None
+
+    # --- Ciclo de vida ---
+
+    def close(self):
+        """Libera los recursos abiertos por el hilo actual (p. ej. antes de un fork)."""
+
+
+def _as_status_set(status):
+    """Normaliza un filtro de estado ('WON' o ['SENT', 'WON']) a un set."""
+    if status is None:
+        return None
+    if isinstance(status, str):
+        return {status}
+    return set(status)
+
+
+def create_storage(config):
+    """Construye el backend indicado por STORAGE_BACKEND en la configuración."""
+    backend = config.get('STORAGE_BACKEND', 'memory')
+
+    if backend == 'memory':
+        from .in_memory_db import InMemoryStorage
+        if not config.get('RETENTION_ENABLED', False):
+            return InMemoryStorage()
+        return InMemoryStorage(
+            ttl_seconds=config.get('RETENTION_TTL_SECONDS'),
+            max_hot_leads=config.get('RETENTION_MAX_HOT_LEADS'),
+            max_hot_quotes=config.get('RETENTION_MAX_HOT_QUOTES'),
+            sweep_every=config.get('RETENTION_SWEEP_EVERY', 1000),
+            archive_dir=config.get('RETENTION_ARCHIVE_DIR'),
+        )
+
+    if backend == 'sqlite':
+        from .sqlite_db import SQLiteStorage
+        return SQLiteStorage(
+            config['SQLITE_PATH'],
+            mmap_size=config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+            busy_timeout_ms=config.get('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        )
+
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+
+
+def init_storage(config):
+    """Instala el backend global. Lo invoca create_app."""
+    global _storage
+    _storage = create_storage(config)
+    return _storage
+
+
+def get_storage():
+    """Devuelve el backend activo (memoria si la app no configuró otro)."""
+    global _storage
+    if _storage is None:
+        from .in_memory_db import InMemoryStorage
+        _storage = InMemoryStorage()
+    return _storage
@@ -0,0 +1,183 @@
+# --- Despachador de Llamadas a Agentes Externos ---
+# Sustituye el hilo por cotización: un pool de hilos acotado ejecuta las
+# llamadas salientes y cada agente (URL base) tiene su propia sesión HTTP con
+# conexiones keep-alive y un límite de peticiones simultáneas.
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.instrumentation import timed_outbound
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+class DispatcherSaturated(Exception):
+    """La cola del despachador está llena; el cliente debe reintentar."""
+
+
+class AgentClient:
+    """Sesión HTTP reutilizable hacia un agente, con tope de peticiones en vuelo."""
+
+    # Respuestas que indican un fallo transitorio del agente.
+    RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+    def __init__(self, base_url, max_in_flight, timeout, retries=3, retry_backoff=0.5):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests_sent = 0
+        self.errors = 0
+        self.retried = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, payload):
+        """
+        POST con reintentos y backoff exponencial ante errores de conexión,
+        timeouts y respuestas 429/5xx transitorias. Lanza la última
+        RequestException si se agotan los intentos.
+        """
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = self._post_once(path, payload)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES or last_attempt:
+                    return response
+            with self._lock:
+                self.retried += 1
+            time.sleep(self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.0))
+
+    def _post_once(self, path, payload):
+        with self._lock:
+            self.waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+        try:
+            with timed_outbound(self.base_url, path) as call:
+                response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                             timeout=self.timeout)
+                call['status'] = response.status_code
+            with self._lock:
+                self.requests_sent += 1
+            return response
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight, "in_flight": self.in_flight,
+                "waiting": self.waiting, "requests_sent": self.requests_sent,
+                "errors": self.errors, "retried": self.retried,
+            }
+
+
+class AgentDispatcher:
+    """Pool de hilos acotado que ejecuta las llamadas salientes a los agentes."""
+
+    def __init__(self, max_workers, max_queue, max_in_flight, timeout, retries=3, retry_backoff=0.5):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='agent-dispatch')
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def client(self, base_url):
+        """Devuelve (creándolo si hace falta) el cliente de un agente."""
+        with self._lock:
+            client = self._clients.get(base_url)
+            if client is None:
+                client = AgentClient(base_url, self.max_in_flight, self.timeout,
+                                     self.retries, self.retry_backoff)
+                self._clients[base_url] = client
+            return client
+
+    def submit_many(self, tasks):
+        """
+        Encola varias tareas de una vez (todas o ninguna), para que una
+        cotización no quede a medias si la cola se llena.
+        """
+        with self._lock:
+            if self.queued + len(tasks) > self.max_queue:
+                self.rejected += 1
+                raise DispatcherSaturated("Agent dispatcher queue is full")
+            self.queued += len(tasks)
+        return [self._executor.submit(self._run, task) for task in tasks]
+
+    def _run(self, task):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            task()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "max_workers": self.max_workers, "max_queue": self.max_queue,
+                "queue_depth": self.queued, "running": self.running,
+                "completed": self.completed, "rejected": self.rejected,
+            }
+            clients = list(self._clients.items())
+        stats["agents"] = {url: client.stats() for url, client in clients}
+        return stats
+
+
+def get_dispatcher(config):
+    """
+    Despachador del proceso actual. Se crea de forma perezosa y se recrea
+    tras un fork (los hilos del pool no sobreviven al fork de Gunicorn).
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher.pid != os.getpid():
+            _dispatcher = AgentDispatcher(
+                max_workers=config.get('DISPATCHER_WORKERS', 32),
+                max_queue=config.get('DISPATCHER_MAX_QUEUE', 1000),
+                max_in_flight=config.get('AGENT_MAX_IN_FLIGHT', 16),
+                timeout=config.get('AGENT_HTTP_TIMEOUT', 10),
+                retries=config.get('AGENT_RETRIES', 3),
+                retry_backoff=config.get('AGENT_RETRY_BACKOFF', 0.5),
+            )
+        return _dispatcher
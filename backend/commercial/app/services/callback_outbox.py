@@ -0,0 +1,318 @@
+# --- Cola Persistente de Callbacks Salientes ---
+# Los handlers que deben avisar a otro servicio (p. ej. los mocks de
+# Operaciones/Finanzas respondiendo al Agente Comercial) encolan el callback
+# en un archivo SQLite y responden de inmediato. Un hilo de entrega por
+# proceso agrupa los callbacks pendientes por destino, los envía en lote al
+# endpoint masivo y reintenta los fallos con backoff exponencial.
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from app.models.records import QuoteStatus
+from app.services import quote_service
+from common.instrumentation import timed_outbound
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+# Ruta del endpoint masivo relativa a la URL base del destino.
+BATCH_PATH = '/api/commercial/callbacks:batch'
+
+# Error con el que queda la cotización cuando su callback se da por perdido.
+_QUOTE_ERROR_BY_TYPE = {
+    'capacity_check': QuoteStatus.ERROR_OPERATIONS,
+    'costing': QuoteStatus.ERROR_FINANCE,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS callbacks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    type TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'PENDING',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_callbacks_due ON callbacks(status, next_attempt_at);
+"""
+
+
+class CallbackOutbox:
+    """Cola durable de callbacks con entrega en lote y reintentos."""
+
+    def __init__(self, path, batch_size=100, max_attempts=8, backoff_base=0.5,
+                 backoff_max=60.0, poll_interval=0.2, lease_seconds=30.0, timeout=10.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.batches_sent = 0
+        self.session = requests.Session()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- Productores ---
+
+    def enqueue(self, target, callback_type, ref_id, payload):
+        """Persiste un callback y despierta al hilo de entrega. No hace red."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO callbacks (target, type, ref_id, payload, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (target.rstrip('/'), callback_type, ref_id, json.dumps(payload), now, now))
+        with self._lock:
+            self.enqueued += 1
+        self._ensure_worker()
+        self._wakeup.set()
+
+    # --- Entrega ---
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='callback-outbox',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                delivered_any = self.deliver_due()
+            except Exception as e:  # El hilo no debe morir: los arriendos vencen y se reintenta.
+                print(f"Callback outbox: delivery loop error: {e!r}")
+                delivered_any = False
+            if not delivered_any:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self):
+        """
+        Toma hasta batch_size callbacks vencidos y los arrienda durante
+        lease_seconds, para que otro proceso que comparta el archivo no los
+        envíe a la vez. Si este proceso muere, el arriendo vence y se reenvían.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, target, type, ref_id, payload, attempts FROM callbacks"
+                " WHERE status = 'PENDING' AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at, id LIMIT ?",
+                (now, self.batch_size)).fetchall()
+            if rows:
+                conn.executemany("UPDATE callbacks SET next_attempt_at = ? WHERE id = ?",
+                                 [(now + self.lease_seconds, row[0]) for row in rows])
+        return rows
+
+    def deliver_due(self):
+        """Envía un lote de callbacks vencidos. Devuelve True si había alguno."""
+        rows = self._claim()
+        if not rows:
+            return False
+
+        by_target = {}
+        for row in rows:
+            by_target.setdefault(row[1], []).append(row)
+        for target, batch in by_target.items():
+            try:
+                self._deliver_batch(target, batch)
+            except Exception as e:
+                # Un error inesperado en un lote no frena a los demás destinos;
+                # sus callbacks se reprograman con backoff como cualquier fallo.
+                print(f"Callback outbox: batch to {target} failed: {e!r}")
+                self._retry(batch, f"delivery error: {e!r}")
+        return True
+
+    def _deliver_batch(self, target, batch):
+        body = {"callbacks": [
+            {"id": row[0], "type": row[2], "ref_id": row[3], "payload": json.loads(row[4])}
+            for row in batch
+        ]}
+        with self._lock:
+            self.batches_sent += 1
+        try:
+            with timed_outbound(target, BATCH_PATH) as call:
+                response = self.session.post(f"{target}{BATCH_PATH}", json=body,
+                                             timeout=self.timeout)
+                call['status'] = response.status_code
+        except requests.exceptions.RequestException as e:
+            self._retry(batch, str(e))
+            return
+        if response.status_code >= 500 or response.status_code == 429:
+            self._retry(batch, f"HTTP {response.status_code}")
+            return
+        if response.status_code >= 400:
+            self._fail(batch, f"HTTP {response.status_code}")
+            return
+
+        results = self._parse_results(response)
+        if results is None:
+            self._retry(batch, "malformed batch response")
+            return
+        done, retry, failed = [], [], []
+        for row in batch:
+            status = results.get(row[0], 500)
+            if 200 <= status < 300:
+                done.append(row)
+            elif status >= 500 or status == 429:
+                retry.append(row)
+            else:
+                failed.append(row)
+        self._delete(done)
+        self._retry(retry, "HTTP 5xx in batch result")
+        self._fail(failed, "rejected by receiver")
+
+    @staticmethod
+    def _parse_results(response):
+        """
+        {id: status} de la respuesta del endpoint masivo, o None si no es el
+        JSON esperado ({"results": [{"id": ..., "status": <int>}, ...]}). Una
+        respuesta malformada cuenta como entrega fallida.
+        """
+        try:
+            results = response.json().get('results', [])
+        except (ValueError, AttributeError):
+            return None
+        if not isinstance(results, list):
+            return None
+        parsed = {}
+        for result in results:
+            if not isinstance(result, dict):
+                return None
+            status = result.get('status')
+            if isinstance(status, bool) or not isinstance(status, int):
+                return None
+            if isinstance(result.get('id'), int):
+                parsed[result['id']] = status
+        return parsed
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _delete(self, rows):
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM callbacks WHERE id = ?", [(row[0],) for row in rows])
+        with self._lock:
+            self.delivered += len(rows)
+
+    def _retry(self, rows, error):
+        if not rows:
+            return
+        now = time.time()
+        updates, dead = [], []
+        for row in rows:
+            attempts = row[5] + 1
+            if attempts >= self.max_attempts:
+                dead.append(row)
+            else:
+                updates.append((attempts, now + self._backoff(attempts), error, row[0]))
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE callbacks SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                updates)
+        with self._lock:
+            self.retried += len(updates)
+        self._fail(dead, error)
+
+    def _fail(self, rows, error):
+        """
+        Los callbacks sin remedio se conservan como DEAD para inspección, y
+        su cotización pasa a error en lugar de quedarse esperando al agente.
+        """
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE callbacks SET status = 'DEAD', attempts = attempts + 1, last_error = ?"
+                " WHERE id = ?", [(error, row[0]) for row in rows])
+        with self._lock:
+            self.dead += len(rows)
+        for row in rows:
+            status = _QUOTE_ERROR_BY_TYPE.get(row[2])
+            if status is None:
+                continue
+            try:
+                quote_service._mark_error(row[3], status)
+            except Exception as e:  # El barrido de cotizaciones la expirará igualmente.
+                print(f"Callback outbox: could not mark quote {row[3]}: {e!r}")
+
+    def stats(self):
+        conn = self._connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM callbacks GROUP BY status"))
+        with self._lock:
+            return {
+                "pending": counts.get('PENDING', 0), "dead": counts.get('DEAD', 0),
+                "enqueued": self.enqueued, "delivered": self.delivered,
+                "retried": self.retried, "dead_lettered": self.dead,
+                "batches_sent": self.batches_sent,
+            }
+
+
+def get_outbox(config):
+    """
+    Cola del proceso actual. Se crea de forma perezosa y se recrea tras un
+    fork, igual que el despachador de agentes.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None or _outbox.pid != os.getpid():
+            _outbox = CallbackOutbox(
+                path=config['CALLBACK_OUTBOX_PATH'],
+                batch_size=config.get('CALLBACK_BATCH_SIZE', 100),
+                max_attempts=config.get('CALLBACK_MAX_ATTEMPTS', 8),
+                backoff_base=config.get('CALLBACK_BACKOFF_BASE', 0.5),
+                backoff_max=config.get('CALLBACK_BACKOFF_MAX', 60.0),
+                poll_interval=config.get('CALLBACK_POLL_INTERVAL', 0.2),
+                timeout=config.get('AGENT_HTTP_TIMEOUT', 10),
+            )
+            # Entrega lo que haya quedado pendiente de una ejecución anterior.
+            _outbox._ensure_worker()
+        return _outbox
@@ -1,29 +1,58 @@
-from app.models.in_memory_db import quotes_db, leads_db
+from app.models.funnel_counters import SENT_STATUSES
+from app.models.records import LeadStatus, QuoteStatus
+from app.models.storage import get_storage
 
-def get_funnel_kpis():
-    """Calcula y devuelve los KPIs clave del embudo de ventas."""
-    total_quotes = len(quotes_db)
+def _kpis_from_counts(total_quotes, num_sent, num_won, num_lost, total_value_won, new_mqls):
+    """Arma la respuesta de KPIs a partir de los conteos agregados."""
     if total_quotes == 0:
         return {
             "conversion_rate_quote_to_win": 0, "deals_won": 0, "deals_lost": 0,
             "average_deal_size": 0, "total_quotes_sent": 0, "new_mqls": 0,
         }
 
-    deals_won = [q for q in quotes_db.values() if q['status'] == 'WON']
-    deals_lost = [q for q in quotes_db.values() if q['status'] == 'LOST']
-    quotes_sent = [q for q in quotes_db.values() if q['status'] in ['SENT', 'WON', 'LOST']]
-
-    num_won = len(deals_won)
-    num_sent = len(quotes_sent)
     conversion_rate = (num_won / num_sent) if num_sent > 0 else 0
-
-    total_value_won = sum(q.get('final_price', 0) for q in deals_won)
     average_deal_size = (total_value_won / num_won) if num_won > 0 else 0
-    new_mqls = len([l for l in leads_db.values() if l['status'] == 'MQL'])
 
     return {
         "conversion_rate_quote_to_win": round(conversion_rate, 2),
-        "deals_won": num_won, "deals_lost": len(deals_lost),
+        "deals_won": num_won, "deals_lost": num_lost,
         "average_deal_size": round(average_deal_size, 2),
         "total_quotes_sent": num_sent, "new_mqls": new_mqls
     }
+
+def get_funnel_kpis():
+    """
+    Devuelve los KPIs clave del embudo de ventas en O(1), a partir de los
+    contadores que el almacenamiento actualiza en cada cambio de estado.
+    """
+    c = get_storage().get_counters()
+    return _kpis_from_counts(c['quotes_total'], c['quotes_sent'], c['deals_won'],
+                             c['deals_lost'], c['value_won'], c['new_mqls'])
+
+def recompute_funnel_kpis():
+    """Calcula los KPIs desde cero recorriendo cotizaciones y leads."""
+    storage = get_storage()
+    total_quotes = storage.count_quotes()
+    deals_won = storage.find_quotes(status=QuoteStatus.WON)
+    num_lost = storage.count_quotes(status=QuoteStatus.LOST)
+    num_sent = storage.count_quotes(status=SENT_STATUSES)
+    total_value_won = sum(q.get('final_price', 0) for q in deals_won)
+    new_mqls = storage.count_leads(status=LeadStatus.MQL)
+    return _kpis_from_counts(total_quotes, num_sent, len(deals_won), num_lost,
+                             total_value_won, new_mqls)
+
+def check_funnel_kpis():
+    """
+    Modo de verificación: compara los KPIs incrementales con un recálculo
+    completo y devuelve las diferencias encontradas.
+    """
+    incremental = get_funnel_kpis()
+    recomputed = recompute_funnel_kpis()
+    diff = {
+        name: {"incremental": incremental.get(name), "recomputed": value}
+        for name, value in recomputed.items() if incremental.get(name) != value
+    }
+    return {
+        "consistent": not diff, "incremental": incremental,
+        "recomputed": recomputed, "diff": diff
+    }
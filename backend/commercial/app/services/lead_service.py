@@ -1,26 +1,113 @@
-from app.models.in_memory_db import leads_db
+import math
+
+from app.models.records import LeadStatus
+from app.models.storage import get_storage
+
+DEFAULT_WEIGHTS = {'w_icp': 0.5, 'w_intent': 0.4, 'w_eng': 0.1}
+MQL_THRESHOLD = 75
+
+# Orden de las columnas de criterios y de sus pesos en el cálculo vectorial.
+_CRITERIA = ('icp', 'intent', 'engagement')
+_WEIGHT_KEYS = ('w_icp', 'w_intent', 'w_eng')
+
+def resolve_weights(weights=None):
+    """Completa los pesos recibidos con los valores por defecto y los valida."""
+    if weights is not None and not isinstance(weights, dict):
+        raise ValueError("Weights must be an object")
+    resolved = dict(DEFAULT_WEIGHTS)
+    for key, value in (weights or {}).items():
+        if key not in resolved:
+            raise ValueError(f"Unknown weight: {key}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Weight {key} must be a number")
+        try:
+            finite = math.isfinite(value)
+        except OverflowError:  # Entero demasiado grande para un float.
+            finite = False
+        if not finite:
+            # NaN o infinito darían un score NaN que no clasifica ni se serializa.
+            raise ValueError(f"Weight {key} must be a finite number")
+        resolved[key] = value
+    return resolved
+
+def _classify(lead_score):
+    """Estado que corresponde a un LeadScore (sin redondear)."""
+    return LeadStatus.MQL if lead_score > MQL_THRESHOLD else LeadStatus.QUALIFIED_OUT
 
 def qualify_lead(lead_id, weights=None):
     """Calcula el LeadScore para un lead y lo actualiza."""
-    lead = leads_db.get(lead_id)
-    if not lead:
-        return None
-
     if weights is None:
-        weights = {'w_icp': 0.5, 'w_intent': 0.4, 'w_eng': 0.1}
+        weights = DEFAULT_WEIGHTS
+
+    def apply_score(lead):
+        criteria = lead.get('criteria', {})
+        lead_score = (weights['w_icp'] * criteria.get('icp', 0)) + \
+                     (weights['w_intent'] * criteria.get('intent', 0)) + \
+                     (weights['w_eng'] * criteria.get('engagement', 0))
 
-    criteria = lead.get('criteria', {})
-    lead_score = (weights['w_icp'] * criteria.get('icp', 0)) + \
-                 (weights['w_intent'] * criteria.get('intent', 0)) + \
-                 (weights['w_eng'] * criteria.get('engagement', 0))
+        lead['score'] = round(lead_score, 2)
+        lead['status'] = _classify(lead_score)
 
-    lead['score'] = round(lead_score, 2)
+    return get_storage().update_lead(lead_id, apply_score)
 
-    mql_threshold = 75
-    if lead_score > mql_threshold:
-        lead['status'] = 'MQL'
+def _batch_scorer(weights):
+    """
+    scorer para storage.score_leads: puntúa un bloque de criteria con NumPy.
+    Suma término a término en el mismo orden que qualify_lead (sin producto
+    matricial, que puede redondear distinto) y redondea con round(), de modo
+    que ambos caminos guardan el mismo score.
+    """
+    # NumPy solo lo usa la recalificación masiva: se importa al primer uso
+    # para no alargar el arranque de cada worker (APP_PRELOAD lo precarga).
+    import numpy as np
+
+    def scorer(criteria_list):
+        criteria = np.array(
+            [[criteria.get(name, 0) for name in _CRITERIA] for criteria in criteria_list],
+            dtype=np.float64).reshape(len(criteria_list), len(_CRITERIA))
+        scores = np.zeros(len(criteria_list), dtype=np.float64)
+        for column, key in enumerate(_WEIGHT_KEYS):
+            scores += weights[key] * criteria[:, column]
+        return [(round(score, 2), _classify(score)) for score in scores.tolist()]
+
+    return scorer
+
+def qualify_leads_batch(lead_ids=None, weights=None, chunk_size=10000):
+    """
+    Recalifica leads en bloque: los ids indicados o, si lead_ids es None,
+    todos los leads en estado PRELIMINARY. Cada bloque se puntúa con NumPy
+    dentro de una sola escritura atómica (storage.score_leads), que solo
+    toca score y status: no pisa cambios concurrentes de update_lead.
+
+    Es un generador: produce el progreso acumulado tras cada bloque.
+    """
+    weights = resolve_weights(weights)
+    scorer = _batch_scorer(weights)
+    storage = get_storage()
+
+    if lead_ids is None:
+        # Solo los ids: cada bloque se relee (y se filtra por estado) dentro
+        # de la escritura, por si otro proceso lo calificó entretanto.
+        status = LeadStatus.PRELIMINARY
+        batches = ([lead['id'] for lead in batch] for batch in
+                   storage.iter_leads(status=status, batch_size=chunk_size))
+        requested = None
     else:
-        lead['status'] = 'QUALIFIED_OUT'
+        status = None
+        lead_ids = list(dict.fromkeys(lead_ids))
+        requested = len(lead_ids)
+        batches = (lead_ids[i:i + chunk_size] for i in range(0, len(lead_ids), chunk_size))
+
+    progress = {"processed": 0, "mql": 0, "qualified_out": 0, "not_found": 0}
+    for batch in batches:
+        if batch:
+            statuses = storage.score_leads(batch, scorer, status=status)
+            mql = sum(1 for s in statuses if s == LeadStatus.MQL)
+            progress["processed"] += len(statuses)
+            progress["mql"] += mql
+            progress["qualified_out"] += len(statuses) - mql
+        yield dict(progress)
 
-    leads_db[lead_id] = lead
-    return lead
+    if requested is not None:
+        progress["not_found"] = requested - progress["processed"]
+    yield dict(progress, done=True)
@@ -1,77 +1,444 @@
-import requests
+import hashlib
+import json
+import os
+import queue
+import secrets
 import threading
+import time
+from datetime import datetime
+
+import requests
 from flask import current_app
 
-from app.models.in_memory_db import quotes_db
+from app.models.records import QuoteStatus
+from app.models.storage import get_storage
+from app.services.agent_dispatcher import DispatcherSaturated, get_dispatcher
 
-def initiate_quote_process(quote_id, quote_data):
-    """Inicia llamadas asíncronas a los agentes de Operaciones y Finanzas."""
-    def async_quote_processing():
-        app = current_app._get_current_object()
-        with app.app_context():
-            # 1. Consultar a Operaciones
-            try:
-                op_url = f"{app.config['OPERATIONS_AGENT_URL']}/api/operations/capacity-check"
-                payload = {"request_id": quote_id, **quote_data['operations_payload']}
-                quotes_db[quote_id]['status'] = 'AWAITING_OPERATIONS'
-                requests.post(op_url, json=payload, timeout=10)
-            except requests.exceptions.RequestException as e:
-                print(f"Error calling Operations Agent: {e}")
-                quotes_db[quote_id]['status'] = 'ERROR_OPERATIONS'
+# --- Máquina de estados de la cotización ---
+
+# Transiciones permitidas. Los errores de agente admiten recuperación si la
+# respuesta llega después (p. ej. tras un timeout del lado comercial).
+QUOTE_TRANSITIONS = {
+    QuoteStatus.DRAFT: {QuoteStatus.AWAITING_AGENTS},
+    QuoteStatus.AWAITING_AGENTS: {
+        QuoteStatus.CALCULATING_PRICE, QuoteStatus.ERROR_OPERATIONS,
+        QuoteStatus.ERROR_FINANCE, QuoteStatus.ERROR_DISPATCH,
+    },
+    QuoteStatus.ERROR_OPERATIONS: {QuoteStatus.CALCULATING_PRICE},
+    QuoteStatus.ERROR_FINANCE: {QuoteStatus.CALCULATING_PRICE},
+    QuoteStatus.CALCULATING_PRICE: {
+        QuoteStatus.READY_TO_SEND, QuoteStatus.REJECTED_CAPACITY, QuoteStatus.ERROR_COSTING,
+    },
+    QuoteStatus.READY_TO_SEND: {QuoteStatus.SENT},
+    QuoteStatus.SENT: {QuoteStatus.WON, QuoteStatus.LOST},
+}
+
+# Estados en los que el proceso de cotización ya terminó: el cliente no
+# tiene nada más que esperar.
+RESOLVED_STATUSES = frozenset((
+    QuoteStatus.READY_TO_SEND, QuoteStatus.REJECTED_CAPACITY, QuoteStatus.ERROR_OPERATIONS,
+    QuoteStatus.ERROR_FINANCE, QuoteStatus.ERROR_COSTING, QuoteStatus.ERROR_DISPATCH,
+    QuoteStatus.SENT, QuoteStatus.WON, QuoteStatus.LOST,
+))
+
+# Estados desde los que una respuesta de agente puede disparar el cálculo.
+_PRICEABLE_STATUSES = frozenset((
+    QuoteStatus.AWAITING_AGENTS, QuoteStatus.ERROR_OPERATIONS, QuoteStatus.ERROR_FINANCE,
+))
+
+# Intervalo con el que una espera revisa el almacenamiento compartido, para
+# enterarse de cambios aplicados por otros workers.
+_WAIT_POLL_INTERVAL = 0.5
+
+
+# Campos de la petición que identifican una cotización a efectos de
+# deduplicación: mismo lead y mismos payloads para los agentes.
+_FINGERPRINT_FIELDS = ('lead_id', 'operations_payload', 'finance_payload')
+
+# Intentos de generar un id libre antes de rendirse.
+_QUOTE_ID_ATTEMPTS = 5
+
+
+class InvalidTransition(Exception):
+    """Cambio de estado no permitido por QUOTE_TRANSITIONS."""
+
+
+class IdempotencyConflict(Exception):
+    """La Idempotency-Key ya se usó con un cuerpo de petición distinto."""
+
+
+class QuoteDispatchSaturated(DispatcherSaturated):
+    """DispatcherSaturated con el id de la cotización que no se pudo despachar."""
+
+    def __init__(self, quote_id):
+        super().__init__(quote_id)
+        self.quote_id = quote_id
+
+
+def transition(quote, new_status):
+    """Aplica un cambio de estado validándolo contra QUOTE_TRANSITIONS."""
+    current = quote['status']
+    if new_status not in QUOTE_TRANSITIONS.get(current, ()):
+        raise InvalidTransition(f"Invalid transition {current} -> {new_status}")
+    quote['status'] = new_status
+
+
+# --- Listeners por cotización (dentro del worker) ---
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def add_listener(quote_id, callback):
+    """Registra callback(quote) para cada actualización de la cotización."""
+    with _listeners_lock:
+        _listeners.setdefault(quote_id, []).append(callback)
+
+
+def remove_listener(quote_id, callback):
+    with _listeners_lock:
+        callbacks = _listeners.get(quote_id)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del _listeners[quote_id]
+
+
+def _update_quote(quote_id, mutator):
+    """Actualización atómica seguida del aviso a los listeners de la cotización."""
+    quote = get_storage().update_quote(quote_id, mutator)
+    if quote is not None:
+        with _listeners_lock:
+            callbacks = list(_listeners.get(quote_id, ()))
+        for callback in callbacks:
+            callback(quote)
+    return quote
+
+
+def wait_for_resolution(quote_id, timeout):
+    """
+    Bloquea hasta que la cotización llegue a un estado de RESOLVED_STATUSES o
+    venza el timeout. Se despierta al instante con cambios de este worker y
+    revisa el almacenamiento periódicamente para los de otros workers.
+    Devuelve la cotización (o None si no existe).
+    """
+    changed = threading.Event()
+    callback = lambda quote: changed.set()
+    add_listener(quote_id, callback)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            quote = get_storage().get_quote(quote_id)
+            remaining = deadline - time.monotonic()
+            if quote is None or quote['status'] in RESOLVED_STATUSES or remaining <= 0:
+                return quote
+            changed.wait(min(remaining, _WAIT_POLL_INTERVAL))
+            changed.clear()
+    finally:
+        remove_listener(quote_id, callback)
+
+
+def iter_status_changes(quote_id, timeout):
+    """
+    Generador para Server-Sent Events: produce la cotización cada vez que
+    cambia su estado, hasta que se resuelve o vence el timeout.
+    """
+    updates = queue.Queue()
+    add_listener(quote_id, updates.put)
+    try:
+        deadline = time.monotonic() + timeout
+        last_status = None
+        while True:
+            quote = get_storage().get_quote(quote_id)
+            if quote is None:
+                return
+            if quote['status'] != last_status:
+                last_status = quote['status']
+                yield quote
+            remaining = deadline - time.monotonic()
+            if quote['status'] in RESOLVED_STATUSES or remaining <= 0:
                 return
+            try:
+                updates.get(timeout=min(remaining, _WAIT_POLL_INTERVAL))
+            except queue.Empty:
+                pass
+    finally:
+        remove_listener(quote_id, updates.put)
+
+
+def set_quote_status(quote_id, new_status):
+    """Cambio de estado solicitado por la API (SENT, WON, LOST...)."""
+    return _update_quote(quote_id, lambda q: transition(q, new_status))
+
+
+# --- Creación de cotizaciones (idempotente y deduplicada) ---
+
+def new_quote_id():
+    """QT-<año>-<16 hex>: 64 bits aleatorios, sin colisiones en la práctica."""
+    return f"QT-{datetime.utcnow().year}-{secrets.token_hex(8).upper()}"
+
+def request_fingerprint(data):
+    """Huella de los campos que definen la cotización (JSON canónico + SHA-256)."""
+    canonical = json.dumps({field: data.get(field) for field in _FINGERPRINT_FIELDS},
+                           sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _unused_quote_id(storage):
+    """Id nuevo que no pertenece a ninguna cotización guardada."""
+    for _ in range(_QUOTE_ID_ATTEMPTS):
+        quote_id = new_quote_id()
+        if storage.get_quote(quote_id) is None:
+            return quote_id
+    raise RuntimeError("Could not allocate a unique quote id")
+
+def create_quote(data, idempotency_key=None):
+    """
+    Crea la cotización y lanza el proceso con los agentes, deduplicando:
+
+    - Una petición idéntica (mismo lead y payloads) a otra cuyo proceso
+      sigue en curso se une a ella ("coalesced") en lugar de repetir las
+      llamadas a los agentes.
+    - Con Idempotency-Key, una clave ya vista devuelve la misma cotización
+      ("replayed"); con otro cuerpo lanza IdempotencyConflict. Las claves
+      vencen a IDEMPOTENCY_KEY_TTL_SECONDS.
+
+    Las reservas viven en el almacenamiento compartido, así que valen entre
+    workers. Devuelve (quote_id, resultado) con resultado "created",
+    "replayed" o "coalesced". Lanza QuoteDispatchSaturated si el
+    despachador está lleno.
+    """
+    config = current_app.config
+    storage = get_storage()
+    fingerprint = request_fingerprint(data)
+    flight_key = f"inflight:{fingerprint}"
+
+    # 1. ¿Hay una petición idéntica en curso? Una reserva reciente cuya
+    # cotización aún no existe es de otro worker que está a punto de
+    # guardarla; pasado QUOTE_COALESCE_GRACE_SECONDS se da por abandonada
+    # (p. ej. el worker murió) y se libera. Si tras dos intentos la reserva
+    # sigue apuntando a una cotización resuelta o abandonada, se crea una
+    # nueva sin reserva.
+    coalesce_ttl = config['QUOTE_COALESCE_SECONDS']
+    grace = config.get('QUOTE_COALESCE_GRACE_SECONDS', 5)
+    quote_id = _unused_quote_id(storage)
+    outcome = "created"
+    for _ in range(2):
+        held = storage.claim_key(flight_key, quote_id, fingerprint, coalesce_ttl)
+        if held is None:
+            break
+        quote = storage.get_quote(held[0])
+        if quote is None:
+            pending = coalesce_ttl - held[2] < grace
+        else:
+            pending = quote['status'] not in RESOLVED_STATUSES
+        if pending:
+            quote_id, outcome = held[0], "coalesced"
+            break
+        storage.release_key(flight_key, held[0])  # Resuelta o abandonada: se lanza otra.
+
+    # 2. La Idempotency-Key queda ligada a la cotización resultante.
+    if idempotency_key:
+        idem_key = f"idem:{idempotency_key}"
+        held = storage.claim_key(idem_key, quote_id, fingerprint, config['IDEMPOTENCY_KEY_TTL_SECONDS'])
+        if held is not None:
+            if outcome == "created":
+                storage.release_key(flight_key, quote_id)
+            if held[1] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key already used with a different request")
+            return held[0], "replayed"
+    else:
+        idem_key = None
+    if outcome == "coalesced":
+        return quote_id, outcome
+
+    # 3. Solo quien tiene la reserva crea la cotización y llama a los agentes.
+    if not storage.insert_quote({
+        "id": quote_id, "lead_id": data['lead_id'], "status": QuoteStatus.DRAFT,
+        "operations_check": {"request_id": quote_id, "response": None},
+        "finance_check": {"response": None}, "created_at": datetime.utcnow().isoformat()
+    }):
+        raise RuntimeError(f"Quote id {quote_id} already exists")
+    try:
+        initiate_quote_process(quote_id, data)
+    except DispatcherSaturated:
+        mark_dispatch_error(quote_id)
+        # El cliente debe reintentar: ni la reserva ni la clave deben
+        # devolverle esta cotización fallida.
+        storage.release_key(flight_key, quote_id)
+        if idem_key is not None:
+            storage.release_key(idem_key, quote_id)
+        raise QuoteDispatchSaturated(quote_id)
+    return quote_id, outcome
+
+# --- Proceso de cotización ---
 
-            # 2. Consultar a Finanzas
+def _mark_error(quote_id, status):
+    """
+    Marca el error solo si la cotización sigue esperando a los agentes.
+    Devuelve la cotización (o None si no existe).
+    """
+    def apply_error(quote):
+        if quote['status'] == QuoteStatus.AWAITING_AGENTS:
+            transition(quote, status)
+    return _update_quote(quote_id, apply_error)
+
+def mark_dispatch_error(quote_id):
+    _mark_error(quote_id, QuoteStatus.ERROR_DISPATCH)
+
+def initiate_quote_process(quote_id, quote_data):
+    """
+    Encola las llamadas a los agentes de Operaciones y Finanzas, que se
+    ejecutan en paralelo en el despachador compartido. Lanza
+    DispatcherSaturated si la cola está llena.
+    """
+    config = current_app.config
+    dispatcher = get_dispatcher(config)
+    operations = dispatcher.client(config['OPERATIONS_AGENT_URL'])
+    finance = dispatcher.client(config['FINANCE_AGENT_URL'])
+
+    def call_operations():
+        try:
+            payload = {"request_id": quote_id, **quote_data['operations_payload']}
+            response = operations.post("/api/operations/capacity-check", payload)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Error calling Operations Agent: {e}")
+            _mark_error(quote_id, QuoteStatus.ERROR_OPERATIONS)
+            return
+        # El servicio de Operaciones responde la verificación en el acto
+        # (200); los agentes que la procesan aparte (202) usan el callback.
+        if response.status_code == 200:
             try:
-                fin_url = f"{app.config['FINANCE_AGENT_URL']}/api/finance/quote-costing-request"
-                payload = {"quote_id": quote_id, **quote_data['finance_payload']}
-                quotes_db[quote_id]['status'] = 'AWAITING_FINANCE'
-                requests.post(fin_url, json=payload, timeout=10)
-            except requests.exceptions.RequestException as e:
-                print(f"Error calling Finance Agent: {e}")
-                quotes_db[quote_id]['status'] = 'ERROR_FINANCE'
+                process_operations_response(quote_id, response.json())
+            except ValueError:
+                _mark_error(quote_id, QuoteStatus.ERROR_OPERATIONS)
 
-    thread = threading.Thread(target=async_quote_processing)
-    thread.start()
+    def call_finance():
+        try:
+            payload = {"quote_id": quote_id, **quote_data['finance_payload']}
+            finance.post("/api/finance/quote-costing-request", payload).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Error calling Finance Agent: {e}")
+            _mark_error(quote_id, QuoteStatus.ERROR_FINANCE)
+
+    _update_quote(quote_id, lambda q: transition(q, QuoteStatus.AWAITING_AGENTS))
+    dispatcher.submit_many([call_operations, call_finance])
 
 def process_operations_response(request_id, response_data):
     """Procesa la respuesta del Agente de Operaciones."""
-    quote = quotes_db.get(request_id)
-    if not quote: return False, "Quote not found"
+    def apply_response(quote):
+        if quote['status'] not in _PRICEABLE_STATUSES:
+            return  # Callback repetido: la cotización ya se resolvió.
+        quote['operations_check']['response'] = response_data
+        check_and_calculate_price(quote)
 
-    quote['operations_check']['response'] = response_data
-    check_and_calculate_price(request_id)
+    if not _update_quote(request_id, apply_response):
+        return False, "Quote not found"
     return True, "Operations data received"
 
 def process_finance_response(quote_id, response_data):
     """Procesa la respuesta del Agente de Finanzas."""
-    quote = quotes_db.get(quote_id)
-    if not quote: return False, "Quote not found"
+    def apply_response(quote):
+        if quote['status'] not in _PRICEABLE_STATUSES:
+            return  # Callback repetido: la cotización ya se resolvió.
+        quote['finance_check']['response'] = response_data
+        quote['base_cost_for_quote'] = response_data.get('base_cost_for_quote', 0)
+        check_and_calculate_price(quote)
 
-    quote['finance_check']['response'] = response_data
-    quote['base_cost_for_quote'] = response_data.get('base_cost_for_quote', 0)
-    check_and_calculate_price(quote_id)
+    if not _update_quote(quote_id, apply_response):
+        return False, "Quote not found"
     return True, "Finance data received"
 
-def check_and_calculate_price(quote_id):
-    """Verifica si se tiene info de ambos agentes y calcula el precio."""
-    quote = quotes_db.get(quote_id)
-    if not quote or not (quote['operations_check'].get('response') and quote['finance_check'].get('response')):
+def check_and_calculate_price(quote):
+    """
+    Verifica si se tiene info de ambos agentes y calcula el precio.
+    Se ejecuta dentro de la actualización atómica de la cotización, por lo
+    que las dos respuestas nunca se pisan aunque lleguen a workers distintos.
+    """
+    if quote['status'] not in _PRICEABLE_STATUSES:
+        return
+    if not (quote['operations_check'].get('response') and quote['finance_check'].get('response')):
         return
 
-    quote['status'] = 'CALCULATING_PRICE'
+    transition(quote, QuoteStatus.CALCULATING_PRICE)
 
     if not quote['operations_check']['response'].get('can_be_fulfilled', False):
-        quote['status'] = 'REJECTED_CAPACITY'
+        transition(quote, QuoteStatus.REJECTED_CAPACITY)
         return
 
     base_cost = quote.get('base_cost_for_quote', 0)
     if base_cost <= 0:
-        quote['status'] = 'ERROR_COSTING'
+        transition(quote, QuoteStatus.ERROR_COSTING)
         return
 
     margen_base = 0.20
     precio_final = base_cost * (1 + margen_base)
 
     quote['final_price'] = round(precio_final, 2)
-    quote['status'] = 'READY_TO_SEND'
-    quotes_db[quote_id] = quote
+    transition(quote, QuoteStatus.READY_TO_SEND)
+
+
+# --- Barrido de cotizaciones atascadas ---
+# Si la respuesta de un agente no llega nunca (callback perdido, worker
+# caído), la cotización se quedaría en AWAITING_AGENTS para siempre. Un hilo
+# por proceso la pasa a error cuando supera QUOTE_AGENT_TIMEOUT_SECONDS.
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def expire_stale_quotes(timeout, now=None):
+    """
+    Pasa a error las cotizaciones que llevan más de `timeout` segundos en
+    AWAITING_AGENTS: ERROR_OPERATIONS si falta la respuesta de Operaciones,
+    ERROR_FINANCE si solo falta la de Finanzas. Devuelve cuántas expiró.
+    """
+    now = now or datetime.utcnow()
+    expired = 0
+    for quote in get_storage().find_quotes(status=QuoteStatus.AWAITING_AGENTS):
+        try:
+            age = (now - datetime.fromisoformat(quote['created_at'])).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if age < timeout:
+            continue
+        if not quote['operations_check'].get('response'):
+            status = QuoteStatus.ERROR_OPERATIONS
+        else:
+            status = QuoteStatus.ERROR_FINANCE
+        updated = _mark_error(quote['id'], status)
+        if updated is not None and updated['status'] == status:
+            expired += 1
+    return expired
+
+
+def _sweep_loop(timeout, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            expired = expire_stale_quotes(timeout)
+        except Exception as e:  # El hilo no debe morir: se reintenta en la próxima vuelta.
+            print(f"Quote sweeper: error: {e!r}")
+            continue
+        if expired:
+            print(f"Quote sweeper: {expired} quote(s) timed out waiting for agents")
+
+
+def ensure_quote_sweeper(config):
+    """
+    Arranca el barrido en el proceso actual si aún no corre. Se llama en cada
+    petición, así que tras un fork cada worker lanza el suyo. Con
+    QUOTE_AGENT_TIMEOUT_SECONDS <= 0 queda desactivado.
+    """
+    global _sweeper
+    timeout = config.get('QUOTE_AGENT_TIMEOUT_SECONDS', 0)
+    if timeout <= 0:
+        return
+    with _sweeper_lock:
+        if _sweeper is not None and _sweeper[0] == os.getpid() and _sweeper[1].is_alive():
+            return
+        thread = threading.Thread(
+            target=_sweep_loop, name='quote-sweeper', daemon=True,
+            args=(timeout, config.get('QUOTE_SWEEP_INTERVAL_SECONDS', 30)))
+        thread.start()
+        _sweeper = (os.getpid(), thread)
@@ -0,0 +1,345 @@
+"""
+Benchmark del flujo de cotización Comercial -> Operaciones -> Finanzas.
+
+Levanta el Agente Comercial desde create_app en un puerto local (con los
+mocks del blueprint de desarrollo o con agentes sustitutos de latencia
+configurable), genera carga de creación de leads, POST /quotes y
+GET /funnel/kpis, y escribe un reporte JSON con throughput, percentiles de
+latencia, tiempo de resolución de cotizaciones y tasa de errores.
+
+Uso (desde backend/commercial):
+
+    python -m benchmarks.quote_pipeline --quotes 500 --concurrency 32 \\
+        --agents standin --agent-latency-ms 50 --output bench.json
+
+    # Comparar con un reporte previo; sale con código 1 si hay regresión.
+    python -m benchmarks.quote_pipeline --compare bench.json --max-regression 20
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+API = '/api/commercial'
+
+
+# --- Agentes sustitutos ---
+
+def create_standin_agents(callback_url, latency_ms, jitter_ms, failure_rate):
+    """
+    Operaciones y Finanzas mínimos: aceptan la petición, esperan
+    latency_ms +/- jitter_ms y devuelven el callback al endpoint masivo.
+    failure_rate es la fracción de peticiones que responden 503.
+    """
+    from flask import Flask, jsonify, request
+
+    agents = Flask('standin_agents')
+    session = requests.Session()
+
+    def callback_later(callback_type, ref_id, payload):
+        delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0
+
+        def send():
+            body = {"callbacks": [{"id": 0, "type": callback_type, "ref_id": ref_id,
+                                   "payload": payload}]}
+            try:
+                session.post(f"{callback_url}{API}/callbacks:batch", json=body, timeout=10)
+            except requests.exceptions.RequestException as e:
+                print(f"Stand-in agent: callback failed: {e}", file=sys.stderr)
+
+        threading.Timer(delay, send).start()
+
+    @agents.route('/api/operations/capacity-check', methods=['POST'])
+    def capacity_check():
+        if random.random() < failure_rate:
+            return jsonify({"error": "injected failure"}), 503
+        data = request.get_json()
+        callback_later('capacity_check', data.get('request_id'),
+                       {"can_be_fulfilled": True, "confidence_score": 0.9})
+        return jsonify({"message": "accepted"}), 202
+
+    @agents.route('/api/finance/quote-costing-request', methods=['POST'])
+    def quote_costing():
+        if random.random() < failure_rate:
+            return jsonify({"error": "injected failure"}), 503
+        data = request.get_json()
+        base_cost = round(data.get('estimated_direct_costs', 0) * 1.3, 2)
+        callback_later('costing', data.get('quote_id'), {"base_cost_for_quote": base_cost})
+        return jsonify({"message": "accepted"}), 202
+
+    return agents
+
+
+def serve(app):
+    """Sirve una app WSGI en un puerto libre; devuelve (servidor, url base)."""
+    from werkzeug.serving import make_server
+
+    # El log de acceso por petición distorsiona las mediciones.
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def start_commercial(args, workdir):
+    """Crea el Agente Comercial con almacenamiento aislado en workdir."""
+    os.environ['STORAGE_BACKEND'] = args.storage
+    os.environ['SQLITE_PATH'] = os.path.join(workdir, 'commercial.db')
+    os.environ['CALLBACK_OUTBOX_PATH'] = os.path.join(workdir, 'callback_outbox.db')
+
+    # La configuración lee el entorno al importarse.
+    from app import create_app
+
+    app = create_app('development')
+    server, url = serve(app)
+    app.config['COMMERCIAL_CALLBACK_URL'] = url
+
+    agents_server = None
+    if args.agents == 'standin':
+        agents = create_standin_agents(url, args.agent_latency_ms, args.agent_jitter_ms,
+                                       args.agent_failure_rate)
+        agents_server, agents_url = serve(agents)
+    else:
+        agents_url = url
+    app.config['OPERATIONS_AGENT_URL'] = agents_url
+    app.config['FINANCE_AGENT_URL'] = agents_url
+    return app, url, [server] + ([agents_server] if agents_server else [])
+
+
+# --- Generación de carga ---
+
+_local = threading.local()
+
+
+def _session():
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def _timed(method, url, **kwargs):
+    """Devuelve (latencia en ms, status o None si hubo error de red, json)."""
+    started = time.perf_counter()
+    try:
+        response = _session().request(method, url, timeout=60, **kwargs)
+        status = response.status_code
+        body = response.json() if response.content else None
+    except (requests.exceptions.RequestException, ValueError):
+        status, body = None, None
+    return (time.perf_counter() - started) * 1000.0, status, body
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "mean": round(sum(ordered) / len(ordered), 3), "max": round(ordered[-1], 3)}
+
+
+def run_phase(name, count, concurrency, task):
+    """Ejecuta `task(i)` count veces; task devuelve (latencia ms, ok, extra)."""
+    latencies, errors, extras = [], 0, []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"bench-{name}") as pool:
+        for latency, ok, extra in pool.map(task, range(count)):
+            latencies.append(latency)
+            errors += 0 if ok else 1
+            if extra is not None:
+                extras.append(extra)
+    duration = time.perf_counter() - started
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(count / duration, 2) if duration else None,
+        "latency_ms": percentiles(latencies),
+    }, extras
+
+
+def lead_task(url):
+    def task(i):
+        body = {"source": "benchmark", "details": {"n": i},
+                "criteria": {"icp": random.randint(0, 100), "intent": random.randint(0, 100),
+                             "engagement": random.randint(0, 100)}}
+        latency, status, _ = _timed('POST', f"{url}{API}/leads", json=body)
+        return latency, status == 201, None
+    return task
+
+
+def quote_task(url, wait_seconds):
+    """POST /quotes y long-poll hasta su resolución (tiempo de extremo a extremo)."""
+    def task(i):
+        body = {"lead_id": f"bench-{i}", "operations_payload": {"project": "bench"},
+                "finance_payload": {"estimated_direct_costs": 1000 + i}}
+        started = time.perf_counter()
+        latency, status, created = _timed('POST', f"{url}{API}/quotes", json=body)
+        if status != 202:
+            return latency, False, {"status": f"HTTP_{status}", "completion_ms": None}
+        _, status, quote = _timed('GET', f"{url}{API}/quotes/{created['quote_id']}",
+                                  params={"wait": wait_seconds})
+        completion = (time.perf_counter() - started) * 1000.0
+        final = quote.get('status') if status == 200 and quote else f"HTTP_{status}"
+        return latency, final == 'READY_TO_SEND', {"status": final, "completion_ms": completion}
+    return task
+
+
+def kpi_task(url):
+    def task(i):
+        latency, status, _ = _timed('GET', f"{url}{API}/funnel/kpis")
+        return latency, status == 200, None
+    return task
+
+
+# --- Reporte ---
+
+def git_revision():
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root,
+                                      stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=root, stderr=subprocess.DEVNULL, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return sha, dirty
+
+
+def run_benchmark(args):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory(prefix='quote-bench-') as workdir:
+        app, url, servers = start_commercial(args, workdir)
+        try:
+            phases = {}
+            if args.leads:
+                phases['create_leads'], _ = run_phase('leads', args.leads, args.concurrency,
+                                                      lead_task(url))
+            if args.quotes:
+                quotes, outcomes = run_phase('quotes', args.quotes, args.concurrency,
+                                             quote_task(url, args.wait_seconds))
+                completions = [o['completion_ms'] for o in outcomes if o['completion_ms'] is not None]
+                quotes['completion_ms'] = percentiles(completions)
+                quotes['final_status'] = dict(Counter(o['status'] for o in outcomes))
+                phases['quotes'] = quotes
+            if args.kpi_reads:
+                phases['funnel_kpis'], _ = run_phase('kpis', args.kpi_reads, args.concurrency,
+                                                     kpi_task(url))
+        finally:
+            for server in servers:
+                server.shutdown()
+
+    sha, dirty = git_revision()
+    return {
+        "benchmark": "quote_pipeline",
+        "git_sha": sha,
+        "git_dirty": dirty,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "agents": args.agents, "storage": args.storage, "concurrency": args.concurrency,
+            "leads": args.leads, "quotes": args.quotes, "kpi_reads": args.kpi_reads,
+            "agent_latency_ms": args.agent_latency_ms, "agent_jitter_ms": args.agent_jitter_ms,
+            "agent_failure_rate": args.agent_failure_rate, "seed": args.seed,
+        },
+        "phases": phases,
+    }
+
+
+# Métricas comparadas: (fase, ruta dentro de la fase, mayor es mejor).
+_COMPARED = (
+    ("create_leads", ("throughput_rps",), True),
+    ("create_leads", ("latency_ms", "p95"), False),
+    ("quotes", ("throughput_rps",), True),
+    ("quotes", ("completion_ms", "p50"), False),
+    ("quotes", ("completion_ms", "p95"), False),
+    ("quotes", ("completion_ms", "p99"), False),
+    ("quotes", ("error_rate",), False),
+    ("funnel_kpis", ("throughput_rps",), True),
+    ("funnel_kpis", ("latency_ms", "p95"), False),
+)
+
+
+def compare(report, baseline, max_regression_pct):
+    """Diferencias contra un reporte previo; marca las que empeoran más del umbral."""
+    rows = []
+    for phase, path, higher_is_better in _COMPARED:
+        current, previous = report["phases"].get(phase), baseline.get("phases", {}).get(phase)
+        for key in path:
+            current = current.get(key) if isinstance(current, dict) else None
+            previous = previous.get(key) if isinstance(previous, dict) else None
+        if current is None or previous is None:
+            continue
+        if previous:
+            change = (current - previous) / previous * 100.0
+        else:
+            change = 0.0 if current == previous else float('inf')
+        worse = -change if higher_is_better else change
+        rows.append({"metric": f"{phase}.{'.'.join(path)}", "baseline": previous,
+                     "current": current, "change_pct": round(change, 2),
+                     "regression": worse > max_regression_pct})
+    return {"baseline_git_sha": baseline.get("git_sha"),
+            # Solo tiene sentido comparar corridas con los mismos parámetros.
+            "params_match": baseline.get("params") == report["params"],
+            "max_regression_pct": max_regression_pct,
+            "metrics": rows, "regressed": any(r["regression"] for r in rows)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--leads', type=int, default=500, help="leads a crear")
+    parser.add_argument('--quotes', type=int, default=200, help="cotizaciones a crear y esperar")
+    parser.add_argument('--kpi-reads', type=int, default=500, help="lecturas de /funnel/kpis")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--agents', choices=('mock', 'standin'), default='standin',
+                        help="mocks del blueprint de desarrollo o agentes sustitutos")
+    parser.add_argument('--agent-latency-ms', type=float, default=20.0)
+    parser.add_argument('--agent-jitter-ms', type=float, default=5.0)
+    parser.add_argument('--agent-failure-rate', type=float, default=0.0)
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--wait-seconds', type=float, default=30.0,
+                        help="long-poll máximo por cotización")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="archivo donde guardar el reporte JSON")
+    parser.add_argument('--compare', help="reporte previo contra el que comparar")
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help="porcentaje de empeoramiento tolerado al comparar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report["comparison"] = compare(report, json.load(f), args.max_regression)
+        exit_code = 1 if report["comparison"]["regressed"] else 0
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
 import os
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     """Configuración base."""
     SECRET_KEY = os.getenv('SECRET_KEY', 'un-secreto-muy-dificil-de-adivinar')
@@ -8,6 +10,65 @@ class Config:
     FINANCE_AGENT_URL = os.getenv('FINANCE_AGENT_URL', 'http://127.0.0.1:5001')
     OPERATIONS_AGENT_URL = os.getenv('OPERATIONS_AGENT_URL', 'http://127.0.0.1:5002')
 
+    # Almacenamiento de leads/cotizaciones: 'memory' (un solo proceso) o
+    # 'sqlite' (archivo compartido por todos los workers de Gunicorn).
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(BASE_DIR, 'data', 'commercial.db'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+    # Despachador de llamadas a Operaciones/Finanzas (por worker).
+    DISPATCHER_WORKERS = int(os.getenv('DISPATCHER_WORKERS', 32))
+    DISPATCHER_MAX_QUEUE = int(os.getenv('DISPATCHER_MAX_QUEUE', 1000))
+    AGENT_MAX_IN_FLIGHT = int(os.getenv('AGENT_MAX_IN_FLIGHT', 16))
+    AGENT_HTTP_TIMEOUT = float(os.getenv('AGENT_HTTP_TIMEOUT', 10))
+    AGENT_RETRIES = int(os.getenv('AGENT_RETRIES', 3))
+    AGENT_RETRY_BACKOFF = float(os.getenv('AGENT_RETRY_BACKOFF', 0.5))
+
+    # Callbacks salientes: cola SQLite durable, entrega en lote al endpoint
+    # masivo del Agente Comercial y reintentos con backoff exponencial.
+    COMMERCIAL_CALLBACK_URL = os.getenv('COMMERCIAL_CALLBACK_URL', 'http://127.0.0.1:5003')
+    CALLBACK_OUTBOX_PATH = os.getenv('CALLBACK_OUTBOX_PATH', os.path.join(BASE_DIR, 'data', 'callback_outbox.db'))
+    CALLBACK_BATCH_SIZE = int(os.getenv('CALLBACK_BATCH_SIZE', 100))
+    CALLBACK_MAX_ATTEMPTS = int(os.getenv('CALLBACK_MAX_ATTEMPTS', 8))
+    CALLBACK_BACKOFF_BASE = float(os.getenv('CALLBACK_BACKOFF_BASE', 0.5))
+    CALLBACK_BACKOFF_MAX = float(os.getenv('CALLBACK_BACKOFF_MAX', 60))
+    CALLBACK_POLL_INTERVAL = float(os.getenv('CALLBACK_POLL_INTERVAL', 0.2))
+
+    # Máximo que un cliente puede esperar en GET /quotes/<id>?wait=N o en el
+    # stream de eventos antes de recibir el estado vigente.
+    QUOTE_MAX_WAIT_SECONDS = float(os.getenv('QUOTE_MAX_WAIT_SECONDS', 30))
+
+    # Deduplicación de POST /quotes: vigencia de las Idempotency-Key y
+    # ventana en la que peticiones idénticas se unen a la que está en curso.
+    IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_KEY_TTL_SECONDS', 86400))
+    QUOTE_COALESCE_SECONDS = int(os.getenv('QUOTE_COALESCE_SECONDS', 30))
+    # Tiempo que una reserva puede apuntar a una cotización aún no guardada
+    # antes de darla por abandonada.
+    QUOTE_COALESCE_GRACE_SECONDS = float(os.getenv('QUOTE_COALESCE_GRACE_SECONDS', 5))
+
+    # Una cotización que lleva más de QUOTE_AGENT_TIMEOUT_SECONDS esperando a
+    # los agentes pasa a ERROR_OPERATIONS/ERROR_FINANCE (0 lo desactiva). El
+    # barrido corre cada QUOTE_SWEEP_INTERVAL_SECONDS en cada worker.
+    QUOTE_AGENT_TIMEOUT_SECONDS = float(os.getenv('QUOTE_AGENT_TIMEOUT_SECONDS', 300))
+    QUOTE_SWEEP_INTERVAL_SECONDS = float(os.getenv('QUOTE_SWEEP_INTERVAL_SECONDS', 30))
+
+    # Retención del backend en memoria: las cotizaciones terminadas (WON,
+    # LOST, REJECTED_*, ERROR_*) y los leads descartados pasan a un archivo
+    # comprimido en disco tras RETENTION_TTL_SECONDS, y el conjunto en memoria
+    # se acota por LRU. Un GET de un registro archivado lo devuelve a memoria.
+    # Las opciones RETENTION_* solo afectan a STORAGE_BACKEND=memory: con
+    # SQLite no se archiva ni se expira nada.
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    RETENTION_TTL_SECONDS = float(os.getenv('RETENTION_TTL_SECONDS', 3600))
+    RETENTION_MAX_HOT_LEADS = int(os.getenv('RETENTION_MAX_HOT_LEADS', 100000))
+    RETENTION_MAX_HOT_QUOTES = int(os.getenv('RETENTION_MAX_HOT_QUOTES', 50000))
+    RETENTION_SWEEP_EVERY = int(os.getenv('RETENTION_SWEEP_EVERY', 1000))
+    RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', os.path.join(BASE_DIR, 'data'))
+
+    # Recalificación masiva: a partir de este tamaño la respuesta es NDJSON.
+    LEAD_BATCH_STREAM_THRESHOLD = int(os.getenv('LEAD_BATCH_STREAM_THRESHOLD', 10000))
+
 class DevelopmentConfig(Config):
     """Configuración de desarrollo."""
     DEBUG = True
@@ -15,6 +76,7 @@ class DevelopmentConfig(Config):
     # En desarrollo, apuntamos a los mocks que están en el mismo servicio.
     FINANCE_AGENT_URL = 'http://127.0.0.1:5003'
     OPERATIONS_AGENT_URL = 'http://127.0.0.1:5003'
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'memory')
 
 
 class ProductionConfig(Config):
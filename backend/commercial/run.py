@@ -1,15 +1,23 @@
 import os
-from dotenv import load_dotenv
+
+from common.startup import StartupProfile
+
+# Desglose del arranque por fases (GET /startup).
+startup = StartupProfile('commercial')
 
 # Cargar variables de entorno desde el archivo .env
-# Es crucial que esto ocurra antes de crear la app.
-load_dotenv()
+# Es crucial que esto ocurra antes de crear la app (y de importar config,
+# que las lee).
+with startup.phase('dotenv'):
+    from dotenv import load_dotenv
+    load_dotenv()
 
-from app import create_app
+with startup.phase('imports'):
+    from app import create_app
 
 # Obtener la configuración del entorno, por defecto 'development'
 env_name = os.getenv('FLASK_ENV', 'development')
-app = create_app(env_name)
+app = create_app(env_name, startup)
 
 if __name__ == '__main__':
     # El servidor de desarrollo de Flask no es para producción.
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+from app.models.archive import RecordArchive, remove_orphans  # noqa: E402
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def touch(path):
+    open(path, 'w').close()
+
+
+def test_new_archive_removes_files_of_dead_processes(tmp_path):
+    pid = dead_pid()
+    for suffix in ('', '-wal', '-shm'):
+        touch(tmp_path / f'memory-archive-{pid}-abc.db{suffix}')
+    live = tmp_path / f'memory-archive-{os.getppid()}-xyz.db'
+    touch(live)
+    touch(tmp_path / 'commercial.db')
+
+    archive = RecordArchive(str(tmp_path))
+    archive.put_many('lead', [{'id': 'LD-1', 'status': 'QUALIFIED_OUT'}])
+
+    names = sorted(os.listdir(tmp_path))
+    assert not any(name.startswith(f'memory-archive-{pid}-') for name in names)
+    assert live.name in names and 'commercial.db' in names
+    assert os.path.basename(archive.path).startswith(f'memory-archive-{os.getpid()}-')
+    assert archive.get('lead', 'LD-1') == {'id': 'LD-1', 'status': 'QUALIFIED_OUT'}
+    archive._remove()
+
+
+def test_files_with_our_own_pid_are_orphans(tmp_path):
+    touch(tmp_path / f'memory-archive-{os.getpid()}-old.db')
+
+    assert remove_orphans(str(tmp_path)) == 1
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,58 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+import pytest  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from app.api.commercial_agent_api import commercial_bp  # noqa: E402
+from app.models.storage import get_storage, init_storage  # noqa: E402
+from app.services import lead_service  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    storage = init_storage({'STORAGE_BACKEND': 'sqlite', 'SQLITE_PATH': str(tmp_path / 'c.db')})
+    storage.save_lead({'id': 'LD-1', 'criteria': {'icp': 100, 'intent': 100, 'engagement': 100},
+                       'status': 'PRELIMINARY'})
+    app = Flask(__name__)
+    app.register_blueprint(commercial_bp, url_prefix='/api/commercial')
+    yield app.test_client()
+    storage.close()
+
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), float('-inf'), 10 ** 400])
+def test_resolve_weights_rejects_non_finite(value):
+    with pytest.raises(ValueError, match="finite"):
+        lead_service.resolve_weights({'w_icp': value})
+
+
+def test_resolve_weights_fills_defaults():
+    assert lead_service.resolve_weights({'w_eng': 0}) == {'w_icp': 0.5, 'w_intent': 0.4, 'w_eng': 0}
+
+
+@pytest.mark.parametrize('lead_ids', [[['LD-1']], [{'id': 'LD-1'}], ['LD-1', None], [True], [1.5]])
+def test_batch_rejects_invalid_lead_ids(client, lead_ids):
+    response = client.post('/api/commercial/leads/qualify:batch', json={'lead_ids': lead_ids})
+
+    assert response.status_code == 400
+
+
+def test_batch_rejects_non_finite_weight(client):
+    # El parser JSON de Python acepta NaN e Infinity aunque no sean JSON estándar.
+    response = client.post('/api/commercial/leads/qualify:batch',
+                           data='{"lead_ids": ["LD-1"], "weights": {"w_icp": Infinity}}',
+                           content_type='application/json')
+
+    assert response.status_code == 400
+
+
+def test_batch_qualifies_valid_ids(client):
+    response = client.post('/api/commercial/leads/qualify:batch',
+                           json={'lead_ids': ['LD-1', 7], 'stream': False})
+
+    assert response.status_code == 200
+    assert get_storage().get_lead('LD-1')['status'] == 'MQL'
@@ -0,0 +1,83 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+import pytest  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from app.models.records import QuoteStatus  # noqa: E402
+from app.models.storage import init_storage  # noqa: E402
+from app.services import quote_service  # noqa: E402
+
+REQUEST = {'lead_id': 'LD-1', 'operations_payload': {'hours': 10},
+           'finance_payload': {'estimated_direct_costs': 100}}
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    # Sin agentes: la cotización se queda esperando su respuesta.
+    monkeypatch.setattr(quote_service, 'initiate_quote_process', lambda quote_id, data:
+                        quote_service.set_quote_status(quote_id, QuoteStatus.AWAITING_AGENTS))
+    app = Flask(__name__)
+    app.config.update(QUOTE_COALESCE_SECONDS=30, QUOTE_COALESCE_GRACE_SECONDS=5,
+                      IDEMPOTENCY_KEY_TTL_SECONDS=60)
+    storage = init_storage({'STORAGE_BACKEND': 'sqlite', 'SQLITE_PATH': str(tmp_path / 'c.db')})
+    with app.app_context():
+        yield storage
+    storage.close()
+
+
+def flight_key():
+    return f"inflight:{quote_service.request_fingerprint(REQUEST)}"
+
+
+def test_identical_request_joins_the_one_in_flight(storage):
+    first, outcome = quote_service.create_quote(REQUEST)
+    assert outcome == "created"
+
+    assert quote_service.create_quote(REQUEST) == (first, "coalesced")
+
+
+def test_resolved_quote_is_not_coalesced(storage):
+    first, _ = quote_service.create_quote(REQUEST)
+    quote_service.process_operations_response(first, {'can_be_fulfilled': False})
+    quote_service.process_finance_response(first, {'base_cost_for_quote': 100})
+    assert storage.get_quote(first)['status'] == QuoteStatus.REJECTED_CAPACITY
+
+    second, outcome = quote_service.create_quote(REQUEST)
+
+    assert outcome == "created" and second != first
+
+
+def test_reservation_kept_on_resolved_quote_creates_a_new_one(storage, monkeypatch):
+    first, _ = quote_service.create_quote(REQUEST)
+    storage.update_quote(first, lambda q: q.update(status=QuoteStatus.LOST))
+    # La reserva no se deja liberar: cada intento la vuelve a encontrar.
+    monkeypatch.setattr(storage, 'release_key', lambda key, quote_id: None)
+
+    second, outcome = quote_service.create_quote(REQUEST)
+
+    assert outcome == "created" and second != first
+    assert storage.get_quote(second)['status'] == QuoteStatus.AWAITING_AGENTS
+
+
+def test_recent_reservation_without_quote_is_coalesced(storage):
+    fingerprint = quote_service.request_fingerprint(REQUEST)
+    storage.claim_key(flight_key(), 'QT-SAVING', fingerprint, 30)
+
+    assert quote_service.create_quote(REQUEST) == ('QT-SAVING', "coalesced")
+
+
+def test_abandoned_reservation_without_quote_is_replaced(storage):
+    fingerprint = quote_service.request_fingerprint(REQUEST)
+    storage.claim_key(flight_key(), 'QT-DEAD-WORKER', fingerprint, 30)
+    quote_service.current_app.config['QUOTE_COALESCE_GRACE_SECONDS'] = 0
+
+    quote_id, outcome = quote_service.create_quote(REQUEST)
+
+    assert outcome == "created" and quote_id != 'QT-DEAD-WORKER'
+    assert storage.get_quote(quote_id) is not None
+    assert quote_service.create_quote(REQUEST) == (quote_id, "coalesced")
@@ -0,0 +1,78 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+import pytest  # noqa: E402
+
+from app.models.records import QuoteStatus  # noqa: E402
+from app.models.storage import get_storage, init_storage  # noqa: E402
+from app.services import quote_service  # noqa: E402
+from app.services.callback_outbox import CallbackOutbox  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def storage():
+    return init_storage({'STORAGE_BACKEND': 'memory'})
+
+
+def awaiting_quote(quote_id, age_seconds=0, operations_response=None):
+    created = datetime.utcnow() - timedelta(seconds=age_seconds)
+    get_storage().save_quote({
+        "id": quote_id, "lead_id": "LD-1", "status": QuoteStatus.AWAITING_AGENTS,
+        "operations_check": {"request_id": quote_id, "response": operations_response},
+        "finance_check": {"response": None}, "created_at": created.isoformat(),
+    })
+
+
+def status(quote_id):
+    return get_storage().get_quote(quote_id)['status']
+
+
+def test_dead_callback_moves_quote_to_error(tmp_path):
+    outbox = CallbackOutbox(str(tmp_path / 'outbox.db'))
+    awaiting_quote('QT-OPS')
+    awaiting_quote('QT-FIN')
+    outbox.enqueue('http://commercial', 'capacity_check', 'QT-OPS', {})
+    outbox.enqueue('http://commercial', 'costing', 'QT-FIN', {})
+    rows = outbox._claim()
+
+    outbox._fail(rows, "rejected by receiver")
+
+    assert status('QT-OPS') == QuoteStatus.ERROR_OPERATIONS
+    assert status('QT-FIN') == QuoteStatus.ERROR_FINANCE
+    assert outbox.stats()['dead'] == 2
+
+
+def test_dead_callback_for_missing_quote_is_ignored(tmp_path):
+    outbox = CallbackOutbox(str(tmp_path / 'outbox.db'))
+    outbox.enqueue('http://commercial', 'costing', 'QT-GONE', {})
+
+    outbox._fail(outbox._claim(), "rejected by receiver")
+
+    assert outbox.stats()['dead'] == 1
+
+
+def test_sweep_expires_only_stale_quotes():
+    awaiting_quote('QT-FRESH', age_seconds=10)
+    awaiting_quote('QT-NO-OPS', age_seconds=600)
+    awaiting_quote('QT-NO-FIN', age_seconds=600, operations_response={"can_be_fulfilled": True})
+
+    assert quote_service.expire_stale_quotes(300) == 2
+
+    assert status('QT-FRESH') == QuoteStatus.AWAITING_AGENTS
+    assert status('QT-NO-OPS') == QuoteStatus.ERROR_OPERATIONS
+    assert status('QT-NO-FIN') == QuoteStatus.ERROR_FINANCE
+    assert quote_service.expire_stale_quotes(300) == 0
+
+
+def test_late_response_recovers_expired_quote():
+    awaiting_quote('QT-LATE', age_seconds=600, operations_response={"can_be_fulfilled": True})
+    quote_service.expire_stale_quotes(300)
+
+    quote_service.process_finance_response('QT-LATE', {"base_cost_for_quote": 100})
+
+    assert status('QT-LATE') == QuoteStatus.READY_TO_SEND
@@ -0,0 +1,71 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+import pytest  # noqa: E402
+
+from app.models.storage import create_storage  # noqa: E402
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    config = {'STORAGE_BACKEND': request.param, 'SQLITE_PATH': str(tmp_path / 'commercial.db')}
+    backend = create_storage(config)
+    yield backend
+    backend.close()
+
+
+def dict_mutator(record):
+    """Usa la API de dict completa, como cualquier mutador de los servicios."""
+    previous = dict(record.items())
+    record.update({'status': 'MQL', 'score': 42})
+    record.pop('source')
+    record.setdefault('notes', []).append(f"recalificado desde {previous['status']}")
+
+
+def test_update_lead_passes_a_dict(storage):
+    storage.save_lead({'id': 'LD-1', 'source': 'web', 'details': {}, 'criteria': {'budget': 1},
+                       'score': 0, 'status': 'PRELIMINARY', 'created_at': '2025-01-01'})
+
+    updated = storage.update_lead('LD-1', dict_mutator)
+
+    expected = {'id': 'LD-1', 'details': {}, 'criteria': {'budget': 1}, 'score': 42,
+                'status': 'MQL', 'created_at': '2025-01-01', 'notes': ['recalificado desde PRELIMINARY']}
+    assert updated == expected
+    assert storage.get_lead('LD-1') == expected
+
+
+def test_update_quote_passes_a_dict(storage):
+    storage.save_quote({'id': 'QT-1', 'lead_id': 'LD-1', 'status': 'DRAFT',
+                        'operations_check': {'response': None}, 'finance_check': {'response': None},
+                        'created_at': '2025-01-01'})
+
+    def mutator(quote):
+        quote.update(status='AWAITING_AGENTS', final_price=10.0)
+        quote['finance_check'].setdefault('attempts', 1)
+        quote.pop('created_at')
+
+    storage.update_quote('QT-1', mutator)
+
+    quote = storage.get_quote('QT-1')
+    assert quote['status'] == 'AWAITING_AGENTS'
+    assert quote['final_price'] == 10.0
+    assert quote['finance_check'] == {'response': None, 'attempts': 1}
+    assert 'created_at' not in quote
+
+
+def test_failed_mutator_leaves_record_untouched(storage):
+    storage.save_quote({'id': 'QT-1', 'lead_id': 'LD-1', 'status': 'DRAFT',
+                        'operations_check': {'response': None}, 'finance_check': {'response': None}})
+
+    def mutator(quote):
+        quote['operations_check']['response'] = {'can_be_fulfilled': True}
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        storage.update_quote('QT-1', mutator)
+
+    assert storage.get_quote('QT-1')['operations_check'] == {'response': None}
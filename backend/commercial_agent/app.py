@@ -1,8 +1,16 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
+from common.startup import StartupProfile, enable_cors, install_startup_report
 
-app = Flask(__name__)
-CORS(app)
+startup = StartupProfile('commercial_agent')  # Desglose del arranque (GET /startup)
+
+with startup.phase('imports'):
+    from flask import Flask, jsonify
+
+    from common.instrumentation import instrument_app
+
+with startup.phase('app'):
+    app = Flask(__name__)
+    enable_cors(app)
+    instrument_app(app, 'commercial_agent')
 
 @app.route('/status')
 def status():
@@ -19,5 +27,7 @@ def get_data():
     }
     return jsonify(commercial_data)
 
+install_startup_report(app, startup)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5003)
@@ -0,0 +1,335 @@
+# --- Instrumentación Compartida de los Servicios Flask ---
+# Métricas por ruta (histograma de latencia, contador por status, peticiones
+# en vuelo) y tiempos de llamadas salientes, expuestas en /metrics con el
+# formato de texto de Prometheus. Incluye un modo de perfilado opcional que
+# guarda las estadísticas de cProfile de peticiones individuales.
+#
+# Solo usa la biblioteca estándar para que los seis servicios (incluidos los
+# *_agent mínimos) puedan registrarlo sin dependencias nuevas.
+#
+# Con varios workers de Gunicorn, cada proceso tiene sus propias métricas.
+# Si se define METRICS_MULTIPROC_DIR, cada proceso vuelca periódicamente su
+# estado a ese directorio y /metrics agrega el de todos los workers.
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+# Límites superiores (segundos) de los buckets de latencia.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    "http_requests_total": ("counter", "Peticiones HTTP atendidas."),
+    "http_request_duration_seconds": ("histogram", "Latencia de las peticiones HTTP por ruta."),
+    "http_requests_in_flight": ("gauge", "Peticiones HTTP en curso."),
+    "outbound_requests_total": ("counter", "Llamadas HTTP salientes por resultado."),
+    "outbound_request_duration_seconds": ("histogram", "Latencia de las llamadas HTTP salientes."),
+    "request_profiles_total": ("counter", "Peticiones perfiladas con cProfile."),
+}
+
+
+class Registry:
+    """
+    Almacén de métricas del proceso. Las series se identifican por
+    (nombre, etiquetas ordenadas); los histogramas guardan conteos por bucket
+    (no acumulados), suma y total.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, labels, value=1.0):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def add_gauge(self, name, labels, value):
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0.0) + value
+
+    def observe(self, name, labels, value):
+        key = self._key(name, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[k[0], list(k[1]), v] for k, v in self.counters.items()],
+                "gauges": [[k[0], list(k[1]), v] for k, v in self.gauges.items()],
+                "histograms": [[k[0], list(k[1]), list(s[0]), s[1], s[2]]
+                               for k, s in self.histograms.items()],
+            }
+
+
+def _merge(snapshots, buckets):
+    """Suma las series de varios procesos."""
+    counters, gauges, histograms = {}, {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, value in snap["gauges"]:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0.0) + value
+        for name, labels, counts, total, count in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            series = histograms.setdefault(key, [[0] * (len(buckets) + 1), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+    return counters, gauges, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(counters, gauges, histograms, buckets):
+    """Formato de exposición de texto de Prometheus (versión 0.0.4)."""
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), (counts, total, count) in histograms.items():
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    output = []
+    for name in sorted(by_name):
+        kind, help_text = _HELP.get(name, ("untyped", name))
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(sorted(by_name[name]))
+    return '\n'.join(output) + '\n'
+
+
+class _MultiprocessStore:
+    """Volcado periódico de cada worker a METRICS_MULTIPROC_DIR."""
+
+    def __init__(self, directory, registry, interval):
+        self.directory = directory
+        self.registry = registry
+        self.interval = interval
+        self.pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def ensure_flusher(self):
+        # El hilo se arranca en el primer uso de cada proceso (tras el fork).
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            threading.Thread(target=self._loop, name='metrics-flush', daemon=True).start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """Estado de todos los workers; los gauges de procesos muertos se descartan."""
+        self.flush()
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _pid_alive(int(name[:-5])):
+                snap["gauges"] = []
+            snapshots.append(snap)
+        return snapshots
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# --- Registro del proceso ---
+
+registry = Registry()
+_multiprocess = None
+_service_name = None
+
+if os.getenv('METRICS_MULTIPROC_DIR'):
+    _multiprocess = _MultiprocessStore(os.environ['METRICS_MULTIPROC_DIR'], registry,
+                                       float(os.getenv('METRICS_FLUSH_INTERVAL', 5)))
+
+
+def metrics_text():
+    snapshots = _multiprocess.collect() if _multiprocess else [registry.snapshot()]
+    return render(*_merge(snapshots, registry.buckets), registry.buckets)
+
+
+def observe_outbound(target, operation, seconds, outcome):
+    """
+    Registra una llamada saliente. outcome es el status HTTP o el nombre de
+    la excepción de red.
+    """
+    labels = {"service": _service_name or "unknown", "target": target, "operation": operation}
+    registry.observe("outbound_request_duration_seconds", labels, seconds)
+    registry.inc("outbound_requests_total", dict(labels, outcome=str(outcome)))
+
+
+@contextmanager
+def timed_outbound(target, operation):
+    """
+    Mide una llamada saliente. El bloque puede asignar el status de la
+    respuesta en el dict que recibe: `with timed_outbound(...) as call:
+    call['status'] = response.status_code`.
+    """
+    call = {"status": None}
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        observe_outbound(target, operation, time.perf_counter() - started, type(e).__name__)
+        raise
+    observe_outbound(target, operation, time.perf_counter() - started, call["status"])
+
+
+# --- Perfilado opcional ---
+
+class _Profiler:
+    """
+    Modos (PROFILE_REQUESTS): 'off'; 'param' perfila las peticiones con
+    ?profile=1; 'sample' perfila además una fracción PROFILE_SAMPLE_RATE de
+    las peticiones. PROFILE_ROUTES limita el perfilado a ciertas reglas de ruta
+    (separadas por comas). Cada perfil se guarda como .prof en PROFILE_DIR.
+    """
+
+    def __init__(self):
+        self.mode = os.getenv('PROFILE_REQUESTS', 'off').lower()
+        self.sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', 0.01))
+        self.directory = os.getenv('PROFILE_DIR', os.path.join(os.getcwd(), 'profiles'))
+        routes = os.getenv('PROFILE_ROUTES', '')
+        self.routes = {r.strip() for r in routes.split(',') if r.strip()}
+
+    def wants(self, route):
+        if self.mode == 'off' or (self.routes and route not in self.routes):
+            return False
+        if request.args.get('profile') in ('1', 'true'):
+            return True
+        return self.mode == 'sample' and random.random() < self.sample_rate
+
+    def dump(self, profile, service, route):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        filename = f"{service}-{slug}-{int(time.time() * 1000)}-{os.getpid()}.prof"
+        path = os.path.join(self.directory, filename)
+        profile.dump_stats(path)
+        return path
+
+
+# --- Integración con Flask ---
+
+def _route_of():
+    # Se usa la regla (/quotes/<quote_id>) y no la URL, para acotar las series.
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def instrument_app(app, service):
+    """
+    Registra en `app` las métricas por petición, el endpoint /metrics y el
+    modo de perfilado. `service` se usa como etiqueta de todas las series.
+    """
+    global _service_name
+    _service_name = _service_name or service
+    profiler = _Profiler()
+    in_flight = {"service": service}
+
+    @app.before_request
+    def _start_request():
+        if _multiprocess:
+            _multiprocess.ensure_flusher()
+        g._metrics_started = time.perf_counter()
+        registry.add_gauge("http_requests_in_flight", in_flight, 1)
+        route = _route_of()
+        if profiler.wants(route):
+            g._profile = cProfile.Profile()
+            g._profile.enable()
+
+    @app.after_request
+    def _record_request(response):
+        profile = g.pop('_profile', None)
+        route = _route_of()
+        if profile is not None:
+            profile.disable()
+            path = profiler.dump(profile, service, route)
+            registry.inc("request_profiles_total", {"service": service, "route": route})
+            response.headers['X-Profile-File'] = os.path.basename(path)
+        started = g.get('_metrics_started')
+        if started is not None:
+            labels = {"service": service, "method": request.method, "route": route}
+            registry.observe("http_request_duration_seconds", labels, time.perf_counter() - started)
+            registry.inc("http_requests_total", dict(labels, status=str(response.status_code)))
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        # teardown se ejecuta siempre, incluso si la vista lanzó una excepción.
+        if g.pop('_metrics_started', None) is not None:
+            registry.add_gauge("http_requests_in_flight", in_flight, -1)
+
+    def metrics():
+        return Response(metrics_text(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return app
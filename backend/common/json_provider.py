@@ -0,0 +1,124 @@
+# --- Serialización JSON Rápida para las Apps Flask ---
+# Proveedor JSON (Flask >= 2.2) que codifica con orjson cuando está
+# instalado y recurre al módulo json de la biblioteca estándar si no lo está
+# o si orjson no puede con un valor concreto (p. ej. enteros de más de 64
+# bits). La salida conserva el formato de Flask: claves ordenadas, compacta
+# fuera de debug y con sangría en debug.
+#
+# Además, install_json_provider registra una compresión gzip opcional para
+# las respuestas JSON mayores que JSON_GZIP_MIN_BYTES cuando el cliente la
+# acepta.
+import gzip
+import os
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from common.records import Record
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: se usa el codificador estándar.
+    orjson = None
+
+# Tamaño mínimo (bytes) de una respuesta JSON para comprimirla; 0 la desactiva.
+DEFAULT_GZIP_MIN_BYTES = 16 * 1024
+# Nivel de gzip: la ganancia de tamaño más allá de 5 no compensa la CPU.
+DEFAULT_GZIP_LEVEL = 5
+
+_JSON_MIMETYPES = ('application/json', 'application/problem+json')
+
+
+def _default(value):
+    """Tipos que ni orjson ni json conocen: registros y los que admite Flask."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, 'tolist'):  # escalares y arreglos de NumPy
+        return value.tolist()
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider con orjson como codificador y decodificador."""
+
+    default = staticmethod(_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.encoder = 'orjson' if orjson is not None else 'json'
+        self.fallbacks = 0
+
+    def _orjson_options(self, **kwargs):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if kwargs.get('sort_keys', self.sort_keys):
+            options |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, **kwargs):
+        """Serializa a bytes UTF-8 (lo que necesita una respuesta HTTP)."""
+        if orjson is not None and set(kwargs) <= {'sort_keys', 'indent'}:
+            try:
+                return orjson.dumps(obj, default=_default, option=self._orjson_options(**kwargs))
+            except TypeError:
+                # orjson.JSONEncodeError hereda de TypeError.
+                self.fallbacks += 1
+        kwargs.setdefault('default', _default)
+        return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # Que el error (o lo que json acepte, como NaN) lo decida json.
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self._app.debug if self.compact is None else not self.compact
+        body = self.dumps_bytes(obj, indent=2 if indent else None)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def _gzip_response(min_bytes, level):
+    def compress(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or response.mimetype not in _JSON_MIMETYPES
+                or 'Content-Encoding' in response.headers
+                or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+            return response
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        # El cuerpo comprimido no es idéntico byte a byte: ETag débil.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+    return compress
+
+
+def install_json_provider(app):
+    """
+    Instala FastJSONProvider en la app y, si JSON_GZIP_MIN_BYTES > 0, la
+    compresión gzip de respuestas JSON grandes (nivel JSON_GZIP_LEVEL).
+    """
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    min_bytes = int(os.getenv('JSON_GZIP_MIN_BYTES', DEFAULT_GZIP_MIN_BYTES))
+    if min_bytes > 0:
+        level = int(os.getenv('JSON_GZIP_LEVEL', DEFAULT_GZIP_LEVEL))
+        app.after_request(_gzip_response(min_bytes, level))
+    return app.json
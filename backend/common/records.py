@@ -0,0 +1,152 @@
+# --- Registros Compactos Compartidos ---
+# Base de los tipos de registro de los servicios (leads, cotizaciones,
+# proyectos, personal...). Cada registro guarda sus campos conocidos en
+# __slots__ en lugar de un dict por instancia, y los estados como miembros
+# de un enum (un único objeto por valor en todo el proceso).
+#
+# El formato JSON no cambia: from_dict/to_dict convierten desde y hacia el
+# mismo diccionario, los campos ausentes siguen ausentes y las claves
+# desconocidas se conservan en `extra`. Los registros admiten además el
+# acceso tipo diccionario (record['status'], record.get('score', 0)), de
+# modo que el código que ya trabajaba con dicts los acepta sin cambios.
+import sys
+from enum import Enum
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+# Marca de campo ausente (distinta de None, que es un valor JSON válido).
+MISSING = _Missing()
+
+
+class StatusEnum(str, Enum):
+    """
+    Estado serializable: es un str (json.dumps, sqlite3 y las comparaciones
+    con literales funcionan igual) y comparte hash con su literal, así que
+    'WON' in {QuoteStatus.WON} y las claves de dict se comportan igual.
+    """
+    __str__ = str.__str__
+    __format__ = str.__format__
+    __hash__ = str.__hash__
+
+    @classmethod
+    def coerce(cls, value):
+        """Miembro del enum; los valores desconocidos se internan tal cual."""
+        if isinstance(value, cls) or not isinstance(value, str):
+            return value
+        member = cls._value2member_map_.get(value)
+        return member if member is not None else sys.intern(value)
+
+
+def clone(value):
+    """Copia profunda de una estructura JSON (dicts, listas y escalares)."""
+    if isinstance(value, dict):
+        return {k: clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [clone(v) for v in value]
+    return value
+
+
+class Record:
+    """
+    Registro con __slots__. Las subclases declaran `__slots__ = FIELDS =
+    (...)` (en el orden del formato JSON) y, opcionalmente, COERCE: campo ->
+    función aplicada al asignarlo (p. ej. StatusEnum.coerce).
+    """
+    __slots__ = ('extra',)
+    FIELDS = ()
+    COERCE = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+
+    def __init__(self, **values):
+        coerce = self.COERCE
+        for name in self.FIELDS:
+            value = values.pop(name, MISSING)
+            if value is not MISSING and name in coerce:
+                value = coerce[name](value)
+            setattr(self, name, value)
+        self.extra = values or None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self, deep=False):
+        """Diccionario con el formato original; deep=True copia lo anidado."""
+        out = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not MISSING:
+                out[name] = clone(value) if deep else value
+        if self.extra:
+            out.update(clone(self.extra) if deep else self.extra)
+        return out
+
+    def copy(self):
+        """Copia independiente (los valores anidados se copian)."""
+        return type(self).from_dict(self.to_dict(deep=True))
+
+    def replace(self, **changes):
+        """Copia superficial con algunos campos cambiados."""
+        return type(self).from_dict(dict(self.to_dict(), **changes))
+
+    # --- Acceso tipo diccionario ---
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            coerce = self.COERCE.get(key)
+            setattr(self, key, coerce(value) if coerce else value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            value = getattr(self, key)
+            return default if value is MISSING else value
+        return self.extra.get(key, default) if self.extra else default
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def as_dict(record):
+    """Diccionario nuevo a partir de un registro o de un dict."""
+    return record.to_dict() if isinstance(record, Record) else dict(record)
@@ -0,0 +1,118 @@
+# --- Arranque de los Servicios: Fases y Precarga ---
+# Mide cuánto tarda cada fase del arranque de un servicio (imports, carga de
+# datos, construcción de la app...), lo imprime al terminar y lo expone en
+# GET /startup junto con el tiempo hasta la primera petición del proceso.
+#
+# Con Gunicorn --preload el arranque completo se hace una sola vez en el
+# proceso maestro y los workers lo heredan al hacer fork (copy-on-write):
+# un worker nuevo o reiniciado no vuelve a importar ni a cargar nada. Para
+# ese modo, APP_PRELOAD=1 hace que cada servicio importe en el maestro los
+# módulos que normalmente difiere (ver preload_modules) y precalcule sus
+# estructuras de solo lectura. Todo lo que no se puede compartir tras un
+# fork (hilos, conexiones SQLite, sesiones HTTP) ya se recrea por proceso.
+#
+# No importa Flask a nivel de módulo: se carga antes que el resto para que
+# la fase de imports de cada servicio incluya también la de Flask.
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+def preload_enabled():
+    """True si el servicio arranca en modo precarga (APP_PRELOAD=1)."""
+    return os.getenv('APP_PRELOAD', '0').lower() in ('1', 'true', 'yes')
+
+
+class StartupProfile:
+    """
+    Fases del arranque de un servicio, en orden, con su duración. El perfil
+    se crea en el proceso que construye la app; en un worker que lo heredó
+    por fork, report() lo indica con "preloaded": true.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.pid = os.getpid()
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.phases = []
+        self.ready_ms = None
+        self._first_request = {}  # pid -> ms desde el inicio del perfil
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - started) * 1000))
+
+    def ready(self):
+        """Marca el fin del arranque e imprime el desglose (una línea)."""
+        self.ready_ms = (time.perf_counter() - self.started) * 1000
+        breakdown = ', '.join(f"{name}={ms:.1f}ms" for name, ms in self.phases)
+        print(f"[startup] {self.service}: {self.ready_ms:.1f}ms ({breakdown})"
+              f"{' preload' if preload_enabled() else ''}", file=sys.stderr, flush=True)
+
+    def first_request(self):
+        """Registra la primera petición atendida por este proceso."""
+        pid = os.getpid()
+        if pid not in self._first_request:
+            self._first_request[pid] = (time.perf_counter() - self.started) * 1000
+
+    def report(self):
+        pid = os.getpid()
+        return {
+            "service": self.service,
+            "pid": pid,
+            "preload": preload_enabled(),
+            "preloaded": pid != self.pid,
+            "started_at": self.started_at,
+            "phases": [{"name": name, "ms": round(ms, 3)} for name, ms in self.phases],
+            "ready_ms": round(self.ready_ms, 3) if self.ready_ms is not None else None,
+            "first_request_ms": round(self._first_request[pid], 3) if pid in self._first_request else None,
+        }
+
+
+def preload_modules(names, profile=None):
+    """
+    Importa módulos que el servicio solo carga al primer uso. Se invoca en
+    modo precarga para que los workers los hereden ya importados.
+    """
+    def load():
+        for name in names:
+            importlib.import_module(name)
+
+    if profile is None:
+        load()
+    else:
+        with profile.phase('preload_modules'):
+            load()
+
+
+def enable_cors(app):
+    """
+    CORS para el frontend servido desde otro origen (CORS_ENABLED=0 lo
+    desactiva, p. ej. detrás de nginx en el mismo origen). flask_cors solo
+    se importa si se usa.
+    """
+    if os.getenv('CORS_ENABLED', '1').lower() in ('0', 'false', 'no'):
+        return app
+    from flask_cors import CORS
+    CORS(app)
+    return app
+
+
+def install_startup_report(app, profile):
+    """Endpoint GET /startup con el desglose del arranque; cierra el perfil."""
+    from flask import jsonify
+
+    @app.before_request
+    def _record_first_request():
+        profile.first_request()
+
+    app.add_url_rule('/startup', 'startup_report', lambda: jsonify(profile.report()))
+    profile.ready()
+    return app
@@ -1,15 +1,48 @@
-import json
-from flask import Flask, jsonify
-from flask_cors import CORS
+import os
+
+from common.startup import (StartupProfile, enable_cors, install_startup_report,
+                            preload_enabled, preload_modules)
+
+# Desglose del arranque por fases (GET /startup).
+startup = StartupProfile('finance')
+
+with startup.phase('imports'):
+    import json
+    import math
+    from flask import Flask, Response, jsonify, request
+
+    from file_cache import BytesLRUCache, JsonFileCache
+    from common.instrumentation import instrument_app
+    from common.json_provider import install_json_provider
 
 # ==============================================================================
 #  Inicialización de la Aplicación Flask
 # ==============================================================================
 
-app = Flask(__name__)
+with startup.phase('app'):
+    app = Flask(__name__)
+
+    # Serialización JSON con orjson (si está instalado) y gzip de respuestas grandes
+    install_json_provider(app)
+
+    # Configuración de CORS para permitir solicitudes del frontend (CORS_ENABLED=0 lo desactiva)
+    enable_cors(app)
+
+    # Métricas por ruta en /metrics y perfilado opcional (ver common/instrumentation.py)
+    instrument_app(app, 'finance')
+
+# Ruta del archivo de datos relativa a este módulo (no al directorio de trabajo).
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.getenv('FINANCE_DATA_PATH', os.path.join(BASE_DIR, 'data.json'))
 
-# Configuración de CORS para permitir solicitudes del frontend
-CORS(app)
+# El resumen financiero se sirve ya serializado; solo se relee el archivo
+# cuando cambia su mtime o tamaño.
+summary_cache = JsonFileCache(DATA_PATH, lambda data: app.json.response(data).get_data())
+
+# Mallas de escenarios ya serializadas, memoizadas por parámetros para que
+# mover los sliders del frontend sobre valores ya vistos no recalcule nada.
+# Se acota por bytes: una malla con monthly=1 puede pesar decenas de MB.
+grid_cache = BytesLRUCache(int(os.getenv('SCENARIO_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
 
 
 # ==============================================================================
@@ -20,43 +53,125 @@ CORS(app)
 def get_financial_summary():
     """
     Endpoint para obtener un resumen de los KPIs financieros clave.
-    Lee los datos desde el archivo estático data.json.
+    Lee los datos desde el archivo estático data.json (en caché) y responde
+    304 si el cliente envía un If-None-Match con el ETag vigente.
     """
     try:
-        with open('data.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return jsonify(data)
+        _, body, etag = summary_cache.get()
     except FileNotFoundError:
         return jsonify({"error": "El archivo de datos (data.json) no fue encontrado."}), 404
     except json.JSONDecodeError:
         return jsonify({"error": "Error al decodificar el archivo JSON. Verifique su formato."}), 500
 
+    if request.if_none_match.contains_weak(etag):
+        summary_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Contadores de aciertos/fallos de la caché del resumen financiero y, en
+    "scenario_grids", de la caché de mallas de escenarios.
+    """
+    return jsonify({**summary_cache.stats(), "scenario_grids": grid_cache.stats()})
+
 @app.route('/api/debt_reduction_scenarios', methods=['GET'])
 def get_debt_reduction_scenarios():
     """
-    Endpoint que devuelve un array de escenarios hipotéticos para la reducción de deuda.
+    Endpoint que devuelve escenarios de reducción de deuda calculados con el
+    motor de amortización (debt_engine.py) a partir de total_debt.
+
+    Sin parámetros de malla devuelve los escenarios clásicos. Con
+    prepay_pcts/rates (listas "0.1,0.2") o prepay_min/prepay_max/prepay_steps
+    y rate_min/rate_max/rate_steps devuelve la malla completa. Admite además
+    rate, fcf, term_years, horizon_years y monthly=1.
     """
-    scenarios = [
-        {
-            "scenario_name": "Pago Agresivo",
-            "description": "Utiliza el 20% del flujo de caja libre excedente para pagos anticipados.",
-            "projections": {
-                "1_year": {"debt_reduced_mxn": 1200000, "remaining_debt_mxn": 6950000.75},
-                "3_years": {"debt_reduced_mxn": 3600000, "remaining_debt_mxn": 4550000.75},
-                "5_years": {"debt_reduced_mxn": 6000000, "remaining_debt_mxn": 2150000.75}
-            }
-        },
-        {
-            "scenario_name": "Pago Moderado",
-            "description": "Utiliza el 10% del flujo de caja libre excedente para pagos anticipados.",
-            "projections": {
-                "1_year": {"debt_reduced_mxn": 600000, "remaining_debt_mxn": 7550000.75},
-                "3_years": {"debt_reduced_mxn": 1800000, "remaining_debt_mxn": 6350000.75},
-                "5_years": {"debt_reduced_mxn": 3000000, "remaining_debt_mxn": 5150000.75}
-            }
-        }
-    ]
-    return jsonify(scenarios)
+    # El motor (y NumPy) se importan al primer uso: el resumen financiero,
+    # que es lo que consulta el frontend, no los necesita.
+    import debt_engine
+
+    try:
+        data, _, _ = summary_cache.get()
+        total_debt = float(data['total_debt'])
+    except FileNotFoundError:
+        return jsonify({"error": "El archivo de datos (data.json) no fue encontrado."}), 404
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return jsonify({"error": "data.json no contiene un total_debt válido."}), 500
+
+    args = request.args
+    try:
+        annual_rate = float(args.get('rate', debt_engine.DEFAULT_ANNUAL_RATE))
+        annual_fcf = float(args.get('fcf', debt_engine.DEFAULT_ANNUAL_FCF))
+        term_years = int(args.get('term_years', debt_engine.DEFAULT_TERM_YEARS))
+        horizon_years = int(args.get('horizon_years', debt_engine.DEFAULT_HORIZON_YEARS))
+        rates = debt_engine.parse_grid(args.get('rates'), args.get('rate_min'),
+                                       args.get('rate_max'), args.get('rate_steps'))
+        prepays = debt_engine.parse_grid(args.get('prepay_pcts'), args.get('prepay_min'),
+                                         args.get('prepay_max'), args.get('prepay_steps'))
+    except ValueError as e:
+        return jsonify({"error": f"Parámetro inválido: {e}"}), 400
+
+    inputs = (annual_rate, annual_fcf) + (rates or ()) + (prepays or ())
+    if not all(math.isfinite(v) and v >= 0 for v in inputs):
+        return jsonify({"error": "rate, fcf, rates y prepay_pcts deben ser números "
+                                 "finitos y no negativos."}), 400
+
+    if term_years < 1 or not 1 <= horizon_years <= debt_engine.MAX_HORIZON_YEARS:
+        return jsonify({"error": "term_years debe ser >= 1 y horizon_years entre 1 y "
+                                 f"{debt_engine.MAX_HORIZON_YEARS}."}), 400
+
+    if rates is None and prepays is None:
+        return jsonify(debt_engine.named_scenarios(total_debt, annual_rate, annual_fcf,
+                                                   term_years, horizon_years))
+
+    rates = rates or (annual_rate,)
+    prepays = prepays or tuple(pct for _, pct, _ in debt_engine.NAMED_SCENARIOS)
+    points = len(rates) * len(prepays)
+    if points > debt_engine.MAX_GRID_POINTS:
+        return jsonify({"error": f"La malla excede {debt_engine.MAX_GRID_POINTS} puntos."}), 400
+    if points * horizon_years * 12 > debt_engine.MAX_GRID_MONTHS:
+        return jsonify({"error": f"Puntos x meses de la malla excede {debt_engine.MAX_GRID_MONTHS}; "
+                                 "reduzca la malla o horizon_years."}), 400
+
+    key = (total_debt, rates, prepays, annual_fcf, term_years, horizon_years,
+           args.get('monthly') in ('1', 'true'))
+    body = grid_cache.get_or_compute(key, lambda: _scenario_grid_body(*key))
+    return Response(body, mimetype='application/json')
+
+def _scenario_grid_body(total_debt, rates, prepays, annual_fcf, term_years, horizon_years,
+                        include_monthly):
+    """Respuesta ya serializada de una malla (se memoiza en grid_cache)."""
+    import debt_engine
+    scenarios = debt_engine.project_scenarios(
+        total_debt, rates, prepays, annual_fcf, term_years, horizon_years, include_monthly)
+    return app.json.response({
+        "total_debt_mxn": total_debt, "annual_fcf_mxn": annual_fcf,
+        "term_years": term_years, "horizon_years": horizon_years,
+        "rates": list(rates), "prepay_pcts": list(prepays),
+        "scenarios": scenarios,
+    }).get_data()
+
+
+# ==============================================================================
+#  Arranque
+# ==============================================================================
+
+if preload_enabled():
+    # Modo precarga: el maestro de Gunicorn importa el motor de escenarios y
+    # lee el resumen una vez; los workers lo heredan.
+    preload_modules(['debt_engine'], startup)
+    with startup.phase('summary_cache'):
+        try:
+            summary_cache.get()
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass  # Los endpoints responden el error en cada petición.
+
+install_startup_report(app, startup)
 
 
 # ==============================================================================
@@ -0,0 +1,148 @@
+import numpy as np
+
+# Supuestos por defecto del modelo de amortización (sobrescribibles por query).
+DEFAULT_ANNUAL_RATE = 0.12
+DEFAULT_ANNUAL_FCF = 6000000.0
+DEFAULT_TERM_YEARS = 10
+DEFAULT_HORIZON_YEARS = 5
+MAX_GRID_POINTS = 10000
+# Tope de escenarios x meses simulados: acota las matrices del motor (dos de
+# float64) y la respuesta con monthly=1 (10000 escenarios a 5 años).
+MAX_GRID_MONTHS = 1200000
+MAX_HORIZON_YEARS = 30
+
+# Escenarios que se devuelven cuando no se pide una malla explícita.
+NAMED_SCENARIOS = (
+    ("Pago Agresivo", 0.20,
+     "Utiliza el 20% del flujo de caja libre excedente para pagos anticipados."),
+    ("Pago Moderado", 0.10,
+     "Utiliza el 10% del flujo de caja libre excedente para pagos anticipados."),
+)
+
+
+def _horizon_key(years):
+    return "1_year" if years == 1 else f"{years}_years"
+
+
+def _report_years(horizon_years):
+    """Cortes anuales reportados: 1, 3, 5, ... hasta el horizonte."""
+    years = [y for y in (1, 3, 5, 10, 15, 20, 25, 30) if y <= horizon_years]
+    if horizon_years not in years:
+        years.append(horizon_years)
+    return years
+
+
+def amortize(total_debt, annual_rates, prepay_pcts, annual_fcf, term_years, months):
+    """
+    Simula mes a mes todos los escenarios a la vez.
+
+    Cada escenario paga la cuota fija de un crédito a `term_years` más un
+    prepago mensual de prepay_pct * annual_fcf / 12, sin pagar nunca más que
+    el saldo pendiente. annual_rates y prepay_pcts son arreglos de la misma
+    forma (una entrada por escenario).
+
+    Devuelve (saldos, intereses acumulados), ambos de forma (months + 1, n).
+    """
+    monthly_rate = np.asarray(annual_rates, dtype=np.float64) / 12.0
+    prepayment = np.asarray(prepay_pcts, dtype=np.float64) * annual_fcf / 12.0
+    n_payments = term_years * 12
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        installment = np.where(
+            monthly_rate > 0,
+            total_debt * monthly_rate / (1.0 - (1.0 + monthly_rate) ** -n_payments),
+            total_debt / n_payments,
+        )
+
+    balances = np.empty((months + 1, monthly_rate.size), dtype=np.float64)
+    interest_paid = np.empty_like(balances)
+    balances[0] = total_debt
+    interest_paid[0] = 0.0
+
+    balance = np.full(monthly_rate.size, float(total_debt))
+    cumulative_interest = np.zeros(monthly_rate.size)
+    for month in range(1, months + 1):
+        interest = balance * monthly_rate
+        principal = np.minimum(balance, np.maximum(installment - interest, 0.0) + prepayment)
+        balance = balance - principal
+        cumulative_interest += interest
+        balances[month] = balance
+        interest_paid[month] = cumulative_interest
+    return balances, interest_paid
+
+
+def project_scenarios(total_debt, annual_rates, prepay_pcts, annual_fcf=DEFAULT_ANNUAL_FCF,
+                      term_years=DEFAULT_TERM_YEARS, horizon_years=DEFAULT_HORIZON_YEARS,
+                      include_monthly=False):
+    """
+    Proyecta la malla prepay_pcts x annual_rates (tuplas) y devuelve una
+    lista de escenarios lista para serializar. No se memoiza aquí: la app
+    guarda la respuesta ya serializada (ver grid_cache en app.py).
+    """
+    rate_grid, prepay_grid = np.meshgrid(np.array(annual_rates), np.array(prepay_pcts))
+    rate_grid, prepay_grid = rate_grid.ravel(), prepay_grid.ravel()
+    months = horizon_years * 12
+    balances, interest_paid = amortize(total_debt, rate_grid, prepay_grid,
+                                       annual_fcf, term_years, months)
+
+    report_years = _report_years(horizon_years)
+    remaining = {y: np.round(balances[y * 12], 2).tolist() for y in report_years}
+    reduced = {y: np.round(total_debt - balances[y * 12], 2).tolist() for y in report_years}
+    interest = {y: np.round(interest_paid[y * 12], 2).tolist() for y in report_years}
+
+    paid_off = balances <= 0.005
+    payoff_month = np.where(paid_off.any(axis=0), paid_off.argmax(axis=0), -1).tolist()
+    if include_monthly:
+        monthly = np.round(balances[1:], 2).T.tolist()
+
+    rates, prepays = rate_grid.tolist(), prepay_grid.tolist()
+    scenarios = []
+    for i in range(len(rates)):
+        scenario = {
+            "annual_rate": rates[i],
+            "prepayment_pct": prepays[i],
+            "payoff_month": payoff_month[i] if payoff_month[i] >= 0 else None,
+            "projections": {
+                _horizon_key(y): {
+                    "debt_reduced_mxn": reduced[y][i],
+                    "remaining_debt_mxn": remaining[y][i],
+                    "interest_paid_mxn": interest[y][i],
+                }
+                for y in report_years
+            },
+        }
+        if include_monthly:
+            scenario["monthly_remaining_debt_mxn"] = monthly[i]
+        scenarios.append(scenario)
+    return scenarios
+
+
+def named_scenarios(total_debt, annual_rate=DEFAULT_ANNUAL_RATE, annual_fcf=DEFAULT_ANNUAL_FCF,
+                    term_years=DEFAULT_TERM_YEARS, horizon_years=DEFAULT_HORIZON_YEARS):
+    """Los escenarios clásicos (agresivo / moderado) calculados con el motor."""
+    prepays = tuple(pct for _, pct, _ in NAMED_SCENARIOS)
+    projected = project_scenarios(total_debt, (annual_rate,), prepays, annual_fcf,
+                                  term_years, horizon_years)
+    return [
+        {"scenario_name": name, "description": description, **scenario}
+        for (name, _, description), scenario in zip(NAMED_SCENARIOS, projected)
+    ]
+
+
+def parse_grid(values=None, start=None, stop=None, steps=None):
+    """
+    Construye un eje de la malla a partir de una lista explícita
+    ("0.1,0.2") o de un rango (start, stop, steps). Devuelve una tupla.
+    """
+    if values:
+        axis = tuple(float(v) for v in values.split(',') if v.strip())
+    elif start is not None and stop is not None:
+        count = int(steps) if steps is not None else 11
+        if not 1 <= count <= MAX_GRID_POINTS:
+            raise ValueError(f"los pasos de la malla deben estar entre 1 y {MAX_GRID_POINTS}")
+        axis = tuple(np.round(np.linspace(float(start), float(stop), count), 10).tolist())
+    else:
+        return None
+    if not axis:
+        raise ValueError("eje de la malla vacío")
+    return axis
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class JsonFileCache:
+    """
+    Caché de un archivo JSON ya serializado como respuesta HTTP.
+
+    En cada acceso solo se hace un stat() del archivo; se vuelve a leer y a
+    serializar únicamente cuando cambian su mtime o su tamaño. Guarda también
+    el ETag del cuerpo para responder 304 a los clientes que ya lo tienen.
+    """
+
+    def __init__(self, path, serializer):
+        self.path = path
+        self.serializer = serializer
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._stat = None
+        self._data = None
+        self._body = None
+        self._etag = None
+
+    def _current_stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self):
+        """
+        Devuelve (data, body, etag). Lanza FileNotFoundError o
+        json.JSONDecodeError si el archivo falta o es inválido.
+        """
+        stat = self._current_stat()
+        with self._lock:
+            if stat == self._stat:
+                self.hits += 1
+                return self._data, self._body, self._etag
+
+            self.misses += 1
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            body = self.serializer(data)
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+
+            self._stat = stat
+            self._data = data
+            self._body = body
+            self._etag = hashlib.sha1(body).hexdigest()[:20]
+            return data, body, self._etag
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "cached_bytes": len(self._body) if self._body else 0,
+                "etag": self._etag,
+            }
+
+
+class BytesLRUCache:
+    """
+    Caché LRU de respuestas ya serializadas, acotada por el total de bytes
+    (no por número de entradas: una malla grande puede pesar cientos de MB).
+    Un cuerpo mayor que max_bytes se devuelve sin guardarlo.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+
+        body = compute()  # Fuera del lock: no bloquea a las demás peticiones.
+        if len(body) > self.max_bytes:
+            return body
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = body
+                self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "cached_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -1,47 +1,298 @@
-import json
-from flask import Flask, jsonify
-from flask_cors import CORS
-from logic.operations_logic import (
-    schedule_projects,
-    allocate_resources,
-    get_operations_status
-)
-
-app = Flask(__name__)
-CORS(app)  # Habilitar CORS
-
-# Cargar los datos una vez al iniciar la aplicación
+import os
+
+from common.startup import StartupProfile, enable_cors, install_startup_report, preload_enabled
+
+# Desglose del arranque por fases (GET /startup). Con Gunicorn --preload y
+# APP_PRELOAD=1 todo esto ocurre una vez en el maestro y los workers lo
+# heredan: los datos ya cargados y los índices derivados ya construidos.
+startup = StartupProfile('operations')
+
+with startup.phase('imports'):
+    from flask import Flask, jsonify, request
+
+    from common.instrumentation import instrument_app
+    from common.json_provider import install_json_provider
+    from logic.allocation import allocate_resources_optimized
+    from logic.capacity import CapacityEngine
+    from logic.data_layer import DataLayer
+    from logic.ranking import WEIGHT_KEYS, ProjectFeatures, expand_grid, resolve_weights
+    from logic.scheduler import DEFAULT_WEIGHTS, ProjectScheduler
+    from logic.status_snapshot import StatusHistory, StatusTracker
+
+with startup.phase('app'):
+    app = Flask(__name__)
+    enable_cors(app)  # Habilitar CORS (CORS_ENABLED=0 lo desactiva)
+    install_json_provider(app)  # orjson (si está instalado) y gzip de respuestas grandes
+    instrument_app(app, 'operations')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.getenv('OPERATIONS_DATA_PATH', os.path.join(BASE_DIR, 'data', 'data.json'))
+
+# Cargar los datos al iniciar la aplicación. La capa de datos compila el JSON
+# a columnas mapeadas en memoria (compartidas entre workers) y recarga el
+# archivo en segundo plano cuando cambia.
 def load_data():
     try:
-        with open('data/data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return DataLayer(
+            DATA_PATH,
+            snapshot_dir=os.getenv('OPERATIONS_SNAPSHOT_DIR'),
+            check_interval=float(os.getenv('OPERATIONS_DATA_CHECK_INTERVAL', 2.0)),
+            prune_grace=float(os.getenv('OPERATIONS_SNAPSHOT_PRUNE_GRACE', 300)),
+        )
     except FileNotFoundError:
         # En caso de no encontrar el archivo, se detiene la aplicación
         # ya que es una dependencia crítica para este servicio.
         raise RuntimeError("El archivo data/data.json es esencial y no fue encontrado.")
 
-db = load_data()
+with startup.phase('data_layer'):
+    data_layer = load_data()
+
+# Resumen de estado materializado: se actualiza con las diferencias de cada
+# versión de los datos y guarda un histórico por intervalos (por defecto 24 h
+# en cubetas de 60 s) para servir tendencias sin recalcular.
+status_tracker = StatusTracker(StatusHistory(
+    bucket_seconds=int(os.getenv('STATUS_HISTORY_BUCKET_SECONDS', 60)),
+    buckets=int(os.getenv('STATUS_HISTORY_BUCKETS', 1440)),
+))
+
+def current_status():
+    """Tracker sincronizado con el snapshot vigente (solo aplica los cambios)."""
+    status_tracker.sync(data_layer.current())
+    return status_tracker
+
+# Presupuesto de tiempo del motor de asignación antes de recurrir al greedy.
+ALLOCATION_TIME_BUDGET_MS = int(os.getenv('ALLOCATION_TIME_BUDGET_MS', 500))
+
+# Índice incremental de proyectos pendientes (ver logic/scheduler.py): vive
+# lo que el proceso y a cada nueva versión de los datos solo aplica las
+# diferencias. schedule_projects se conserva como referencia.
+project_scheduler = ProjectScheduler(weights=DEFAULT_WEIGHTS)
+
+def current_scheduler():
+    """Scheduler sincronizado con el snapshot vigente (solo aplica los cambios)."""
+    project_scheduler.sync(data_layer.current())
+    return project_scheduler
+
+# Días que sigue ocupado el personal/equipo que hoy no está libre, tamaño de
+# la caché de resultados y máximo de candidatos por lote.
+CAPACITY_BUSY_DAYS = int(os.getenv('CAPACITY_BUSY_DAYS', 30))
+CAPACITY_CACHE_SIZE = int(os.getenv('CAPACITY_CACHE_SIZE', 4096))
+CAPACITY_BATCH_MAX = int(os.getenv('CAPACITY_BATCH_MAX', 1000))
+
+def get_capacity_engine(snapshot):
+    """
+    Motor de capacidad (ver logic/capacity.py), uno por versión de los
+    datos: su caché de resultados queda ligada a esa versión.
+    """
+    return snapshot.derived('capacity', lambda s: CapacityEngine(
+        s.tables, get_features(s), version=s.version, weights=DEFAULT_WEIGHTS,
+        busy_days=CAPACITY_BUSY_DAYS, cache_size=CAPACITY_CACHE_SIZE))
+
+def get_features(snapshot):
+    """Columnas de características de los proyectos pendientes, una vez por versión."""
+    return snapshot.derived('features', lambda s: ProjectFeatures(s.tables))
+
+# Máximo de vectores de pesos por barrido.
+SWEEP_MAX_VECTORS = int(os.getenv('SWEEP_MAX_VECTORS', 10000))
+
+def _weights_from_args():
+    """Pesos de la query string (?w_m=&w_u=&w_r=); None si no viene ninguno."""
+    given = {key: request.args[key] for key in WEIGHT_KEYS if key in request.args}
+    if not given:
+        return None
+    weights = {}
+    for key, value in given.items():
+        try:
+            weights[key] = float(value)
+        except ValueError:
+            raise ValueError(f"Weight {key} must be a number")
+    return resolve_weights(weights)
+
+def _non_negative_int_arg(name):
+    """Lee un parámetro entero >= 0 de la query string (None si no viene)."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"'{name}' must be a non-negative integer")
+    return int(value)
 
 # --- Endpoints de la API ---
 
 @app.route('/api/operations/status', methods=['GET'])
 def api_get_operations_status():
-    """Endpoint que provee un resumen del estado operativo actual."""
-    status = get_operations_status(db)
-    return jsonify(status)
+    """
+    Endpoint que provee un resumen del estado operativo actual (precalculado).
+    La versión viaja en el ETag: If-None-Match responde 304 y ?since=<versión>
+    devuelve solo los campos que cambiaron (o el resumen completo con
+    "full": true si esa versión ya no se conoce).
+    """
+    tracker = current_status()
+    version = tracker.version
+    since = request.args.get('since')
+    if since is not None:
+        delta = tracker.delta(since)
+        if delta is None:
+            delta = {"version": version, "since": since, "full": True, "changes": tracker.summary()}
+        response = jsonify(delta)
+        response.set_etag(delta["version"])
+    elif request.if_none_match.contains_weak(version):
+        response = app.response_class(status=304)
+        response.set_etag(version)
+    else:
+        response = jsonify(tracker.summary())
+        response.set_etag(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/operations/status/history', methods=['GET'])
+def api_get_operations_status_history():
+    """Serie de utilización por intervalos (?window=<segundos>, por defecto todo el buffer)."""
+    try:
+        window = _non_negative_int_arg('window')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tracker = current_status()
+    return jsonify({
+        "version": tracker.version,
+        "bucket_seconds": tracker.history.bucket_seconds,
+        "points": tracker.history_points(window),
+    })
+
+@app.route('/api/operations/data/status', methods=['GET'])
+def api_get_data_status():
+    """Versión del snapshot de datos activo, tiempo de carga y recargas."""
+    return jsonify(data_layer.status())
 
 @app.route('/api/projects/schedule', methods=['GET'])
 def api_schedule_projects():
-    """Endpoint que simula la planificación de proyectos."""
-    weights = {'w_m': 0.5, 'w_u': 0.3, 'w_r': 0.2}
-    scheduled_projects = schedule_projects(db, weights)
+    """
+    Endpoint que simula la planificación de proyectos (admite ?limit=&offset=).
+    Con ?w_m=&w_u=&w_r= se ordena con esos pesos en lugar de los de defecto.
+    """
+    try:
+        limit = _non_negative_int_arg('limit')
+        offset = _non_negative_int_arg('offset') or 0
+        weights = _weights_from_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if weights is None or weights == DEFAULT_WEIGHTS:
+        scheduled_projects = current_scheduler().top_k(limit, offset)
+    else:
+        scheduled_projects = get_features(data_layer.current()).top_k(weights, limit, offset)
     return jsonify(scheduled_projects)
 
+@app.route('/api/projects/schedule/sweep', methods=['POST'])
+def api_schedule_sweep():
+    """
+    Compara rankings bajo muchos vectores de pesos: {"vectors": [{...}, ...]}
+    o {"grid": {"w_m": [...], "w_u": [...], "w_r": [...]}} (producto
+    cartesiano), con "top_k" (10) e "include_rankings". Devuelve
+    estadísticas de estabilidad del top-k (ver logic/ranking.py).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        if 'grid' in data:
+            vectors = expand_grid(data['grid'])
+        elif isinstance(data.get('vectors'), list) and data['vectors']:
+            vectors = data['vectors']
+        else:
+            raise ValueError("Provide 'vectors' (non-empty list) or 'grid'")
+        if len(vectors) > SWEEP_MAX_VECTORS:
+            return jsonify({"error": f"At most {SWEEP_MAX_VECTORS} weight vectors per sweep"}), 413
+        if not all(isinstance(v, dict) for v in vectors):
+            raise ValueError("Each weight vector must be an object")
+        vectors = [resolve_weights(v) for v in vectors]
+        top_k = data.get('top_k', 10)
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+            raise ValueError("'top_k' must be a positive integer")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    include_rankings = bool(data.get('include_rankings', False))
+    snapshot = data_layer.current()
+    report = get_features(snapshot).sweep(vectors, top_k, include_rankings)
+    report["data_version"] = snapshot.version
+    return jsonify(report)
+
 @app.route('/api/resources/allocation', methods=['GET'])
 def api_allocate_resources():
-    """Endpoint que retorna un plan de asignación óptimo."""
-    allocation_plan = allocate_resources(db)
-    return jsonify(allocation_plan)
+    """
+    Endpoint que retorna un plan de asignación óptimo (emparejamiento
+    ponderado por prioridad). Con ?stats=1 incluye cobertura y tiempo de cálculo.
+
+    Si el cálculo supera ?time_budget_ms (ALLOCATION_TIME_BUDGET_MS, 500 ms
+    por defecto), las plazas restantes se asignan con el greedy simple y el
+    plan deja de ser óptimo: las cabeceras X-Allocation-Algorithm y
+    X-Allocation-Fallback-Slots lo indican siempre, también sin ?stats=1.
+    """
+    try:
+        time_budget_ms = _non_negative_int_arg('time_budget_ms')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if time_budget_ms is None:
+        time_budget_ms = ALLOCATION_TIME_BUDGET_MS
+
+    tables = data_layer.current().tables
+    allocation_plan, stats = allocate_resources_optimized(tables, DEFAULT_WEIGHTS, time_budget_ms)
+    if request.args.get('stats') in ('1', 'true'):
+        response = jsonify({"allocation_plan": allocation_plan, "stats": stats})
+    else:
+        response = jsonify(allocation_plan)
+    response.headers['X-Allocation-Algorithm'] = stats["algorithm"]
+    response.headers['X-Allocation-Fallback-Slots'] = str(stats["fallback_slots"])
+    return response
+
+@app.route('/api/operations/capacity-check', methods=['POST'])
+def api_capacity_check():
+    """
+    Simula si un proyecto candidato (habilidades, equipo, duración) cabe en
+    la capacidad actual dentro del horizonte, y responde con viabilidad,
+    confianza y cuellos de botella. Las consultas repetidas salen de caché.
+    """
+    payload = request.get_json(silent=True)
+    engine = get_capacity_engine(data_layer.current())
+    try:
+        result, cached = engine.check(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(dict(result, request_id=payload.get('request_id'), cached=cached))
+
+@app.route('/api/operations/capacity-check:batch', methods=['POST'])
+def api_capacity_check_batch():
+    """Varios candidatos en una llamada: {"checks": [...]}; cada uno se evalúa por separado."""
+    data = request.get_json(silent=True) or {}
+    checks = data.get('checks')
+    if not isinstance(checks, list):
+        return jsonify({"error": "'checks' must be a list"}), 400
+    if len(checks) > CAPACITY_BATCH_MAX:
+        return jsonify({"error": f"At most {CAPACITY_BATCH_MAX} checks per batch"}), 413
+    engine = get_capacity_engine(data_layer.current())
+    results = []
+    for payload, (result, cached) in zip(checks, engine.check_many(checks)):
+        request_id = payload.get('request_id') if isinstance(payload, dict) else None
+        results.append(dict(result, request_id=request_id, cached=cached))
+    return jsonify({"data_version": engine.version, "results": results})
+
+@app.route('/api/operations/capacity-check/stats', methods=['GET'])
+def api_capacity_check_stats():
+    """Aciertos y tamaño de la caché del motor de capacidad vigente."""
+    return jsonify(get_capacity_engine(data_layer.current()).cache_info())
+
+# --- Arranque ---
+
+with startup.phase('status_baseline'):
+    current_status()
+
+if preload_enabled():
+    # Índices derivados del snapshot vigente, construidos una vez en el
+    # maestro; los workers los comparten mientras los datos no cambien.
+    with startup.phase('derived_indexes'):
+        current_scheduler()
+        snapshot = data_layer.current()
+        get_features(snapshot)
+        get_capacity_engine(snapshot)
+
+install_startup_report(app, startup)
 
 if __name__ == '__main__':
     # Para desarrollo. En producción se usa Gunicorn.
@@ -0,0 +1,133 @@
+"""
+Micro-benchmark of the JSON response path of the Operations service.
+
+Builds the payloads the API actually returns (the raw data file, the
+project schedule and the resource allocation plan) from data/data.json,
+replicated with unique ids up to --scale copies, and serializes each one
+through Flask's stock DefaultJSONProvider and through
+common.json_provider.FastJSONProvider. It also measures gzip time and the
+compressed size of every payload, and prints a JSON report.
+
+Usage (from backend/operations):
+
+    python -m benchmarks.json_encoding --scale 200 --repeat 20 --output json_bench.json
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import json_provider
+from common.json_provider import FastJSONProvider
+from logic.allocation import allocate_resources_optimized
+from logic.data_layer import tables_from_dataset
+from logic.scheduler import DEFAULT_WEIGHTS, ProjectScheduler
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data', 'data.json')
+
+ID_FIELDS = {'projects': 'project_id', 'personnel': 'employee_id', 'equipment': 'equipment_id'}
+
+
+def scaled_data(path, scale):
+    """The data file repeated `scale` times, with a copy suffix on every id."""
+    with open(path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    data = {}
+    for table, rows in base.items():
+        id_field = ID_FIELDS.get(table)
+        out = []
+        for copy in range(scale):
+            for row in rows:
+                row = dict(row)
+                if id_field and id_field in row:
+                    row[id_field] = f"{row[id_field]}-{copy:05d}"
+                out.append(row)
+        data[table] = out
+    return data
+
+
+def build_payloads(data):
+    tables = tables_from_dataset(data)
+    allocation_plan, _ = allocate_resources_optimized(tables, DEFAULT_WEIGHTS, time_budget_ms=5000)
+    return {
+        'data': data,
+        'schedule': ProjectScheduler(tables, DEFAULT_WEIGHTS).top_k(),
+        'allocation': allocation_plan,
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, {'median_ms': round(statistics.median(samples), 3),
+                    'min_ms': round(min(samples), 3)}
+
+
+def bench_payload(payload, providers, repeat, gzip_level):
+    report = {}
+    bodies = {}
+    for name, provider in providers.items():
+        body, timing = timed(lambda: provider.response(payload).get_data(), repeat)
+        bodies[name] = body
+        compressed, gzip_timing = timed(lambda: gzip.compress(body, compresslevel=gzip_level), repeat)
+        report[name] = dict(timing, bytes=len(body), gzip_bytes=len(compressed),
+                            gzip_median_ms=gzip_timing['median_ms'])
+    # Same document, even if the byte encoding differs (UTF-8 vs \u escapes).
+    decoded = [json.loads(body) for body in bodies.values()]
+    report['equivalent'] = all(doc == decoded[0] for doc in decoded[1:])
+    stock, fast = report['stdlib']['median_ms'], report['fast']['median_ms']
+    report['speedup'] = round(stock / fast, 2) if fast else None
+    return report
+
+
+def run_benchmark(args):
+    app = Flask('json_benchmark')
+    providers = {'stdlib': DefaultJSONProvider(app), 'fast': FastJSONProvider(app)}
+    payloads = build_payloads(scaled_data(args.data, args.scale))
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'encoder': providers['fast'].encoder,
+        },
+        'config': {'scale': args.scale, 'repeat': args.repeat, 'gzip_level': args.gzip_level},
+        'payloads': {name: bench_payload(payload, providers, args.repeat, args.gzip_level)
+                     for name, payload in payloads.items()},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--data', default=DATA_PATH, help="operations data file to replicate")
+    parser.add_argument('--scale', type=int, default=200, help="copies of the data file")
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per encoder")
+    parser.add_argument('--gzip-level', type=int, default=json_provider.DEFAULT_GZIP_LEVEL)
+    parser.add_argument('--output', help="file to write the JSON report to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
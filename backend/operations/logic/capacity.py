@@ -0,0 +1,422 @@
+import bisect
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from datetime import date
+
+from logic.allocation import solve_allocation
+from logic.data_layer import get_table
+from logic.records import EquipmentStatus, PersonnelStatus
+from logic.scheduler import DEFAULT_WEIGHTS, priority_score, resource_fit_score
+
+# Days a person or machine that is busy today stays busy (the dataset has no
+# end dates for active work).
+DEFAULT_BUSY_DAYS = 30
+# Duration assumed for queued pending projects and for candidates that do
+# not state one.
+DEFAULT_DURATION_DAYS = 30
+DEFAULT_HORIZON_DAYS = 90
+# Days a machine is out of service around its next_maintenance_date.
+MAINTENANCE_DAYS = 2
+# Utilization above which an assigned person is reported as a risk.
+HIGH_UTILIZATION = 0.9
+
+
+def _positive_int(payload, name, default):
+    value = payload.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"'{name}' must be a positive integer")
+    return value
+
+
+def _optional_number(payload, name):
+    value = payload.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{name}' must be a number")
+    return float(value)
+
+
+def normalize_request(payload, today=None):
+    """
+    Validates a capacity-check payload and returns its canonical form: a
+    hashable tuple that is the same for every request asking the same
+    question (skill order, duplicates written as counts, defaults filled
+    in). Raises ValueError for malformed payloads.
+
+    Accepted fields: required_skills (list, duplicates mean headcount, or
+    {skill: headcount}), requires_equipment (bool or number of machines),
+    duration_days, horizon_days, start_date (ISO, default today), and
+    project_margin / urgency_score to place the candidate in the pending
+    queue. Anything else (request_id, project names...) is ignored.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("capacity check must be a JSON object")
+    today = today or date.today()
+
+    skills = payload.get('required_skills', [])
+    if isinstance(skills, dict):
+        counts = Counter()
+        for skill, count in skills.items():
+            if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+                raise ValueError("'required_skills' headcounts must be non-negative integers")
+            if count:
+                counts[skill] = count
+    elif isinstance(skills, list) and all(isinstance(s, str) for s in skills):
+        counts = Counter(skills)
+    else:
+        raise ValueError("'required_skills' must be a list of skills or a {skill: headcount} object")
+
+    equipment = payload.get('requires_equipment', False)
+    if isinstance(equipment, bool):
+        equipment = int(equipment)
+    elif not isinstance(equipment, int) or equipment < 0:
+        raise ValueError("'requires_equipment' must be a boolean or a non-negative integer")
+
+    start = payload.get('start_date')
+    if start is None:
+        start = today
+    else:
+        try:
+            start = date.fromisoformat(start)
+        except (TypeError, ValueError):
+            raise ValueError("'start_date' must be an ISO date (YYYY-MM-DD)")
+
+    return (
+        today.toordinal(),
+        max(0, (start - today).days),
+        tuple(sorted(counts.items())),
+        equipment,
+        _positive_int(payload, 'duration_days', DEFAULT_DURATION_DAYS),
+        _positive_int(payload, 'horizon_days', DEFAULT_HORIZON_DAYS),
+        _optional_number(payload, 'project_margin'),
+        _optional_number(payload, 'urgency_score'),
+    )
+
+
+def _match(slots, candidates, free, t):
+    """
+    Assigns a distinct person free at day t to every slot (Kuhn's augmenting
+    paths). Returns the person per slot, or None if some slot stays empty.
+    """
+    owner = {}
+    for slot in range(len(slots)):
+        if not _augment(slot, slots, candidates, free, t, owner):
+            return None
+    assigned = [None] * len(slots)
+    for person, slot in owner.items():
+        assigned[slot] = person
+    return assigned
+
+
+def _augment(root, slots, candidates, free, t, owner):
+    """
+    Depth-first search for an augmenting path from slot root, with an
+    explicit stack so a long path cannot hit the recursion limit. path[i]
+    is the person that led from stack[i] to stack[i + 1]; the last one is
+    free, and the whole path is flipped onto owner.
+    """
+    visited = set()
+    stack = [(root, iter(candidates[slots[root]]))]
+    path = []
+    while stack:
+        slot, people = stack[-1]
+        for person in people:
+            if free[person] > t or person in visited:
+                continue
+            visited.add(person)
+            path.append(person)
+            if person not in owner:
+                for (path_slot, _), path_person in zip(stack, path):
+                    owner[path_person] = path_slot
+                return True
+            stack.append((owner[person], iter(candidates[slots[owner[person]]])))
+            break
+        else:
+            stack.pop()
+            if path:
+                path.pop()
+    return False
+
+
+class CapacityEngine:
+    """
+    Simulates candidate projects against one snapshot of the operations data.
+
+    The timeline is in whole days from today. People and machines that are
+    busy today (status, or taken by the current allocation plan for active
+    projects) free up after busy_days. Pending projects are then placed in
+    priority order, each at the earliest day where every required skill
+    slot gets a distinct qualified person and enough machines are free;
+    that queue plan is computed once per snapshot.
+
+    A candidate is placed after the queued projects that outrank it (all of
+    them when it has no margin/urgency) and also has to avoid equipment
+    maintenance windows. Results are memoized by normalized request, so a
+    repeated check costs one dict lookup. Each check is independent: a
+    batch does not reserve capacity between its own candidates.
+    """
+
+    def __init__(self, tables, features, version=None, weights=None, busy_days=DEFAULT_BUSY_DAYS,
+                 cache_size=4096):
+        self.version = version
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.busy_days = busy_days
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+        # Everything below is indexed by table row; ids and utilization are
+        # read from the columns only for the people a result names.
+        self.personnel = get_table(tables, 'personnel')
+        self.equipment = get_table(tables, 'equipment')
+        self.features = features
+
+        assignments, _ = solve_allocation(tables, self.weights)
+        allocated_people = {row for _, people, _ in assignments for row in people}
+        allocated_equipment = {row for _, _, units in assignments for row in units}
+
+        available = self.personnel.equals('status', PersonnelStatus.AVAILABLE).tolist()
+        self.skill_people = {self.personnel.string(code): rows.tolist()
+                             for code, rows in self.personnel.rows_by_code('skills').items()}
+        self.base_free = [0 if available[row] and row not in allocated_people else busy_days
+                          for row in range(self.personnel.rows)]
+        self.available_headcount = Counter({
+            skill: sum(1 for i in ids if self.base_free[i] == 0)
+            for skill, ids in self.skill_people.items()
+        })
+        self.utilization = self.personnel.numbers('utilization_rate')
+
+        equipment_available = self.equipment.equals('status', EquipmentStatus.AVAILABLE).tolist()
+        self.base_equipment_free = [
+            0 if equipment_available[row] and row not in allocated_equipment else busy_days
+            for row in range(self.equipment.rows)
+        ]
+        self._maintenance = []
+        for value in self.equipment.values('next_maintenance_date'):
+            try:
+                self._maintenance.append(date.fromisoformat(value).toordinal())
+            except (TypeError, ValueError):
+                self._maintenance.append(None)
+
+        self._queue = None
+
+    # --- Queue of pending projects ---
+
+    def _plan_queue(self):
+        """Places every pending project in priority order (lazy, once per snapshot)."""
+        free = list(self.base_free)
+        equipment_free = list(self.base_equipment_free)
+        priorities, placements = [], []
+        features = self.features
+        projects = features.table
+        scores = features.scores(self.weights)
+        offsets, codes = projects.list_codes('required_skills')
+        requires_equipment = projects.values('requires_equipment')
+        for index in features.order(self.weights).tolist():
+            row = int(features.rows[index])
+            skills = [projects.string(c) for c in codes[offsets[row]:offsets[row + 1]].tolist()]
+            needs = tuple(Counter(skills).items())
+            machines = int(bool(requires_equipment[row]))
+            placement = self._earliest(needs, machines, DEFAULT_DURATION_DAYS, 0, None,
+                                       free, equipment_free, None)
+            if placement is None:
+                continue  # Can never be staffed: it does not hold anybody.
+            start, people, units = placement
+            end = start + DEFAULT_DURATION_DAYS
+            for person in people:
+                free[person] = end
+            for unit in units:
+                equipment_free[unit] = end
+            priorities.append(-float(scores[index]))
+            placements.append((people, units, end))
+        return priorities, placements
+
+    def _state_after(self, ahead):
+        free = list(self.base_free)
+        equipment_free = list(self.base_equipment_free)
+        for people, units, end in self._queue[1][:ahead]:
+            for person in people:
+                free[person] = end
+            for unit in units:
+                equipment_free[unit] = end
+        return free, equipment_free
+
+    # --- Simulation ---
+
+    def _earliest(self, needs, machines, duration, earliest, latest, free, equipment_free,
+                  maintenance):
+        """
+        Earliest day in [earliest, latest] where the needs are covered.
+        Returns (day, people, machines) or None. Only days when something is
+        released can change the answer, so those are the only ones tried.
+        """
+        slots = [skill for skill, count in needs for _ in range(count)]
+        candidates = {skill: self.skill_people.get(skill, ()) for skill, _ in needs}
+        for skill, count in needs:
+            if len(candidates[skill]) < count:
+                return None
+        if machines > self.equipment.rows:
+            return None
+
+        days = {earliest}
+        for people in candidates.values():
+            days.update(free[p] for p in people)
+        if machines:
+            days.update(equipment_free)
+            if maintenance:
+                days.update(m + MAINTENANCE_DAYS for m in maintenance if m is not None)
+        for t in sorted(d for d in days if d >= earliest and (latest is None or d <= latest)):
+            units = []
+            if machines:
+                for unit, unit_free in enumerate(equipment_free):
+                    if unit_free > t:
+                        continue
+                    m = maintenance[unit] if maintenance else None
+                    if m is not None and m < t + duration and t < m + MAINTENANCE_DAYS:
+                        continue
+                    units.append(unit)
+                    if len(units) == machines:
+                        break
+                if len(units) < machines:
+                    continue
+            people = _match(slots, candidates, free, t)
+            if people is not None:
+                return t, people, units
+        return None
+
+    def check(self, payload, today=None):
+        """Result for one candidate; returns (result, cached)."""
+        key = normalize_request(payload, today)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return result, True
+        result = self._simulate(key)
+        with self._lock:
+            self.stats['misses'] += 1
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result, False
+
+    def check_many(self, payloads, today=None):
+        """One (result, cached) per payload; malformed ones yield ({"error": ...}, False)."""
+        today = today or date.today()
+        results = []
+        for payload in payloads:
+            try:
+                results.append(self.check(payload, today))
+            except ValueError as e:
+                results.append(({"error": str(e)}, False))
+        return results
+
+    def _simulate(self, key):
+        today_ordinal, offset, needs, machines, duration, horizon, margin, urgency = key
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = self._plan_queue()
+        priorities, placements = self._queue
+
+        skills = [skill for skill, count in needs for _ in range(count)]
+        if margin is None and urgency is None:
+            ahead = len(placements)
+        else:
+            candidate = {'project_margin': margin or 0, 'urgency_score': urgency or 0}
+            fit = resource_fit_score(skills, self.available_headcount)
+            ahead = bisect.bisect_right(priorities, -priority_score(candidate, fit, self.weights))
+        free, equipment_free = self._state_after(ahead)
+        maintenance = [m - today_ordinal if m is not None else None for m in self._maintenance]
+
+        placement = self._earliest(needs, machines, duration, offset, offset + horizon,
+                                   free, equipment_free, maintenance)
+        start_day = today_ordinal + offset
+        digest = hashlib.blake2b(repr((self.version, key)).encode('utf-8'), digest_size=6).hexdigest()
+        result = {
+            "check_id": f"CAP-CHECK-{digest}",
+            "can_be_fulfilled": placement is not None,
+            "confidence_score": 0.0,
+            "potential_bottlenecks": self._bottlenecks(needs, machines, offset, free,
+                                                       equipment_free, placement, duration),
+            "estimated_start_date": None,
+            "estimated_end_date": None,
+            "start_delay_days": None,
+            "queue_ahead": ahead,
+            "assigned_personnel": [],
+            "assigned_equipment": [],
+            "horizon_end_date": date.fromordinal(start_day + horizon).isoformat(),
+            "data_version": self.version,
+        }
+        if placement is not None:
+            t, people, units = placement
+            result.update(
+                confidence_score=self._confidence(needs, t, offset, horizon, people, free),
+                estimated_start_date=date.fromordinal(today_ordinal + t).isoformat(),
+                estimated_end_date=date.fromordinal(today_ordinal + t + duration).isoformat(),
+                start_delay_days=t - offset,
+                assigned_personnel=[self.personnel.value('employee_id', p) for p in people],
+                assigned_equipment=[self.equipment.value('equipment_id', u) for u in units],
+            )
+        return result
+
+    def _confidence(self, needs, t, offset, horizon, people, free):
+        """
+        0..1: lower when the start slips towards the end of the horizon,
+        when there is no spare qualified staff at the start day, and when
+        the assigned people are already highly utilized.
+        """
+        timing = 1.0 - 0.5 * (t - offset) / horizon
+        scarcity = 1.0
+        for skill, count in needs:
+            spare = sum(1 for p in self.skill_people[skill] if free[p] <= t)
+            scarcity = min(scarcity, spare / (count + 1), 1.0)
+        if people:
+            utilization = sum(float(self.utilization[p]) for p in people) / len(people)
+        else:
+            utilization = 0.0
+        load = 1.0 - 0.5 * min(1.0, max(0.0, utilization - 0.8) / 0.2)
+        return round(timing * scarcity * load, 2)
+
+    def _bottlenecks(self, needs, machines, offset, free, equipment_free, placement, duration):
+        notes = []
+        for skill, count in needs:
+            qualified = self.skill_people.get(skill, ())
+            if not qualified:
+                notes.append(f"No staff with skill '{skill}'.")
+            elif len(qualified) < count:
+                notes.append(f"'{skill}' needs {count} people; only {len(qualified)} have the skill.")
+            else:
+                free_now = sum(1 for p in qualified if free[p] <= offset)
+                if free_now < count:
+                    notes.append(f"'{skill}' staff busy at the requested start "
+                                 f"({free_now} of {count} free).")
+                elif free_now == count:
+                    notes.append(f"'{skill}' availability will be tight (no spare staff).")
+        if machines:
+            if self.equipment.rows < machines:
+                notes.append(f"{machines} machines needed; only {self.equipment.rows} exist.")
+            elif sum(1 for f in equipment_free if f <= offset) < machines:
+                notes.append("Equipment busy at the requested start.")
+        if placement is not None:
+            start, people, _ = placement
+            if start > offset:
+                notes.append(f"Start delayed {start - offset} days waiting for resources.")
+            for p in people:
+                rate = float(self.utilization[p])
+                if rate >= HIGH_UTILIZATION:
+                    notes.append(f"{self.personnel.value('employee_id', p)} is at {rate:.0%} utilization.")
+        elif not notes:
+            notes.append("No slot with enough free staff and equipment within the horizon.")
+        return notes
+
+    def cache_info(self):
+        with self._lock:
+            return {"version": self.version, "entries": len(self._cache),
+                    "max_entries": self.cache_size, "hits": self.stats['hits'],
+                    "misses": self.stats['misses']}
+
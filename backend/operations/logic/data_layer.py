@@ -0,0 +1,517 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+# Column kinds of the compiled snapshot. Scalars live in one .npy file per
+# column; strings (and anything that is not a plain scalar, stored as JSON
+# text) are int32 codes into a string table shared by the whole snapshot;
+# lists of strings use CSR layout (offsets + codes).
+# Snapshot directories not loaded for this long are pruned by the next
+# compile; the margin keeps a worker that is still mapping an older version
+# (e.g. mid-reload) from having its files removed underneath it.
+PRUNE_GRACE_SECONDS = 300
+
+_SCALAR_DTYPES = {'bool': np.bool_, 'int': np.int64, 'float': np.float64}
+
+
+def _column_kind(values):
+    """Smallest column kind that round-trips every present value exactly."""
+    if all(isinstance(v, bool) for v in values):
+        return 'bool'
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return 'int'
+    if all(isinstance(v, float) for v in values):
+        return 'float'
+    if all(isinstance(v, str) for v in values):
+        return 'str'
+    if all(isinstance(v, list) and all(isinstance(x, str) for x in v) for v in values):
+        return 'strlist'
+    return 'json'
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+
+def compile_columns(dataset):
+    """
+    Columnar form of `dataset` (top-level lists of flat-ish records):
+    (meta, arrays), where meta holds the schema, the string table and the
+    non-tabular entries, and arrays maps "<table>.<column>[.offsets|.present]"
+    to numpy arrays.
+    """
+    strings = _StringTable()
+    meta = {"tables": {}, "extra": {}}
+    arrays = {}
+
+    for table, rows in dataset.items():
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            meta["extra"][table] = rows
+            continue
+
+        names = list(dict.fromkeys(key for row in rows for key in row))
+        columns = []
+        for name in names:
+            present = np.array([name in row for row in rows], dtype=np.bool_)
+            values = [row[name] for row in rows if name in row]
+            kind = _column_kind(values)
+            stem = f"{table}.{name}"
+
+            if kind in _SCALAR_DTYPES:
+                filled = [row.get(name, 0) for row in rows]
+                arrays[stem] = np.array(filled, dtype=_SCALAR_DTYPES[kind])
+            elif kind == 'str':
+                codes = [strings.code(row[name]) if name in row else -1 for row in rows]
+                arrays[stem] = np.array(codes, dtype=np.int32)
+            elif kind == 'strlist':
+                offsets, codes = [0], []
+                for row in rows:
+                    codes.extend(strings.code(x) for x in row.get(name, []))
+                    offsets.append(len(codes))
+                arrays[stem + ".offsets"] = np.array(offsets, dtype=np.int64)
+                arrays[stem] = np.array(codes, dtype=np.int32)
+            else:
+                codes = [strings.code(json.dumps(row[name], ensure_ascii=False, sort_keys=True))
+                         if name in row else -1 for row in rows]
+                arrays[stem] = np.array(codes, dtype=np.int32)
+
+            optional = not bool(present.all())
+            if optional:
+                arrays[stem + ".present"] = present
+            columns.append({"name": name, "kind": kind, "optional": optional})
+
+        meta["tables"][table] = {"rows": len(rows), "columns": columns}
+
+    meta["strings"] = strings.strings
+    return meta, arrays
+
+
+def compile_snapshot(dataset, target_dir, version):
+    """
+    Writes `dataset` in columnar form to target_dir: one .npy file per
+    array of compile_columns plus meta.json with the schema and the string
+    table.
+    """
+    meta, arrays = compile_columns(dataset)
+    meta["version"] = version
+    for stem, array in arrays.items():
+        np.save(os.path.join(target_dir, stem + ".npy"), array)
+    with open(os.path.join(target_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def load_tables(meta, load):
+    """{name: Table} for compiled meta; load(stem) returns the array of a stem."""
+    strings = meta["strings"]
+    string_codes = {value: code for code, value in enumerate(strings)}
+    return {name: Table(name, spec, strings, string_codes, load)
+            for name, spec in meta["tables"].items()}
+
+
+def tables_from_dataset(dataset):
+    """In-memory tables with the same layout as a compiled snapshot (no files)."""
+    meta, arrays = compile_columns(dataset)
+    return load_tables(meta, arrays.__getitem__)
+
+
+def row_keys(ids):
+    """
+    One distinct key per row: the row's id, with a "#n" suffix on repeated
+    ids and "#row<index>" for rows without one, so every row is counted.
+    """
+    keys, seen = [], set()
+    for index, entity_id in enumerate(ids):
+        key = entity_id if entity_id is not None else f"#row{index}"
+        if key in seen:
+            n = 2
+            while f"{key}#{n}" in seen:
+                n += 1
+            key = f"{key}#{n}"
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+
+def get_table(tables, name):
+    """tables[name], or an empty table if the dataset lacks it."""
+    table = tables.get(name)
+    return table if table is not None else Table.empty(name)
+
+
+# Serializes interning of strings missing from a snapshot's string table.
+_intern_lock = threading.Lock()
+
+
+class Table:
+    """
+    Read-only columnar table (memory-mapped .npy files for a snapshot).
+
+    Consumers read whole columns (values, numbers, equals, list_codes) and
+    materialize records only for the rows they return (row, records), so no
+    process keeps a dict copy of the dataset.
+    """
+
+    def __init__(self, name, spec, strings, string_codes, load):
+        self.name = name
+        self.rows = spec["rows"]
+        self.strings = strings
+        self._string_codes = string_codes
+        self.kinds = {}
+        self.columns = {}
+        self.offsets = {}
+        self.present = {}
+        for column in spec["columns"]:
+            col = column["name"]
+            stem = f"{name}.{col}"
+            self.kinds[col] = column["kind"]
+            self.columns[col] = load(stem)
+            if column["kind"] == 'strlist':
+                self.offsets[col] = load(stem + ".offsets")
+            if column["optional"]:
+                self.present[col] = load(stem + ".present")
+
+    @classmethod
+    def empty(cls, name):
+        """A table without rows, for datasets that lack `name`."""
+        return cls(name, {"rows": 0, "columns": []}, [], {}, None)
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """Raw column array (codes for string/json kinds)."""
+        return self.columns[name]
+
+    def code_of(self, value):
+        """String-table code of `value`, or -1 when it does not occur."""
+        return self._string_codes.get(value, -1)
+
+    def string(self, code):
+        return self.strings[code]
+
+    def nbytes(self):
+        arrays = list(self.columns.values()) + list(self.offsets.values()) + list(self.present.values())
+        return int(sum(a.nbytes for a in arrays))
+
+    # --- Whole columns ---
+
+    def values(self, name, default=None):
+        """
+        Decoded column as a list, one value per row (`default` where the
+        row lacks the field). Lists of strings come back as tuples.
+        """
+        kind = self.kinds.get(name)
+        if kind is None:
+            return [default] * self.rows
+        data = self.columns[name]
+        strings = self.strings
+        if kind in _SCALAR_DTYPES:
+            values = data.tolist()
+        elif kind == 'str':
+            values = [strings[c] if c >= 0 else default for c in data.tolist()]
+        elif kind == 'strlist':
+            items = [strings[c] for c in data.tolist()]
+            offsets = self.offsets[name].tolist()
+            values = [tuple(items[offsets[i]:offsets[i + 1]]) for i in range(self.rows)]
+        else:
+            values = [json.loads(strings[c]) if c >= 0 else default for c in data.tolist()]
+        mask = self.present.get(name)
+        if mask is not None:
+            values = [v if p else default for v, p in zip(values, mask.tolist())]
+        return values
+
+    def numbers(self, name, default=0):
+        """
+        Numeric column as float64 (`default` where absent or not a number).
+        A float column is returned as a view of the mapped file.
+        """
+        kind = self.kinds.get(name)
+        if kind in _SCALAR_DTYPES:
+            data = np.asarray(self.columns[name], dtype=np.float64)
+            mask = self.present.get(name)
+            return data if mask is None else np.where(mask, data, default)
+        return np.array([v if isinstance(v, (int, float)) else default
+                         for v in self.values(name, default)], dtype=np.float64)
+
+    def equals(self, name, value):
+        """Boolean mask of the rows whose `name` is the string `value`."""
+        if self.kinds.get(name) == 'str':
+            code = self.code_of(value)
+            if code < 0:
+                return np.zeros(self.rows, dtype=np.bool_)
+            return np.asarray(self.columns[name]) == code
+        return np.array([v == value for v in self.values(name)], dtype=np.bool_)
+
+    def list_codes(self, name):
+        """
+        A list-of-strings column in CSR layout, (offsets, codes): the string
+        codes of row i are codes[offsets[i]:offsets[i + 1]]. Columns stored
+        another way (e.g. some rows hold null) are converted on the fly;
+        strings missing from the string table are interned into it.
+        """
+        if self.kinds.get(name) == 'strlist':
+            return self.offsets[name], self.columns[name]
+        offsets, codes = [0], []
+        for value in self.values(name):
+            if isinstance(value, (list, tuple)):
+                codes.extend(self._intern(v if isinstance(v, str) else json.dumps(v, sort_keys=True))
+                             for v in value)
+            offsets.append(len(codes))
+        return np.array(offsets, dtype=np.int64), np.array(codes, dtype=np.int32)
+
+    def rows_by_code(self, name, mask=None):
+        """
+        {string code: ascending array of the rows whose list column `name`
+        contains it} (a row counts once per code). `mask` (boolean, one per
+        row) limits the result to those rows.
+        """
+        offsets, codes = self.list_codes(name)
+        holder = np.repeat(np.arange(self.rows, dtype=np.int64), np.diff(offsets))
+        codes = np.asarray(codes, dtype=np.int64)
+        if mask is not None:
+            keep = np.asarray(mask)[holder]
+            holder, codes = holder[keep], codes[keep]
+        if not len(codes):
+            return {}
+        codes, holder = np.divmod(np.unique(codes * self.rows + holder), self.rows)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        return dict(zip(codes[starts].tolist(), np.split(holder, starts[1:])))
+
+    def _intern(self, value):
+        code = self._string_codes.get(value)
+        if code is None:
+            with _intern_lock:
+                code = self._string_codes.get(value)
+                if code is None:
+                    code = self._string_codes[value] = len(self.strings)
+                    self.strings.append(value)
+        return code
+
+    # --- Single rows ---
+
+    def value(self, name, index, default=None):
+        """Decoded value of one cell."""
+        kind = self.kinds.get(name)
+        mask = self.present.get(name)
+        if kind is None or (mask is not None and not mask[index]):
+            return default
+        data = self.columns[name]
+        if kind in _SCALAR_DTYPES:
+            return data[index].item()
+        if kind == 'strlist':
+            offsets = self.offsets[name]
+            return [self.strings[c] for c in data[offsets[index]:offsets[index + 1]].tolist()]
+        code = int(data[index])
+        if code < 0:
+            return default
+        return self.strings[code] if kind == 'str' else json.loads(self.strings[code])
+
+    def row(self, index):
+        """One row as a new dict in the original JSON shape."""
+        record = {}
+        for col in self.kinds:
+            mask = self.present.get(col)
+            if mask is None or mask[index]:
+                record[col] = self.value(col, index)
+        return record
+
+    def records(self, indices):
+        """The given rows as new dicts."""
+        return [self.row(i) for i in indices]
+
+
+class Snapshot:
+    """
+    One immutable version of the operations dataset. Columns are shared
+    between workers through the page cache; derived structures (scheduler,
+    indexes...) are built lazily once per snapshot from those columns.
+    """
+
+    def __init__(self, directory, meta, source_stat, load_ms):
+        self.directory = directory
+        self.version = meta["version"]
+        self.loaded_at = time.time()
+        self.load_ms = load_ms
+        self.source_stat = source_stat
+        self.extra = meta.get("extra", {})
+        self.tables = load_tables(
+            meta, lambda stem: np.load(os.path.join(directory, stem + ".npy"), mmap_mode='r'))
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derived(self, key, factory):
+        """Per-snapshot cache for structures computed from this version."""
+        value = self._derived.get(key)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = self._derived[key] = factory(self)
+        return value
+
+    def info(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_ms": self.load_ms,
+            "rows": {name: table.rows for name, table in self.tables.items()},
+            "columnar_bytes": sum(table.nbytes() for table in self.tables.values()),
+        }
+
+
+class DataLayer:
+    """
+    Loads the operations JSON file into memory-mapped columnar snapshots and
+    hot-swaps them when the file changes.
+
+    Every worker compiles into (or reuses) snapshot_dir/<content hash>, so all
+    gunicorn workers map the same files. Change detection is a cheap stat()
+    at most every `check_interval` seconds from the request path; reloading
+    happens in a background thread and the new snapshot replaces the old one
+    with a single reference assignment, so requests never wait for it.
+    """
+
+    def __init__(self, path, snapshot_dir=None, check_interval=2.0,
+                 prune_grace=PRUNE_GRACE_SECONDS):
+        self.path = path
+        self.snapshot_dir = snapshot_dir or os.path.join(os.path.dirname(path), '.snapshots')
+        self.check_interval = check_interval
+        self.prune_grace = prune_grace
+        self.reloads = 0
+        self.last_error = None
+        self._last_check = 0.0
+        self._failed_stat = None
+        self._reloading = False
+        self._lock = threading.Lock()
+        self._snapshot = self._load()
+
+    def current(self):
+        """The active snapshot; may schedule a background reload."""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._check_for_changes()
+        return self._snapshot
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _check_for_changes(self):
+        try:
+            stat = self._stat()
+        except OSError as e:
+            self.last_error = str(e)
+            return
+        # Unchanged, or the same broken file that already failed to load.
+        if stat == self._snapshot.source_stat or stat == self._failed_stat:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name='data-layer-reload', daemon=True).start()
+
+    def _reload(self):
+        stat = None
+        try:
+            stat = self._stat()
+            snapshot = self._load()
+            if snapshot.version != self._snapshot.version:
+                self.reloads += 1
+            self._snapshot = snapshot
+            self._failed_stat = None
+            self.last_error = None
+        except (OSError, ValueError) as e:
+            # Keep serving the previous snapshot if the new file is invalid.
+            self._failed_stat = stat
+            self.last_error = str(e)
+        finally:
+            self._reloading = False
+
+    def _load(self):
+        started = time.perf_counter()
+        source_stat = self._stat()
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        version = hashlib.sha1(raw).hexdigest()[:12]
+        directory = os.path.join(self.snapshot_dir, version)
+
+        for attempt in range(2):
+            if not os.path.exists(os.path.join(directory, "meta.json")):
+                self._compile(json.loads(raw.decode('utf-8')), directory, version)
+            try:
+                # Marks the version as in use so other workers do not prune it.
+                os.utime(directory)
+                with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                snapshot = Snapshot(directory, meta, source_stat, 0.0)
+                break
+            except FileNotFoundError:
+                # Pruned by another worker between the check and the mapping
+                # (a version idle for prune_grace): compile it again.
+                if attempt:
+                    raise
+        snapshot.load_ms = round((time.perf_counter() - started) * 1000, 3)
+        return snapshot
+
+    def _compile(self, dataset, directory, version):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        tmp = os.path.join(self.snapshot_dir, f".tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(tmp)
+        try:
+            compile_snapshot(dataset, tmp, version)
+            os.rename(tmp, directory)
+        except OSError:
+            # Another worker published the same version first.
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, "meta.json")):
+                raise
+        # Only the process that compiled a version prunes, and only versions
+        # no worker has loaded within prune_grace.
+        self._prune(keep={version, getattr(getattr(self, '_snapshot', None), 'version', None)})
+
+    def _prune(self, keep):
+        """
+        Removes snapshot directories idle for prune_grace (mapped files stay
+        valid until unmapped), and temporary ones left by crashed compiles.
+        """
+        cutoff = time.time() - self.prune_grace
+        for name in os.listdir(self.snapshot_dir):
+            path = os.path.join(self.snapshot_dir, name)
+            if name in keep:
+                continue
+            try:
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def status(self):
+        info = self._snapshot.info()
+        info.update({
+            "source": self.path,
+            "source_mtime_ns": self._snapshot.source_stat[0],
+            "source_size": self._snapshot.source_stat[1],
+            "reloads": self.reloads,
+            "reloading": self._reloading,
+            "last_error": self.last_error,
+            "check_interval": self.check_interval,
+        })
+        return info
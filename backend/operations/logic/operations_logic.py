@@ -1,21 +1,24 @@
 import random
 
+from common.records import as_dict
+from logic.records import EquipmentStatus, PersonnelStatus, ProjectStatus
+
 def get_operations_status(db):
     """Calculates a summary of the current operational status."""
     personnel = db.get('personnel', [])
     equipment = db.get('equipment', [])
     projects = db.get('projects', [])
 
-    assigned_personnel = sum(1 for p in personnel if p['status'] == 'assigned')
+    assigned_personnel = sum(1 for p in personnel if p['status'] == PersonnelStatus.ASSIGNED)
     total_personnel = len(personnel)
     personnel_utilization = (assigned_personnel / total_personnel * 100) if total_personnel > 0 else 0
 
-    in_use_equipment = sum(1 for e in equipment if e['status'] == 'in_use')
+    in_use_equipment = sum(1 for e in equipment if e['status'] == EquipmentStatus.IN_USE)
     total_equipment = len(equipment)
     equipment_utilization = (in_use_equipment / total_equipment * 100) if total_equipment > 0 else 0
 
-    active_projects_count = sum(1 for p in projects if p['status'] == 'active')
-    pending_projects_count = sum(1 for p in projects if p['status'] == 'pending')
+    active_projects_count = sum(1 for p in projects if p['status'] == ProjectStatus.ACTIVE)
+    pending_projects_count = sum(1 for p in projects if p['status'] == ProjectStatus.PENDING)
 
     return {
         "active_projects_count": active_projects_count,
@@ -28,12 +31,12 @@ def get_operations_status(db):
 
 def schedule_projects(db, weights):
     """Calculates a priority score for pending projects and sorts them."""
-    pending_projects = [p for p in db.get('projects', []) if p.get('status') == 'pending']
+    pending_projects = [p for p in db.get('projects', []) if p.get('status') == ProjectStatus.PENDING]
     personnel = db.get('personnel', [])
 
     available_personnel_skills = set()
     for person in personnel:
-        if person['status'] == 'available':
+        if person['status'] == PersonnelStatus.AVAILABLE:
             for skill in person.get('skills', []):
                 available_personnel_skills.add(skill)
 
@@ -52,10 +55,10 @@ def schedule_projects(db, weights):
             weights['w_r'] * resource_fit_score
         )
 
-        project_copy = project.copy()
-        project_copy['resource_fit_score'] = resource_fit_score
-        project_copy['priority_score'] = priority_score
-        scheduled_list.append(project_copy)
+        scheduled = as_dict(project)
+        scheduled['resource_fit_score'] = resource_fit_score
+        scheduled['priority_score'] = priority_score
+        scheduled_list.append(scheduled)
 
     scheduled_list.sort(key=lambda x: x['priority_score'], reverse=True)
     return scheduled_list
@@ -63,10 +66,10 @@ def schedule_projects(db, weights):
 
 def allocate_resources(db):
     """Simulates a proactive resource allocation for active projects."""
-    active_projects = [p for p in db.get('projects', []) if p.get('status') == 'active']
+    active_projects = [p for p in db.get('projects', []) if p.get('status') == ProjectStatus.ACTIVE]
 
-    available_personnel = [p for p in db.get('personnel', []) if p.get('status') == 'available']
-    available_equipment = [e for e in db.get('equipment', []) if e.get('status') == 'available']
+    available_personnel = [p for p in db.get('personnel', []) if p.get('status') == PersonnelStatus.AVAILABLE]
+    available_equipment = [e for e in db.get('equipment', []) if e.get('status') == EquipmentStatus.AVAILABLE]
 
     allocation_plan = []
 
@@ -83,13 +86,13 @@ def allocate_resources(db):
             for i, person in enumerate(available_personnel):
                 if skill in person.get('skills', []):
                     person_to_assign = available_personnel.pop(i)
-                    project_allocation["assigned_personnel"].append(person_to_assign)
+                    project_allocation["assigned_personnel"].append(as_dict(person_to_assign))
                     break
 
         if project.get('requires_equipment'):
             if available_equipment:
                 equipment_to_assign = available_equipment.pop(0)
-                project_allocation["assigned_equipment"].append(equipment_to_assign)
+                project_allocation["assigned_equipment"].append(as_dict(equipment_to_assign))
 
         allocation_plan.append(project_allocation)
 
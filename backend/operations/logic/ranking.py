@@ -0,0 +1,213 @@
+import itertools
+import math
+import time
+
+import numpy as np
+
+from logic.data_layer import get_table
+from logic.records import PersonnelStatus, ProjectStatus
+from logic.scheduler import DEFAULT_WEIGHTS
+
+# Order of the feature columns and of the weight vectors.
+WEIGHT_KEYS = ('w_m', 'w_u', 'w_r')
+
+# Weight vectors scored per block; bounds the score matrix in memory to
+# projects x SWEEP_CHUNK float64 values.
+SWEEP_CHUNK = 128
+
+
+def resolve_weights(weights=None):
+    """Fills in the default weights and validates the given ones."""
+    resolved = dict(DEFAULT_WEIGHTS)
+    for key, value in (weights or {}).items():
+        if key not in resolved:
+            raise ValueError(f"Unknown weight: {key}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Weight {key} must be a number")
+        try:
+            finite = math.isfinite(value)
+        except OverflowError:  # int too large for a float
+            finite = False
+        if not finite:
+            # NaN compares false with everything and would scramble the sort.
+            raise ValueError(f"Weight {key} must be a finite number")
+        resolved[key] = value
+    return resolved
+
+
+def expand_grid(grid):
+    """
+    {"w_m": [...], "w_u": [...], "w_r": [...]} -> every combination, as
+    weight dicts; a missing key keeps its default value.
+    """
+    if not isinstance(grid, dict):
+        raise ValueError("'grid' must be an object of weight lists")
+    axes = []
+    for key in WEIGHT_KEYS:
+        values = grid.get(key, [DEFAULT_WEIGHTS[key]])
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"grid '{key}' must be a non-empty list")
+        axes.append(values)
+    unknown = set(grid) - set(WEIGHT_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown weight: {sorted(unknown)[0]}")
+    return [dict(zip(WEIGHT_KEYS, combo)) for combo in itertools.product(*axes)]
+
+
+class ProjectFeatures:
+    """
+    Pending projects as feature columns (margin, urgency, resource fit),
+    computed from the snapshot columns once per data snapshot. A ranking for any weight vector is then a
+    weighted sum of three columns plus a sort, and a sweep over many
+    vectors is the product features x weights, computed for a chunk of
+    vectors at a time, followed by a partial sort per column.
+
+    Rankings match ProjectScheduler: same fit (available headcount per
+    skill), same score formula and ties broken by dataset order.
+    """
+
+    def __init__(self, tables):
+        personnel = get_table(tables, 'personnel')
+        self.table = get_table(tables, 'projects')
+        projects = self.table
+
+        # Skills (string codes) with at least one available person.
+        offsets, codes = personnel.list_codes('skills')
+        holder = np.repeat(np.arange(personnel.rows), np.diff(offsets))
+        available = personnel.equals('status', PersonnelStatus.AVAILABLE)
+
+        # A repeated project_id keeps its first position and its last value.
+        ids = projects.values('project_id')
+        first, last = {}, {}
+        for row, project_id in enumerate(ids):
+            first.setdefault(project_id, row)
+            last[project_id] = row
+        rows = np.array([last[project_id] for project_id in first], dtype=np.int64)
+        rows = rows[projects.equals('status', ProjectStatus.PENDING)[rows]]
+        self.rows = rows
+        self.project_ids = [ids[row] for row in rows.tolist()]
+
+        # Resource fit: share of each project's required skills (duplicates
+        # included) that some available person has, 1.0 when it needs none.
+        p_offsets, p_codes = projects.list_codes('required_skills')
+        has_skill = np.zeros(max(len(personnel.strings), len(projects.strings)), dtype=np.bool_)
+        has_skill[np.asarray(codes)[available[holder]]] = True
+        hits = np.concatenate(([0], np.cumsum(has_skill[np.asarray(p_codes)])))
+        p_offsets = np.asarray(p_offsets)
+        required = (p_offsets[1:] - p_offsets[:-1])[rows]
+        covered = (hits[p_offsets[1:]] - hits[p_offsets[:-1]])[rows]
+        fit = np.ones(len(rows), dtype=np.float64)
+        needs = required > 0
+        fit[needs] = covered[needs] / required[needs]
+
+        self.matrix = np.empty((len(rows), len(WEIGHT_KEYS)), dtype=np.float64)
+        self.matrix[:, 0] = projects.numbers('project_margin')[rows]
+        self.matrix[:, 1] = projects.numbers('urgency_score')[rows]
+        self.matrix[:, 2] = fit
+
+    def __len__(self):
+        return len(self.rows)
+
+    def scores(self, weights):
+        # Same operation order as priority_score, so scores are bit-identical.
+        m, u, r = self.matrix.T
+        return weights['w_m'] * m + weights['w_u'] * u + weights['w_r'] * r
+
+    def order(self, weights):
+        """Project indices from best to worst (stable: ties keep dataset order)."""
+        return np.argsort(-self.scores(weights), kind='stable')
+
+    def top_k(self, weights, k=None, offset=0):
+        """Same output as ProjectScheduler.top_k for these weights."""
+        scores = self.scores(weights)
+        order = np.argsort(-scores, kind='stable')
+        end = len(order) if k is None else offset + k
+        result = []
+        for index in order[offset:end].tolist():
+            item = self.table.row(int(self.rows[index]))
+            item['resource_fit_score'] = float(self.matrix[index, 2])
+            item['priority_score'] = float(scores[index])
+            result.append(item)
+        return result
+
+    def _top_indices(self, vectors, k):
+        """(k, len(vectors)) array: the top-k project indices under each vector."""
+        n = len(self.rows)
+        weights = np.array([[v[key] for key in WEIGHT_KEYS] for v in vectors], dtype=np.float64)
+        m, u, r = self.matrix.T
+        top = np.empty((k, len(vectors)), dtype=np.int64)
+        for start in range(0, len(vectors), SWEEP_CHUNK):
+            block = weights[start:start + SWEEP_CHUNK]
+            # weights x features^T, summed term by term in priority_score's
+            # order so scores (and ties) are identical to a single ranking.
+            scores = np.multiply.outer(block[:, 0], m)
+            scores += np.multiply.outer(block[:, 1], u)
+            scores += np.multiply.outer(block[:, 2], r)  # vectors x projects
+            if k < n:
+                # Everything better than the k-th score, plus the projects
+                # tied with it in dataset order until there are k.
+                kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k]
+                better = scores > kth
+                tied = scores == kth
+                need = k - better.sum(axis=1, keepdims=True)
+                keep = better | (tied & (np.cumsum(tied, axis=1) <= need))
+                candidates = np.nonzero(keep)[1].reshape(len(block), k)
+            else:
+                candidates = np.broadcast_to(np.arange(n), (len(block), n))
+            picked = np.take_along_axis(scores, candidates, axis=1)
+            # Best score first; equal scores by dataset order.
+            order = np.lexsort((candidates, -picked), axis=1)
+            top[:, start:start + len(block)] = np.take_along_axis(candidates, order, axis=1).T
+        return top
+
+    def sweep(self, vectors, k=10, include_rankings=False):
+        """
+        Ranks the pending projects under every weight vector and reports how
+        stable the top of the ranking is across them:
+
+        - top1: how often each project ranks first.
+        - top_k_frequency: share of vectors that put a project in the top k,
+          and its mean position there.
+        - always_in_top_k: projects in the top k under every vector.
+        - baseline_overlap: fraction of each vector's top k shared with the
+          top k under DEFAULT_WEIGHTS (mean and min).
+        """
+        started = time.perf_counter()
+        n = len(self.rows)
+        k = max(0, min(k, n))
+        report = {"vectors": len(vectors), "pending_projects": n, "top_k": k}
+        if not k or not vectors:
+            report.update(stability=None, compute_ms=0.0)
+            return report
+
+        top = self._top_indices(vectors, k)
+        baseline = self._top_indices([DEFAULT_WEIGHTS], k)[:, 0]
+
+        count = len(vectors)
+        flat = top.ravel()
+        positions = np.repeat(np.arange(1, k + 1), count)
+        frequency = np.bincount(flat, minlength=n)
+        position_sum = np.bincount(flat, weights=positions, minlength=n)
+        wins = np.bincount(top[0], minlength=n)
+        overlap = np.isin(top, baseline).sum(axis=0) / k
+
+        ids = self.project_ids
+        seen = np.flatnonzero(frequency)
+        seen = seen[np.lexsort((seen, -frequency[seen]))]
+        winners = np.flatnonzero(wins)
+        winners = winners[np.lexsort((winners, -wins[winners]))]
+        report["stability"] = {
+            "top1": [{"project_id": ids[i], "wins": int(wins[i]), "share": round(wins[i] / count, 4)}
+                     for i in winners.tolist()],
+            "top_k_frequency": [{"project_id": ids[i], "frequency": round(frequency[i] / count, 4),
+                                 "mean_position": round(position_sum[i] / frequency[i], 2)}
+                                for i in seen.tolist()],
+            "always_in_top_k": [ids[i] for i in seen.tolist() if frequency[i] == count],
+            "baseline_overlap": {"mean": round(float(overlap.mean()), 4),
+                                 "min": round(float(overlap.min()), 4)},
+        }
+        if include_rankings:
+            report["rankings"] = [{"weights": vector, "top": [ids[i] for i in top[:, j].tolist()]}
+                                  for j, vector in enumerate(vectors)]
+        report["compute_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return report
@@ -0,0 +1,38 @@
+from common.records import Record, StatusEnum
+
+
+class ProjectStatus(StatusEnum):
+    PENDING = 'pending'
+    ACTIVE = 'active'
+    COMPLETED = 'completed'
+
+
+class PersonnelStatus(StatusEnum):
+    AVAILABLE = 'available'
+    ASSIGNED = 'assigned'
+
+
+class EquipmentStatus(StatusEnum):
+    AVAILABLE = 'available'
+    IN_USE = 'in_use'
+
+
+class Project(Record):
+    __slots__ = FIELDS = ('project_id', 'client_name', 'status', 'project_margin',
+                          'urgency_score', 'required_skills', 'requires_equipment')
+    COERCE = {'status': ProjectStatus.coerce}
+
+
+class Person(Record):
+    __slots__ = FIELDS = ('employee_id', 'name', 'status', 'skills', 'certifications',
+                          'utilization_rate')
+    COERCE = {'status': PersonnelStatus.coerce}
+
+
+class Equipment(Record):
+    __slots__ = FIELDS = ('equipment_id', 'name', 'status', 'location', 'next_maintenance_date')
+    COERCE = {'status': EquipmentStatus.coerce}
+
+
+# Table name in data.json -> record type.
+RECORD_TYPES = {'projects': Project, 'personnel': Person, 'equipment': Equipment}
@@ -0,0 +1,278 @@
+import heapq
+import itertools
+import threading
+from collections import Counter, defaultdict
+
+from common.records import as_dict
+from logic.data_layer import get_table, row_keys
+from logic.records import PersonnelStatus, ProjectStatus
+
+DEFAULT_WEIGHTS = {'w_m': 0.5, 'w_u': 0.3, 'w_r': 0.2}
+
+
+def resource_fit_score(required_skills, skill_headcount):
+    """Fraction of the required skills that have at least one available person."""
+    if not required_skills:
+        return 1.0
+    fit_count = sum(1 for skill in required_skills if skill_headcount.get(skill, 0) > 0)
+    return fit_count / len(required_skills)
+
+
+def weighted_priority(margin, urgency, resource_fit, weights):
+    return weights['w_m'] * margin + weights['w_u'] * urgency + weights['w_r'] * resource_fit
+
+
+def priority_score(project, resource_fit, weights):
+    """Weighted priority used to rank projects (same formula as schedule_projects)."""
+    return weighted_priority(project.get('project_margin', 0), project.get('urgency_score', 0),
+                             resource_fit, weights)
+
+
+class ProjectScheduler:
+    """
+    Incremental replacement for schedule_projects.
+
+    Keeps a skill -> available headcount index and a max-heap of pending
+    projects. Personnel and project changes only rescore the projects whose
+    resource fit can actually change, and top_k() returns the K best pending
+    projects in O(K log N) instead of rescoring and re-sorting everything.
+    Ties keep the original dataset order, so the output matches
+    schedule_projects exactly.
+
+    One instance lives as long as the process: sync() feeds it each new
+    data snapshot as a diff through the same incremental updates. Only what
+    the ranking needs is kept per entity (status and skills per person;
+    margin, urgency and skills per project); projects from a snapshot are
+    materialized from their table row when top_k returns them. Every
+    method holds the instance lock, so requests can share it.
+    """
+
+    def __init__(self, tables=None, weights=None):
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.data_version = None
+        self._lock = threading.RLock()
+        self._reset()
+        if tables is not None:
+            self.apply(tables)
+
+    def _reset(self):
+        self._personnel = {}  # employee_id -> (status, distinct skills)
+        self._skill_headcount = Counter()
+        self._projects = {}  # pending project_id -> (margin, urgency, skills, record or table row)
+        self._order = {}  # every known project_id -> position in dataset order
+        self._skill_projects = defaultdict(set)
+        self._entries = {}
+        self._heap = []
+        self._next_order = itertools.count()
+        self._table = None
+
+    # --- Snapshots ---
+
+    def sync(self, snapshot):
+        """Applies a data snapshot (see apply) once per snapshot version."""
+        if snapshot.version == self.data_version:
+            return 0
+        with self._lock:
+            if snapshot.version == self.data_version:
+                return 0
+            applied = self.apply(snapshot.tables)
+            self.data_version = snapshot.version
+            return applied
+
+    def apply(self, tables):
+        """
+        Makes the index match a dataset's tables (see data_layer.Table) by
+        applying only the differences: changed people and projects go
+        through the same updates as update_person and upsert_project, and
+        missing ones are removed. If known projects were reordered, or a new
+        one appears before them, the index is rebuilt instead, so ties keep
+        following dataset order. Returns the number of entities applied.
+        """
+        with self._lock:
+            personnel = get_table(tables, 'personnel')
+            # Repeated employee ids count once per row, as in schedule_projects.
+            people = dict(zip(row_keys(personnel.values('employee_id')),
+                              zip(personnel.values('status'), personnel.values('skills', ()))))
+
+            # A repeated project_id keeps its first position and its last row.
+            projects = get_table(tables, 'projects')
+            rows = {}
+            for row, project_id in enumerate(projects.values('project_id')):
+                rows[project_id] = row
+            if not self._keeps_order(rows):
+                self._reset()
+
+            applied = 0
+            for employee_id in [e for e in self._personnel if e not in people]:
+                self.remove_person(employee_id)
+                applied += 1
+            for employee_id, (status, skills) in people.items():
+                skills = tuple(dict.fromkeys(skills or ()))
+                if self._personnel.get(employee_id) != (status, skills):
+                    self._set_person(employee_id, status, skills)
+                    applied += 1
+
+            for project_id in [p for p in self._order if p not in rows]:
+                self.remove_project(project_id)
+                applied += 1
+            self._table = projects
+            columns = (projects.values('status'), projects.values('project_margin', 0),
+                       projects.values('urgency_score', 0), projects.values('required_skills', ()))
+            for project_id, row in rows.items():
+                status, margin, urgency, skills = (column[row] for column in columns)
+                state = (margin, urgency, tuple(skills or ()))
+                old = self._projects.get(project_id)
+                pending = status == ProjectStatus.PENDING
+                if old is not None and pending and old[:3] == state:
+                    self._projects[project_id] = state + (row,)  # Same ranking, new row.
+                    continue
+                if old is None and not pending and project_id in self._order:
+                    continue  # Still not ranked.
+                self._upsert(project_id, status, margin, urgency, skills, row)
+                applied += 1
+            return applied
+
+    def _keeps_order(self, project_ids):
+        """True if known projects keep their relative order and new ones follow them."""
+        previous, seen_new = -1, False
+        for project_id in project_ids:
+            order = self._order.get(project_id)
+            if order is None:
+                seen_new = True
+            elif seen_new or order < previous:
+                return False
+            else:
+                previous = order
+        return True
+
+    # --- Personnel ---
+
+    def update_person(self, person):
+        """Insert or replace a person and rescore projects affected by skill changes."""
+        with self._lock:
+            self._set_person(person['employee_id'], person['status'], person.get('skills', ()))
+
+    def remove_person(self, employee_id):
+        with self._lock:
+            if employee_id in self._personnel:
+                self._set_person(employee_id, None, ())
+                del self._personnel[employee_id]
+
+    def _set_person(self, employee_id, status, skills):
+        old = self._personnel.get(employee_id)
+        old_skills = set(old[1]) if old and old[0] == PersonnelStatus.AVAILABLE else set()
+        skills = tuple(dict.fromkeys(skills or ()))
+        new_skills = set(skills) if status == PersonnelStatus.AVAILABLE else set()
+        self._personnel[employee_id] = (status, skills)
+
+        changed = set()
+        for skill in old_skills - new_skills:
+            self._skill_headcount[skill] -= 1
+            if self._skill_headcount[skill] == 0:
+                del self._skill_headcount[skill]
+                changed.add(skill)
+        for skill in new_skills - old_skills:
+            self._skill_headcount[skill] += 1
+            if self._skill_headcount[skill] == 1:
+                changed.add(skill)
+
+        # Only a skill going from 0 to >0 available people (or back) changes a fit.
+        affected = set()
+        for skill in changed:
+            affected.update(self._skill_projects.get(skill, ()))
+        for project_id in affected:
+            self._push(project_id)
+
+    def set_person_status(self, employee_id, status):
+        with self._lock:
+            person = self._personnel.get(employee_id)
+            if person is None:
+                return False
+            self._set_person(employee_id, status, person[1])
+            return True
+
+    def available_headcount(self, skill):
+        return self._skill_headcount.get(skill, 0)
+
+    # --- Projects ---
+
+    def upsert_project(self, project):
+        """Insert or replace a project; only pending projects are ranked."""
+        with self._lock:
+            self._upsert(project['project_id'], project.get('status'),
+                         project.get('project_margin', 0), project.get('urgency_score', 0),
+                         project.get('required_skills', ()), project)
+
+    def _upsert(self, project_id, status, margin, urgency, skills, source):
+        self._unindex(project_id)
+        if project_id not in self._order:
+            self._order[project_id] = next(self._next_order)
+
+        if status == ProjectStatus.PENDING:
+            self._projects[project_id] = (margin, urgency, tuple(skills or ()), source)
+            for skill in set(skills or ()):
+                self._skill_projects[skill].add(project_id)
+            self._push(project_id)
+
+    def remove_project(self, project_id):
+        with self._lock:
+            self._unindex(project_id)
+            self._order.pop(project_id, None)
+
+    def _unindex(self, project_id):
+        old = self._projects.pop(project_id, None)
+        if old is None:
+            return
+        for skill in set(old[2]):
+            projects = self._skill_projects.get(skill)
+            if projects is not None:
+                projects.discard(project_id)
+                if not projects:
+                    del self._skill_projects[skill]
+        # Invalidate the heap entry lazily; stale entries are skipped on pop.
+        self._entries.pop(project_id, None)
+
+    def _push(self, project_id):
+        margin, urgency, skills, _ = self._projects[project_id]
+        fit = resource_fit_score(skills, self._skill_headcount)
+        score = weighted_priority(margin, urgency, fit, self.weights)
+        entry = (-score, self._order[project_id], project_id, fit)
+        self._entries[project_id] = entry
+        heapq.heappush(self._heap, entry)
+
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    def _record(self, project_id):
+        source = self._projects[project_id][3]
+        return self._table.row(source) if isinstance(source, int) else as_dict(source)
+
+    # --- Queries ---
+
+    @property
+    def pending_count(self):
+        return len(self._entries)
+
+    def top_k(self, k=None, offset=0):
+        """Pending projects ranked by priority, sliced as [offset:offset + k]."""
+        with self._lock:
+            # Pops the best entries (skipping stale ones) and pushes them
+            # back: the heap is the same afterwards, and the lock keeps
+            # other requests and updates from seeing it in between.
+            wanted = self.pending_count if k is None else min(offset + k, self.pending_count)
+            popped = []
+            while len(popped) < wanted and self._heap:
+                entry = heapq.heappop(self._heap)
+                if self._entries.get(entry[2]) is entry:
+                    popped.append(entry)
+            for entry in popped:
+                heapq.heappush(self._heap, entry)
+
+            result = []
+            for neg_score, _, project_id, fit in popped[offset:]:
+                item = self._record(project_id)
+                item['resource_fit_score'] = fit
+                item['priority_score'] = -neg_score
+                result.append(item)
+            return result
@@ -0,0 +1,212 @@
+import threading
+import time
+from collections import Counter, deque
+
+from logic.data_layer import row_keys
+from logic.records import EquipmentStatus, PersonnelStatus, ProjectStatus
+
+# Tracked tables and the id field of their rows.
+TRACKED = {'personnel': 'employee_id', 'equipment': 'equipment_id', 'projects': 'project_id'}
+
+# Versions kept for `since` deltas; older tokens get the full snapshot.
+CHANGE_LOG_SIZE = 256
+# Entity changes listed in one delta before only the summary fields are sent.
+MAX_DELTA_ENTITIES = 1000
+
+
+def _table_statuses(table, id_field):
+    """
+    {entity id: status} read straight from the id and status columns of a
+    snapshot table, without materializing records. Repeated ids get a
+    "#n" suffix so every row is counted, like get_operations_status does.
+    """
+    if table is None:
+        return {}
+    # A row without status still counts towards the totals.
+    return {key: status if status is not None else ''
+            for key, status in zip(row_keys(table.values(id_field)), table.values('status'))}
+
+
+class StatusHistory:
+    """
+    Ring buffer of time buckets with the status summary at the end of each
+    bucket. Buckets without changes carry the previous values forward when
+    the buffer is next touched, so reads never recompute anything.
+    """
+
+    FIELDS = ('personnel_utilization', 'equipment_utilization',
+              'active_projects_count', 'pending_projects_count')
+
+    def __init__(self, bucket_seconds=60, buckets=1440):
+        self.bucket_seconds = bucket_seconds
+        self.size = buckets
+        self._starts = [None] * buckets
+        self._values = [None] * buckets
+        self._last_bucket = None
+
+    def record(self, summary, now=None):
+        bucket = int((now if now is not None else time.time()) // self.bucket_seconds)
+        values = tuple(summary[f] for f in self.FIELDS)
+        self._fill_to(bucket)
+        self._store(bucket, values)
+
+    def _store(self, bucket, values):
+        slot = bucket % self.size
+        self._starts[slot] = bucket * self.bucket_seconds
+        self._values[slot] = values
+        self._last_bucket = bucket
+
+    def _fill_to(self, bucket):
+        last = self._last_bucket
+        if last is None or bucket <= last:
+            return
+        values = self._values[last % self.size]
+        for b in range(max(last + 1, bucket - self.size + 1), bucket):
+            self._store(b, values)
+
+    def points(self, window_seconds=None, now=None):
+        """Buckets (oldest first) covering the last window_seconds."""
+        now = now if now is not None else time.time()
+        bucket = int(now // self.bucket_seconds)
+        if self._last_bucket is None:
+            return []
+        if bucket > self._last_bucket:
+            values = self._values[self._last_bucket % self.size]
+            self._fill_to(bucket)
+            self._store(bucket, values)
+        count = self.size if window_seconds is None else \
+            min(self.size, int(window_seconds // self.bucket_seconds) + 1)
+        out = []
+        for b in range(bucket - count + 1, bucket + 1):
+            slot = b % self.size
+            if self._starts[slot] != b * self.bucket_seconds:
+                continue  # Before the first sample, or overwritten.
+            out.append(dict(zip(self.FIELDS, self._values[slot]), t=self._starts[slot]))
+        return out
+
+
+class StatusTracker:
+    """
+    Materialized get_operations_status: per-status counters kept up to date
+    by applying entity status changes, so reading the summary is O(1).
+
+    sync() diffs only the id and status columns of each new data snapshot.
+    The version is the snapshot's content hash, so every worker (and every
+    restart) serving the same data hands out the same ETag and `since`
+    token. Deltas come from a per-process log keyed by that version: a
+    token this process never synced to, or one older than the log, is
+    answered with the full snapshot.
+    """
+
+    def __init__(self, history=None, log_size=CHANGE_LOG_SIZE):
+        self.data_version = None
+        self.history = history or StatusHistory()
+        self._statuses = {kind: {} for kind in TRACKED}
+        self._counts = {kind: Counter() for kind in TRACKED}
+        # (data version, summary, [(kind, id, old, new), ...] since the previous entry)
+        self._log = deque(maxlen=log_size)
+        self._lock = threading.Lock()
+        self._summary = self._build_summary()
+
+    @property
+    def version(self):
+        return self.data_version or ''
+
+    def summary(self):
+        """Same dict as get_operations_status(db) for the tracked data."""
+        return self._summary
+
+    def _build_summary(self):
+        personnel, equipment, projects = (self._counts[k] for k in ('personnel', 'equipment', 'projects'))
+        total_personnel = sum(personnel.values())
+        total_equipment = sum(equipment.values())
+        assigned = personnel[PersonnelStatus.ASSIGNED]
+        in_use = equipment[EquipmentStatus.IN_USE]
+        return {
+            "active_projects_count": projects[ProjectStatus.ACTIVE],
+            "pending_projects_count": projects[ProjectStatus.PENDING],
+            "personnel_utilization": (assigned / total_personnel * 100) if total_personnel > 0 else 0,
+            "equipment_utilization": (in_use / total_equipment * 100) if total_equipment > 0 else 0,
+            "total_personnel": total_personnel,
+            "total_equipment": total_equipment,
+        }
+
+    # --- Changes ---
+
+    def _apply(self, kind, entity_id, status, changes):
+        statuses, counts = self._statuses[kind], self._counts[kind]
+        old = statuses.get(entity_id)
+        present = entity_id in statuses
+        if status is None and not present:
+            return
+        if present and status is not None and old == status:
+            return
+        if present:
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+        if status is None:
+            del statuses[entity_id]
+        else:
+            statuses[entity_id] = status
+            counts[status] += 1
+        changes.append((kind, entity_id, old, status))
+
+    def sync(self, snapshot, now=None):
+        """Brings the counters in line with a data snapshot, applying only the differences."""
+        if snapshot.version == self.data_version:
+            return False
+        with self._lock:
+            if snapshot.version == self.data_version:
+                return False
+            # The first load is the baseline: its entity list is never served.
+            baseline = self.data_version is None
+            changes = []
+            for kind, id_field in TRACKED.items():
+                current = _table_statuses(snapshot.tables.get(kind), id_field)
+                for entity_id in [e for e in self._statuses[kind] if e not in current]:
+                    self._apply(kind, entity_id, None, changes)
+                for entity_id, status in current.items():
+                    self._apply(kind, entity_id, status, changes)
+            if changes:
+                self._summary = self._build_summary()
+            self.data_version = snapshot.version
+            self._log.append((snapshot.version, self._summary, [] if baseline else changes))
+            self.history.record(self._summary, now)
+            return bool(changes)
+
+    def history_points(self, window_seconds=None, now=None):
+        with self._lock:
+            return self.history.points(window_seconds, now)
+
+    # --- Deltas ---
+
+    def delta(self, since):
+        """
+        Summary fields (and entity changes) after version `since`, or None
+        when `since` is unknown here (never synced to, or older than the log).
+        """
+        with self._lock:
+            log = list(self._log)
+        if not log:
+            return None
+        version, current = log[-1][0], log[-1][1]
+        # Content can come back to an earlier version: its latest entry counts.
+        start = next((i for i in range(len(log) - 1, -1, -1) if log[i][0] == since), None)
+        if start is None:
+            return None
+        base = log[start][1]
+        entities = [{"kind": kind, "id": entity_id, "from": old, "to": new}
+                    for _, _, changes in log[start + 1:]
+                    for kind, entity_id, old, new in changes]
+        delta = {
+            "version": version,
+            "since": since,
+            "full": False,
+            "changes": {k: v for k, v in current.items() if base.get(k) != v},
+        }
+        if len(entities) > MAX_DELTA_ENTITIES:
+            delta["entities_truncated"] = True
+        else:
+            delta["entities"] = entities
+        return delta
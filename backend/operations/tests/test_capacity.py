@@ -0,0 +1,119 @@
+import importlib
+import json
+import os
+import sys
+from datetime import date
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+from logic.capacity import CapacityEngine, _match, normalize_request  # noqa: E402
+from logic.data_layer import tables_from_dataset  # noqa: E402
+from logic.ranking import ProjectFeatures  # noqa: E402
+
+TODAY = date(2026, 1, 5)
+
+
+def make_dataset(s0_people=2):
+    personnel = [{'employee_id': f"E{i}", 'status': 'available', 'skills': ['S0'],
+                  'utilization_rate': 0.5} for i in range(s0_people)]
+    personnel.append({'employee_id': 'E-S1', 'status': 'available', 'skills': ['S1'],
+                      'utilization_rate': 0.5})
+    return {'personnel': personnel, 'projects': [], 'equipment': []}
+
+
+def make_engine(dataset, version='v1'):
+    tables = tables_from_dataset(dataset)
+    return CapacityEngine(tables, ProjectFeatures(tables), version=version)
+
+
+def test_duplicate_skills_mean_headcount():
+    assert normalize_request({'required_skills': ['S0', 'S1', 'S0']}, TODAY) == \
+        normalize_request({'required_skills': {'S1': 1, 'S0': 2}}, TODAY)
+
+    result, _ = make_engine(make_dataset(2)).check({'required_skills': ['S0', 'S0']}, TODAY)
+    assert result['can_be_fulfilled']
+    assert sorted(result['assigned_personnel']) == ['E0', 'E1']
+
+    result, _ = make_engine(make_dataset(1)).check({'required_skills': ['S0', 'S0']}, TODAY)
+    assert not result['can_be_fulfilled']
+    assert "'S0' needs 2 people; only 1 have the skill." in result['potential_bottlenecks']
+
+
+def test_unknown_skill_is_a_bottleneck():
+    result, _ = make_engine(make_dataset()).check({'required_skills': ['S0', 'NOPE']}, TODAY)
+    assert not result['can_be_fulfilled']
+    assert result['assigned_personnel'] == []
+    assert "No staff with skill 'NOPE'." in result['potential_bottlenecks']
+
+
+def test_cache_hits_for_the_same_question():
+    engine = make_engine(make_dataset())
+    first, cached = engine.check({'required_skills': ['S0', 'S1'], 'request_id': 'a'}, TODAY)
+    assert not cached
+    # Same question written differently: skill order and ignored fields.
+    second, cached = engine.check({'required_skills': ['S1', 'S0'], 'request_id': 'b'}, TODAY)
+    assert cached and second is first
+    assert engine.cache_info()['hits'] == 1
+
+
+def test_check_many_reports_malformed_entries_per_item():
+    engine = make_engine(make_dataset())
+    results = engine.check_many([{'required_skills': ['S0']}, {'required_skills': 'S0'},
+                                 'not an object'], TODAY)
+    assert results[0][0]['can_be_fulfilled']
+    assert 'error' in results[1][0] and 'error' in results[2][0]
+
+
+def test_match_handles_augmenting_paths_deeper_than_the_recursion_limit():
+    # Slot i can take person i or i + 1; the last slot only wants person 0,
+    # so placing it shifts every earlier slot by one.
+    n = sys.getrecursionlimit() + 500
+    candidates = {i: [i, i + 1] for i in range(n)}
+    candidates[n] = [0]
+    assigned = _match(list(range(n + 1)), candidates, [0] * (n + 1), 0)
+    assert assigned[n] == 0 and assigned[:n] == list(range(1, n + 1))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    data_path = tmp_path / 'data.json'
+    data_path.write_text(json.dumps(make_dataset()))
+    monkeypatch.setenv('OPERATIONS_DATA_PATH', str(data_path))
+    monkeypatch.setenv('OPERATIONS_SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.delenv('APP_PRELOAD', raising=False)
+    sys.modules.pop('app', None)
+    app = importlib.import_module('app')
+    yield app, app.app.test_client(), data_path
+    sys.modules.pop('app', None)
+
+
+def test_batch_endpoint_returns_per_item_errors(client):
+    _, http, _ = client
+    response = http.post('/api/operations/capacity-check:batch', json={'checks': [
+        {'required_skills': ['S0'], 'request_id': 'ok'},
+        {'required_skills': [1, 2], 'request_id': 'bad'},
+        {'required_skills': ['S1'], 'start_date': 'tomorrow'},
+    ]})
+    assert response.status_code == 200
+    ok, bad, bad_date = response.get_json()['results']
+    assert ok['can_be_fulfilled'] and ok['request_id'] == 'ok'
+    assert 'error' in bad and bad['request_id'] == 'bad'
+    assert 'start_date' in bad_date['error']
+
+
+def test_cache_is_dropped_when_the_snapshot_version_changes(client):
+    app, http, data_path = client
+    payload = {'required_skills': ['S0']}
+    first = http.post('/api/operations/capacity-check', json=payload).get_json()
+    again = http.post('/api/operations/capacity-check', json=payload).get_json()
+    assert not first['cached'] and again['cached']
+
+    data_path.write_text(json.dumps(make_dataset(3)))
+    app.data_layer._reload()
+    after = http.post('/api/operations/capacity-check', json=payload).get_json()
+    assert not after['cached']
+    assert after['data_version'] != first['data_version']
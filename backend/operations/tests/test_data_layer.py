@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+from logic.data_layer import DataLayer  # noqa: E402
+
+
+def write_dataset(path, n_projects):
+    projects = [{'project_id': f"PRJ-{i}", 'status': 'pending', 'project_margin': 0.1,
+                 'urgency_score': 1, 'required_skills': []} for i in range(n_projects)]
+    with open(path, 'w') as f:
+        json.dump({'projects': projects, 'personnel': [], 'equipment': []}, f)
+
+
+def test_prune_keeps_recently_loaded_versions(tmp_path):
+    path = str(tmp_path / 'data.json')
+    write_dataset(path, 1)
+    first = DataLayer(path, check_interval=0).current()
+    write_dataset(path, 2)
+    layer = DataLayer(path, check_interval=0)
+
+    # Loaded moments ago by another worker: within the grace window.
+    assert sorted(os.listdir(layer.snapshot_dir)) == sorted([first.version, layer.current().version])
+
+    # Idle for longer than the grace window: the next compile removes it.
+    old = time.time() - 2 * layer.prune_grace
+    os.utime(first.directory, (old, old))
+    write_dataset(path, 3)
+    newest = DataLayer(path, check_interval=0).current()
+    assert first.version not in os.listdir(layer.snapshot_dir)
+    assert newest.version in os.listdir(layer.snapshot_dir)
+
+
+def test_load_recompiles_a_version_pruned_underneath(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data.json')
+    write_dataset(path, 2)
+    layer = DataLayer(path, check_interval=0)
+    directory = layer.current().directory
+
+    # Another worker removes the directory right after the meta.json check.
+    real_utime, pruned = os.utime, []
+
+    def pruned_utime(target, *args, **kwargs):
+        if target == directory and not pruned:
+            pruned.append(target)
+            shutil.rmtree(directory)
+        return real_utime(target, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'utime', pruned_utime)
+    snapshot = layer._load()
+    assert pruned
+    assert len(snapshot.tables['projects']) == 2
+    assert os.path.exists(os.path.join(directory, 'meta.json'))
@@ -0,0 +1,152 @@
+import copy
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+from logic.data_layer import tables_from_dataset  # noqa: E402
+from logic.operations_logic import schedule_projects  # noqa: E402
+from logic.ranking import ProjectFeatures  # noqa: E402
+from logic.scheduler import DEFAULT_WEIGHTS, ProjectScheduler  # noqa: E402
+
+SKILLS = [f"S{i:02d}" for i in range(12)]
+
+
+def make_dataset(seed, n_people=40, n_projects=60):
+    r = random.Random(seed)
+    personnel = [{'employee_id': f"E{i:03d}", 'name': f"P{i}",
+                  'status': r.choice(['available', 'assigned']),
+                  'skills': r.sample(SKILLS, r.randint(0, 3))} for i in range(n_people)]
+    projects = [{'project_id': f"PRJ-{i:03d}", 'client_name': f"C{i}",
+                 'status': r.choice(['pending', 'pending', 'active', 'completed']),
+                 'project_margin': r.choice([0.1, 0.2, 0.3]),  # Few values: forces ties.
+                 'urgency_score': r.randint(1, 3),
+                 'required_skills': r.sample(SKILLS, r.randint(0, 4))} for i in range(n_projects)]
+    return {'projects': projects, 'personnel': personnel, 'equipment': []}
+
+
+def snapshot(dataset, version):
+    return SimpleNamespace(version=version, tables=tables_from_dataset(dataset))
+
+
+def assert_matches(scheduler, dataset, weights=DEFAULT_WEIGHTS):
+    expected = schedule_projects(dataset, weights)
+    assert scheduler.top_k() == expected
+    assert scheduler.top_k(5) == expected[:5]
+    assert scheduler.top_k(7, 11) == expected[11:18]
+    assert scheduler.top_k(10, len(expected)) == []
+
+
+def mutations(dataset, r):
+    """Successive versions: status and skill changes, additions, removals, reorders."""
+    d = copy.deepcopy(dataset)
+    for project in r.sample(d['projects'], 10):
+        project['status'] = r.choice(['pending', 'active'])
+    yield 'project_status', d
+
+    d = copy.deepcopy(d)
+    for person in r.sample(d['personnel'], 10):
+        person['status'] = r.choice(['available', 'assigned'])
+        person['skills'] = r.sample(SKILLS, r.randint(0, 3))
+    yield 'personnel', d
+
+    d = copy.deepcopy(d)
+    for project in r.sample(d['projects'], 8):
+        project['required_skills'] = r.sample(SKILLS, r.randint(0, 4))
+        project['urgency_score'] = r.randint(1, 3)
+    yield 'project_fields', d
+
+    d = copy.deepcopy(d)
+    d['projects'].extend({'project_id': f"NEW-{i}", 'status': 'pending', 'project_margin': 0.2,
+                          'urgency_score': 2, 'required_skills': r.sample(SKILLS, 2)}
+                         for i in range(15))
+    yield 'appended', d
+
+    d = copy.deepcopy(d)
+    del d['projects'][3:9]
+    del d['personnel'][:5]
+    yield 'removed', d
+
+    d = copy.deepcopy(d)
+    r.shuffle(d['projects'])
+    yield 'reordered', d
+
+    d = copy.deepcopy(d)
+    d['projects'].insert(0, {'project_id': 'FIRST', 'status': 'pending', 'project_margin': 0.3,
+                             'urgency_score': 3, 'required_skills': []})
+    yield 'prepended', d
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_scheduler_matches_reference(seed):
+    dataset = make_dataset(seed)
+    assert_matches(ProjectScheduler(tables_from_dataset(dataset), DEFAULT_WEIGHTS), dataset)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sync_applies_snapshot_diffs(seed):
+    dataset = make_dataset(seed)
+    scheduler = ProjectScheduler(weights=DEFAULT_WEIGHTS)
+    assert scheduler.sync(snapshot(dataset, 'v0')) > 0
+    assert_matches(scheduler, dataset)
+    assert scheduler.sync(snapshot(dataset, 'v0')) == 0
+
+    for name, changed in mutations(dataset, random.Random(seed)):
+        scheduler.sync(snapshot(changed, name))
+        assert_matches(scheduler, changed)
+
+    # Applying the same content again changes nothing.
+    assert scheduler.apply(tables_from_dataset(changed)) == 0
+
+
+def test_incremental_updates_match_reference():
+    r = random.Random(42)
+    dataset = make_dataset(42)
+    scheduler = ProjectScheduler(tables_from_dataset(dataset), DEFAULT_WEIGHTS)
+
+    for _ in range(200):
+        action = r.randrange(5)
+        if action == 0:
+            person = r.choice(dataset['personnel'])
+            person['status'] = r.choice(['available', 'assigned'])
+            person['skills'] = r.sample(SKILLS, r.randint(0, 3))
+            scheduler.update_person(person)
+        elif action == 1:
+            person = r.choice(dataset['personnel'])
+            person['status'] = r.choice(['available', 'assigned'])
+            assert scheduler.set_person_status(person['employee_id'], person['status'])
+        elif action == 2:
+            project = r.choice(dataset['projects'])
+            project['status'] = r.choice(['pending', 'active'])
+            project['required_skills'] = r.sample(SKILLS, r.randint(0, 4))
+            scheduler.upsert_project(dict(project))
+        elif action == 3 and len(dataset['projects']) > 10:
+            project = dataset['projects'].pop(r.randrange(len(dataset['projects'])))
+            scheduler.remove_project(project['project_id'])
+        else:
+            project = {'project_id': f"ADD-{r.random()}", 'status': 'pending',
+                       'project_margin': 0.2, 'urgency_score': 2,
+                       'required_skills': r.sample(SKILLS, 2)}
+            dataset['projects'].append(project)
+            scheduler.upsert_project(dict(project))
+        assert_matches(scheduler, dataset)
+
+
+@pytest.mark.parametrize('weights', [
+    {'w_m': 1.0, 'w_u': 0.0, 'w_r': 0.0},
+    {'w_m': 0.2, 'w_u': 0.2, 'w_r': 0.6},
+])
+def test_features_top_k_matches_reference(weights):
+    dataset = make_dataset(7)
+    features = ProjectFeatures(tables_from_dataset(dataset))
+    expected = schedule_projects(dataset, weights)
+    result = features.top_k(weights, None, 0)
+    assert [p['project_id'] for p in result] == [p['project_id'] for p in expected]
+    assert [p['priority_score'] for p in result] == pytest.approx(
+        [p['priority_score'] for p in expected])
@@ -0,0 +1,42 @@
+"""
+Arranque local de un servicio del backend, sin Docker ni Gunicorn.
+
+    python backend/run_local.py operations
+    python backend/run_local.py commercial
+
+En los contenedores `common` se importa gracias a PYTHONPATH=/ (ver cada
+Dockerfile). En local este script hace lo equivalente: pone backend/ en el
+path, entra en el directorio del servicio y ejecuta su punto de entrada
+como __main__, de modo que se usa el servidor de desarrollo y el puerto que
+ya define cada servicio. Para Gunicorn u otras herramientas basta con
+exportar PYTHONPATH=backend.
+"""
+import os
+import runpy
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Servicio -> script de entrada dentro de su directorio.
+ENTRYPOINTS = {
+    'commercial': 'run.py',
+    'finance': 'app.py',
+    'operations': 'app.py',
+    'commercial_agent': 'app.py',
+    'finance_agent': 'app.py',
+    'operations_agent': 'app.py',
+}
+
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in ENTRYPOINTS:
+        sys.exit(f"Uso: python run_local.py {{{'|'.join(ENTRYPOINTS)}}}")
+    service = argv[0]
+    service_dir = os.path.join(BACKEND_DIR, service)
+    os.chdir(service_dir)
+    sys.path[:0] = [service_dir, BACKEND_DIR]
+    runpy.run_path(ENTRYPOINTS[service], run_name='__main__')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
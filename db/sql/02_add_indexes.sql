@@ -0,0 +1,22 @@
+-- ===================================================================
+-- Índices para las consultas del Orquestador
+-- Versión: 1.1
+-- Descripción: Índices sobre las claves foráneas y los estados por los
+--              que filtra la capa de repositorio. Se crean CONCURRENTLY
+--              para no bloquear escrituras en una base ya en uso, por lo
+--              que este archivo no debe ejecutarse dentro de una transacción.
+-- ===================================================================
+
+-- Leads: listados por estado y por cliente
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_leads_status ON leads (status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_leads_customer_id ON leads (customer_id);
+
+-- Cotizaciones de un lead
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_quotes_lead_id ON quotes (lead_id);
+
+-- Proyectos por estado y por cotización de origen
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_status ON projects (status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_quote_id ON projects (quote_id);
+
+-- Tareas de un proyecto
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_project_tasks_project_id ON project_tasks (project_id);